@@ -1,3 +1,4 @@
+from typing import Dict, List, Literal, Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -6,8 +7,143 @@ load_dotenv()
 class Settings(BaseSettings):
     server_host: str = "0.0.0.0"
     server_port: int = 8000
+    server_workers: int = 1
     debug: bool = False
 
+    redis_host: str = "redis-server"
+    redis_port: int = 6379
+    redis_db: int = 0
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 5.0
+    redis_socket_connect_timeout: float = 5.0
+    redis_health_check_interval: int = 30
+    # Соединения пула, открываемые при старте, чтобы первые запросы не ждали connect
+    redis_warm_connections: int = 10
+    readiness_timeout: float = 1.0
+    # Redis Cluster: redis_host/redis_port — любой узел для обнаружения остальных.
+    # Включает хеш-теги ключей; redis_hash_tags — теги без кластера, для переноса данных
+    redis_cluster: bool = False
+    redis_hash_tags: bool = False
+
+    delivery_mode: Literal["background", "queue"] = "background"
+    queue_stream: str = "queue:delivery"
+    queue_group: str = "delivery-workers"
+    worker_concurrency: int = 100
+    worker_block_ms: int = 2000
+    worker_claim_idle_ms: int = 60000
+    worker_claim_interval: float = 30.0
+
+    batch_max_items: int = 50000
+    batch_chunk_size: int = 1000
+
+    # Лимиты каналов: rate — сообщений в секунду (0 — без ограничения), burst — ёмкость bucket
+    telegram_concurrency: int = 30
+    telegram_rate_limit: float = 30
+    telegram_burst: int = 30
+    telegram_recipient_rate_limit: float = 1
+    telegram_recipient_burst: int = 3
+    email_concurrency: int = 10
+    email_rate_limit: float = 50
+    email_burst: int = 50
+    email_recipient_rate_limit: float = 1
+    email_recipient_burst: int = 5
+
+    # Транспорты каналов: simulated — заглушка с задержкой, как раньше
+    telegram_transport: Literal["simulated", "http"] = "simulated"
+    telegram_api_url: str = "https://api.telegram.org"
+    telegram_bot_token: str = ""
+    telegram_http2: bool = True
+    email_transport: Literal["simulated", "smtp"] = "simulated"
+    email_address_template: str = "user{user_id}@example.com"
+    email_subject: str = "Уведомление"
+    smtp_host: str = "localhost"
+    smtp_port: int = 25
+    smtp_sender: str = "notifications@example.com"
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+    smtp_use_tls: bool = False
+    smtp_start_tls: Optional[bool] = None
+    smtp_pool_size: int = 4
+    smtp_max_messages: int = 100
+    smtp_idle_timeout: float = 30.0
+    transport_timeout: float = 10.0
+
+    # Доли полос доставки при конкуренции: critical вытесняет остальные, bulk не голодает
+    priority_weights: Dict[str, float] = {"critical": 100, "normal": 10, "bulk": 1}
+
+    retry_key: str = "retry:due"
+    dead_letter_key: str = "retry:dead"
+    retry_max_attempts: int = 5
+    # Аренда доставки: пока она жива, копии задачи (например, от восстановления pending) не отправляются.
+    # Должна быть больше самой долгой отправки
+    delivery_lease_ttl: int = 60
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 300.0
+    retry_poll_interval: float = 1.0
+    retry_batch_size: int = 500
+
+    # Отложенная отправка (send_at): id в sorted set schedule_key, score — время отправки
+    schedule_key: str = "schedule:due"
+    schedule_poll_interval: float = 1.0
+    schedule_batch_size: int = 1000
+
+    # Восстановление pending, не дошедших до отправки (например, из памяти упавшего процесса):
+    # уведомления, ждущие дольше recovery_pending_after секунд, снова отдаются в доставку
+    recovery_enabled: bool = False
+    recovery_pending_after: float = 300.0
+    recovery_interval: float = 60.0
+    recovery_batch_size: int = 500
+
+    # Каналы, уведомления которых копятся digest_window секунд и уходят одним сообщением
+    digest_channels: List[Literal["telegram", "email"]] = []
+    digest_key: str = "digest:due"
+    digest_window: float = 10.0
+    digest_max_items: int = 50
+    digest_poll_interval: float = 1.0
+    digest_batch_size: int = 500
+
+    # hash — читаемые поля и ISO-даты; compact — см. NotificationRecord.to_compact_hash.
+    # Чтение понимает оба формата, поэтому переключать можно на работающей базе.
+    storage_format: Literal["hash", "compact"] = "hash"
+
+    # Кэш страниц истории в процессе API; инвалидация через pub/sub events_channel
+    cache_enabled: bool = False
+    cache_max_entries: int = 10000
+    cache_ttl: float = 30.0
+    events_channel: str = "notifications:events"
+
+    # Поток изменений статусов GET /api/notifications/stream (SSE) через тот же events_channel
+    push_enabled: bool = False
+    push_buffer_size: int = 100
+    push_heartbeat: float = 15.0
+    push_max_clients: int = 10000
+
+    history_page_size: int = 50
+    history_max_page_size: int = 500
+    # Сколько записей истории просматривается за запрос с фильтром по статусу; дальше — по курсору
+    history_max_scan: int = 2000
+
+    # Профилирование запросов: middleware подключается, только если задан токен или доля
+    profiling_token: Optional[str] = None
+    profiling_sample_rate: float = 0.0
+    profiling_dir: str = "profiles"
+
+    retention_enabled: bool = False
+    retention_days: int = 30
+    archive_dir: str = "archive"
+    archive_interval: float = 3600.0
+    archive_batch_size: int = 1000
+    archive_lock_key: str = "archive:lock"
+    archive_lock_ttl: int = 3600
+
+    idempotency_ttl: int = 86400
+
+    stats_max_users: int = 5000
+
+    export_scan_count: int = 1000
+    export_chunk_size: int = 65536
+    export_compression_level: int = 6
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8"
@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from app.models.notification import NotificationStatus, NotificationType
+from app.services.export import ExportFilter, NotificationExporter
+from app.services.redis import redis_service
+
+
+async def main(output: str, export_filter: ExportFilter) -> None:
+    await redis_service.connect()
+    try:
+        with (open(output, "wb") if output != "-" else sys.stdout.buffer) as f:
+            async for chunk in NotificationExporter.stream(export_filter):
+                f.write(chunk)
+    finally:
+        await redis_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выгрузка истории уведомлений в gzip-сжатый NDJSON")
+    parser.add_argument("--output", "-o", default="-", help="Файл выгрузки, '-' — stdout")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="created_at не раньше (UTC)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="created_at раньше (UTC)")
+    parser.add_argument("--status", choices=[s.value for s in NotificationStatus])
+    parser.add_argument("--type", choices=[t.value for t in NotificationType])
+    args = parser.parse_args()
+    export_filter = ExportFilter(
+        args.since,
+        args.until,
+        NotificationStatus(args.status) if args.status else None,
+        NotificationType(args.type) if args.type else None
+    )
+    asyncio.run(main(args.output, export_filter))
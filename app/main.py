@@ -1,14 +1,58 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException,Query
+from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
-from app.routers import notification
+from app.routers import metrics, notification, probes
 from app.config import settings
+from app.services.compactor import compactor
+from app.services.digest_poller import digest_poller
+from app.services.dispatcher import dispatcher
+from app.services.events import event_bus
+from app.services.health import health
+from app.services.metrics import MetricsMiddleware, mark_process_dead
+from app.services.profiling import ProfilingMiddleware
+from app.services.recovery import pending_recovery
+from app.services.redis import redis_service
+from app.services.retry import retry_poller
+from app.services.scheduler import schedule_poller
+from app.services.transports import transports
+from contextlib import asynccontextmanager
 import asyncio
-import time
 
 
-app = FastAPI(title="Сервис уведомлений")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Запросы принимаются после прогрева: первый не платит за connect, скрипты, кодеки и маршруты
+    await health.warm_up(app)
+    # В режиме очереди повторы, отложенные отправки, сводки и восстановление — в воркерах доставки
+    tasks = []
+    if settings.delivery_mode == "background":
+        tasks.append(asyncio.create_task(retry_poller.run()))
+        tasks.append(asyncio.create_task(schedule_poller.run()))
+        if settings.recovery_enabled:
+            tasks.append(asyncio.create_task(pending_recovery.run()))
+        if settings.digest_channels:
+            tasks.append(asyncio.create_task(digest_poller.run()))
+    if event_bus.enabled:
+        tasks.append(asyncio.create_task(event_bus.run()))
+    if settings.retention_enabled:
+        tasks.append(asyncio.create_task(compactor.run()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await dispatcher.close()
+    await transports.close()
+    await redis_service.close()
+    mark_process_dead()
 
+
+app = FastAPI(title="Сервис уведомлений", lifespan=lifespan)
+
+app.add_middleware(MetricsMiddleware)
+# Без токена и доли выборки middleware не подключается и ничего не стоит
+if settings.profiling_token or settings.profiling_sample_rate > 0:
+    app.add_middleware(ProfilingMiddleware)
 app.include_router(notification.router)
+app.include_router(metrics.router)
+app.include_router(probes.router)
 
 @app.get("/")
 async def main():
@@ -17,4 +61,7 @@ async def main():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host=settings.server_host, port=settings.server_port, reload=settings.debug)
\ No newline at end of file
+    uvicorn.run(
+        "app.main:app", host=settings.server_host, port=settings.server_port,
+        reload=settings.debug, workers=settings.server_workers
+    )
\ No newline at end of file
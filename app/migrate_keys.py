@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+from typing import Optional
+from app.config import settings
+from app.models.notification import NotificationRecord, NotificationStatus, to_timestamp
+from app.services.keys import (
+    DIGEST_PREFIX, GLOBAL_STATS_KEY, IDEMPOTENCY_PREFIX, NOTIFICATION_PREFIX, STATS_PREFIX,
+    USER_INDEX_PREFIX, digest_key, idempotency_key, notification_id_from_key, notification_key,
+    user_index_key, user_stats_key
+)
+from app.services.redis import redis_service
+from app.services.status_index import StatusIndex
+
+PATTERNS = [f"{prefix}:*" for prefix in (
+    NOTIFICATION_PREFIX, USER_INDEX_PREFIX, STATS_PREFIX, IDEMPOTENCY_PREFIX, DIGEST_PREFIX
+)]
+
+
+def tagged_key(key: str) -> Optional[str]:
+    """Имя ключа с хеш-тегом пользователя; None — ключ общий или уже с тегом"""
+    if "{" in key or key in (GLOBAL_STATS_KEY, settings.digest_key):
+        return None
+    prefix, _, rest = key.partition(":")
+    if prefix == NOTIFICATION_PREFIX:
+        return notification_key(rest)
+    if prefix == USER_INDEX_PREFIX:
+        return user_index_key(rest)
+    if prefix == STATS_PREFIX:
+        return user_stats_key(rest)
+    if prefix == IDEMPOTENCY_PREFIX:
+        user_id, _, idempotency = rest.partition(":")
+        return idempotency_key(user_id, idempotency)
+    if prefix == DIGEST_PREFIX:
+        return digest_key(rest)
+    return None
+
+
+async def _rename(r, renames) -> int:
+    if not renames:
+        return 0
+    async with r.pipeline(transaction=False) as pipe:
+        for key, new_key in renames:
+            pipe.renamenx(key, new_key)
+        return sum(1 for done in await pipe.execute() if done)
+
+
+async def migrate(batch_size: int = 1000) -> int:
+    """
+    Переименовывает ключи в формат с хеш-тегами на одном узле Redis; возвращает их число.
+    Ключи с тегом обходом пропускаются, а RENAMENX не затирает существующие,
+    поэтому запуск можно повторять.
+    """
+    settings.redis_hash_tags = True
+    renamed = 0
+    async with redis_service.get_connection() as r:
+        for pattern in PATTERNS:
+            renames = []
+            async for key in r.scan_iter(match=pattern, count=batch_size):
+                new_key = tagged_key(key)
+                if new_key is not None:
+                    renames.append((key, new_key))
+                if len(renames) >= batch_size:
+                    renamed += await _rename(r, renames)
+                    renames = []
+            renamed += await _rename(r, renames)
+    return renamed
+
+
+async def _index(r, keys) -> int:
+    if not keys:
+        return 0
+    async with r.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        rows = await pipe.execute()
+
+    async with r.pipeline(transaction=False) as pipe:
+        for key, data in zip(keys, rows):
+            if not data:
+                continue
+            notification_id = notification_id_from_key(key)
+            try:
+                record = NotificationRecord.from_redis_hash(data, notification_id)
+            except Exception as e:
+                print(f"Error parsing notification {notification_id}: {e}")
+                continue
+            # Время входа в статус не хранится: у pending — срок доставки, у доставленных — sent_at
+            at = record.send_at if record.status == NotificationStatus.PENDING else record.sent_at
+            pipe.zadd(user_index_key(record.user_id), {notification_id: record.created_at.timestamp()}, nx=True)
+            pipe.zadd(
+                StatusIndex.key(record.type, record.status),
+                {notification_id: to_timestamp(at or record.created_at)},
+                nx=True
+            )
+        results = await pipe.execute()
+    return sum(results[::2])
+
+
+async def backfill(batch_size: int = 1000) -> int:
+    """
+    Добавляет в индекс истории пользователя и в индекс по статусу уведомления,
+    которых там нет, — хеши, записанные до появления индексов. Возвращает число
+    добавленных в историю; существующие элементы не меняются, запуск можно повторять.
+    """
+    added = 0
+    async with redis_service.get_connection() as r:
+        keys = []
+        async for key in r.scan_iter(match=f"{NOTIFICATION_PREFIX}:*", count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                added += await _index(r, keys)
+                keys = []
+        added += await _index(r, keys)
+    return added
+
+
+async def main(batch_size: int, only_backfill: bool) -> None:
+    await redis_service.connect()
+    try:
+        if not only_backfill:
+            print(f"Переименовано ключей: {await migrate(batch_size)}")
+        print(f"Добавлено в историю: {await backfill(batch_size)}")
+    finally:
+        await redis_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Перевод ключей на хеш-теги пользователей перед переносом в Redis Cluster "
+                    "и индексация уведомлений, записанных до появления индексов"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000, help="Ключей в одном pipeline")
+    parser.add_argument(
+        "--backfill", action="store_true",
+        help="Только проиндексировать уведомления без индексов, ключи не переименовывать"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.backfill))
@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 from pydantic import BaseModel, Field
-from typing import Literal, Optional
+from typing import Literal, Optional, Tuple
+from app.config import settings
 
 class NotificationType(str, Enum):
     TELEGRAM = "telegram"
@@ -11,25 +12,154 @@ class NotificationStatus(str, Enum):
     PENDING = "pending"
     SENT = "sent"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class NotificationPriority(str, Enum):
+    """Полоса доставки: critical — коды и OTP, bulk — рассылки"""
+    CRITICAL = "critical"
+    NORMAL = "normal"
+    BULK = "bulk"
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Коды enum в компактном формате; новые значения добавлять только в конец
+TYPE_CODES = {NotificationType.TELEGRAM: "0", NotificationType.EMAIL: "1"}
+STATUS_CODES = {
+    NotificationStatus.PENDING: "0",
+    NotificationStatus.SENT: "1",
+    NotificationStatus.FAILED: "2",
+    NotificationStatus.CANCELLED: "3",
+}
+PRIORITY_CODES = {
+    NotificationPriority.CRITICAL: "0",
+    NotificationPriority.NORMAL: "1",
+    NotificationPriority.BULK: "2",
+}
+COMPACT_FIELDS = {
+    "user_id": "u", "message": "m", "type": "t", "status": "s",
+    "created_at": "c", "sent_at": "x", "attempts": "a", "last_error": "e", "priority": "p",
+    "send_at": "d",
+}
+TYPES_BY_CODE = {code: value for value, code in TYPE_CODES.items()}
+STATUSES_BY_CODE = {code: value for value, code in STATUS_CODES.items()}
+PRIORITIES_BY_CODE = {code: value for value, code in PRIORITY_CODES.items()}
+
+
+def to_epoch_us(value: datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(value: str) -> datetime:
+    return EPOCH + timedelta(0, 0, int(value))
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Время в хранилище — UTC без часового пояса"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_timestamp(value: datetime) -> float:
+    """Unix-время для наивного UTC datetime (score индексов по времени)"""
+    return (value - EPOCH).total_seconds()
+
+
+def storage_status(status: NotificationStatus) -> Tuple[str, str]:
+    """Поле и значение статуса в текущем формате хранения"""
+    if settings.storage_format == "compact":
+        return "s", STATUS_CODES[status]
+    return "status", status.value
+
 
 class NotificationRecord(BaseModel):
+    id: Optional[str] = None
     user_id: int = Field(..., gt=0)
     message: str = Field(..., min_length=1, max_length=1000)
     type: NotificationType
     status: NotificationStatus
     created_at: datetime = Field(default_factory=datetime.utcnow)
     sent_at: Optional[datetime] = None
+    attempts: int = Field(0, ge=0)
+    last_error: Optional[str] = None
+    priority: NotificationPriority = NotificationPriority.NORMAL
+    send_at: Optional[datetime] = None
+
+    @property
+    def scheduled(self) -> bool:
+        """Доставка отложена до send_at: в доставку уведомление отдаёт SchedulePoller"""
+        return self.send_at is not None
+
+    def to_json(self) -> bytes:
+        """
+        JSON записи сразу в bytes сериализатором pydantic-core — те же байты,
+        что JSONResponse(jsonable_encoder(record.model_dump())), без промежуточного dict
+        """
+        return self.__pydantic_serializer__.to_json(self)
 
     def to_redis_hash(self) -> dict:
+        """Поля для HSET в текущем формате хранения; id хранится в ключе, а не в хеше"""
+        if settings.storage_format == "compact":
+            return self.to_compact_hash()
+        return self.to_legacy_hash()
+
+    def to_legacy_hash(self) -> dict:
         return {
             "user_id": str(self.user_id),
             "message": self.message,
             "type": self.type.value,
             "status": self.status.value,
             "created_at": self.created_at.isoformat(),
-            "sent_at": self.sent_at.isoformat() if self.sent_at else ""
+            "sent_at": self.sent_at.isoformat() if self.sent_at else "",
+            "attempts": str(self.attempts),
+            "last_error": self.last_error or "",
+            "priority": self.priority.value,
+            "send_at": self.send_at.isoformat() if self.send_at else ""
         }
 
+    def to_compact_hash(self) -> dict:
+        """
+        Компактный формат: однобуквенные поля, коды enum и время в микросекундах от эпохи.
+        Поля со значением по умолчанию не пишутся.
+        """
+        data = {
+            "u": self.user_id,
+            "m": self.message,
+            "t": TYPE_CODES[self.type],
+            "s": STATUS_CODES[self.status],
+            "c": to_epoch_us(self.created_at),
+        }
+        if self.sent_at:
+            data["x"] = to_epoch_us(self.sent_at)
+        if self.attempts:
+            data["a"] = self.attempts
+        if self.last_error:
+            data["e"] = self.last_error
+        if self.priority != NotificationPriority.NORMAL:
+            data["p"] = PRIORITY_CODES[self.priority]
+        if self.send_at:
+            data["d"] = to_epoch_us(self.send_at)
+        return data
+
+    @classmethod
+    def from_compact_hash(cls, data: dict, notification_id: Optional[str] = None) -> "NotificationRecord":
+        sent_at = data.get("x")
+        send_at = data.get("d")
+        return cls(
+            id=notification_id,
+            user_id=data["u"],
+            message=data["m"],
+            type=TYPES_BY_CODE[data["t"]],
+            status=STATUSES_BY_CODE[data["s"]],
+            created_at=from_epoch_us(data["c"]),
+            sent_at=from_epoch_us(sent_at) if sent_at else None,
+            attempts=data.get("a") or 0,
+            last_error=data.get("e") or None,
+            priority=PRIORITIES_BY_CODE[data.get("p") or "1"],
+            send_at=from_epoch_us(send_at) if send_at else None
+        )
+
     @staticmethod
     def _decode_value(value) -> str:
         if value is None:
@@ -38,24 +168,30 @@ class NotificationRecord(BaseModel):
             return value.decode("utf-8")
         return str(value)
 
-    @staticmethod
-    def _get_field(data: dict, field: str) -> str:
-        value = data.get(field.encode("utf-8"))
-        if value is None:
-            value = data.get(field)
-        return NotificationRecord._decode_value(value)
+    def redis_fields(self, *names: str) -> dict:
+        """Подмножество to_redis_hash() для частичного обновления (имена — как в модели)"""
+        data = self.to_redis_hash()
+        if settings.storage_format == "compact":
+            names = [COMPACT_FIELDS[name] for name in names]
+        return {name: data[name] for name in names if name in data}
 
     @classmethod
-    def from_redis_hash(cls, data: dict) -> "NotificationRecord":
+    def from_redis_hash(cls, data: dict, notification_id: Optional[str] = None) -> "NotificationRecord":
         if not data:
             raise ValueError("Empty data received from Redis")
 
-        user_id_str = cls._get_field(data, "user_id")
-        message = cls._get_field(data, "message")
-        notif_type = cls._get_field(data, "type")
-        status = cls._get_field(data, "status")
-        created_at_str = cls._get_field(data, "created_at")
-        sent_at_str = cls._get_field(data, "sent_at")
+        # Ключи-bytes (decode_responses=False) приводим к str один раз
+        if isinstance(next(iter(data)), bytes):
+            data = {cls._decode_value(key): cls._decode_value(value) for key, value in data.items()}
+        if "u" in data:
+            return cls.from_compact_hash(data, notification_id)
+
+        get = data.get
+        user_id_str = get("user_id")
+        message = get("message")
+        notif_type = get("type")
+        status = get("status")
+        created_at_str = get("created_at")
 
         if not user_id_str:
             raise ValueError("user_id is required")
@@ -68,15 +204,18 @@ class NotificationRecord(BaseModel):
         if not created_at_str:
             raise ValueError("created_at is required")
 
-        sent_at = None
-        if sent_at_str and sent_at_str.strip():
-            sent_at = datetime.fromisoformat(sent_at_str)
-
+        # Строки разбирает сам pydantic-core: это быстрее, чем model_construct
+        # с предварительным разбором значений в Python
         return cls(
-            user_id=int(user_id_str),
+            id=notification_id,
+            user_id=user_id_str,
             message=message,
-            type=NotificationType(notif_type),
-            status=NotificationStatus(status),
-            created_at=datetime.fromisoformat(created_at_str),
-            sent_at=sent_at
-        )
\ No newline at end of file
+            type=notif_type,
+            status=status,
+            created_at=created_at_str,
+            sent_at=get("sent_at") or None,
+            attempts=get("attempts") or 0,
+            last_error=get("last_error") or None,
+            priority=get("priority") or NotificationPriority.NORMAL,
+            send_at=get("send_at") or None
+        )
@@ -1,9 +1,16 @@
+from datetime import datetime
 from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, Literal
 
 MessageType = Literal["telegram", "email"]
+MessagePriority = Literal["critical", "normal", "bulk"]
 
 class SendNotificationData(BaseModel):
     user_id: int = Field(..., gt=0, description="ID пользователя")
-    message: str = Field(..., min_length=1, max_length=500,  description="Сообщение от пользователя")
-    type: Optional[MessageType] = None
\ No newline at end of file
+    message: str = Field(..., min_length=1, max_length=1000,  description="Сообщение от пользователя")
+    type: MessageType = Field(..., description="Канал доставки")
+    priority: MessagePriority = Field("normal", description="Полоса доставки")
+    send_at: Optional[datetime] = Field(None, description="Время отправки; без часового пояса — UTC")
+    idempotency_key: Optional[str] = Field(
+        None, min_length=1, max_length=255, description="Ключ идемпотентности элемента пачки"
+    )
\ No newline at end of file
@@ -0,0 +1,43 @@
+import os
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from app.services.metrics import REDIS_QUEUE_DEPTH
+from app.services.queue import delivery_queue
+from app.services.redis import redis_service
+from app.services.timeindex import dead_letter_index, retry_index
+
+router = APIRouter(tags=["metrics"])
+
+
+async def _refresh_redis_gauges() -> None:
+    """Размеры общих очередей в Redis читаются в момент сбора метрик"""
+    try:
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.zcard(retry_index.key)
+                pipe.zcard(dead_letter_index.key)
+                for stream in delivery_queue.streams.values():
+                    pipe.xlen(stream)
+                retry, dead, *streams = await pipe.execute()
+    except Exception as e:
+        print(f"Failed to read queue depth: {e}")
+        return
+    REDIS_QUEUE_DEPTH.labels("stream").set(sum(streams))
+    REDIS_QUEUE_DEPTH.labels("retry").set(retry)
+    REDIS_QUEUE_DEPTH.labels("dead_letter").set(dead)
+
+
+@router.get("/metrics",
+    summary="Метрики Prometheus",
+    description="Гистограммы задержек маршрутов, команд Redis и отправок, счётчики и размеры очередей",
+    response_description="Метрики в текстовом формате Prometheus"
+)
+async def metrics():
+    await _refresh_redis_gauges()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Несколько воркеров: метрики всех процессов собираются из общего каталога
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
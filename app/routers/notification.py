@@ -1,11 +1,27 @@
 import asyncio
-from fastapi import APIRouter, BackgroundTasks, Query, HTTPException
-from typing import Optional, Literal
+import json
+import time
+from fastapi import APIRouter, Header, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Optional, Literal
 from datetime import datetime
 from app.models.notification import (
-    NotificationRecord, NotificationType, NotificationStatus
+    NotificationPriority, NotificationRecord, NotificationType, NotificationStatus, naive_utc, to_timestamp
 )
-from app.services.notifications import NotificationService
+from app.models.user import SendNotificationData
+from app.config import settings
+from app.services.cache import history_cache
+from app.services.dispatcher import dispatcher
+from app.services.export import ExportFilter, NotificationExporter
+from app.services.idempotency import IdempotencyConflict, fingerprint, idempotency_store
+from app.services.notifications import InvalidTransition, NotificationService, NotScheduled, due_send_at
+from app.services.keys import new_notification_id, parse_notification_id
+from app.services.profiling import phase
+from app.services.push import PushUnavailable, push_hub
+from app.services.stats import NotificationStats
+from app.services.status_index import StatusIndex
+from app.services.timeindex import dead_letter_index
 from app.services.redis import redis_service
 
 router = APIRouter(
@@ -20,10 +36,20 @@ router = APIRouter(
     status_code=202
 )
 async def send_notification(
-    background_tasks: BackgroundTasks,
+    response: Response,
     user_id: int = Query(..., gt=0, description="ID пользователя"),
     message: str = Query(..., min_length=1, max_length=1000, description="Текст уведомления"),
-    notification_type: NotificationType = Query(..., description="Тип уведомления")
+    notification_type: NotificationType = Query(..., description="Тип уведомления"),
+    priority: NotificationPriority = Query(
+        NotificationPriority.NORMAL, description="Полоса доставки: critical — коды и OTP, bulk — рассылки"
+    ),
+    send_at: Optional[datetime] = Query(
+        None, description="Отложить отправку до этого времени; без часового пояса — UTC"
+    ),
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", min_length=1, max_length=255,
+        description="Повтор запроса с тем же ключом вернёт исходный ответ без новой отправки"
+    )
 ):
     if notification_type not in [NotificationType.TELEGRAM, NotificationType.EMAIL]:
         raise HTTPException(
@@ -31,31 +57,171 @@ async def send_notification(
             detail=f"Invalid notification type. Must be one of: {[t.value for t in NotificationType]}"
         )
 
-    if notification_type == NotificationType.TELEGRAM:
-        background_tasks.add_task(
-            NotificationService.send_telegram_notification,
-            user_id,
-            message
-        )
-    elif notification_type == NotificationType.EMAIL:
-        background_tasks.add_task(
-            NotificationService.send_email_notification,
-            user_id,
-            message
-        )
-    else:
-        raise HTTPException(
-            status_code=400,
-            detail=f"err type {notification_type}"
+    notification_id = None
+    if idempotency_key:
+        notification_id = new_notification_id(user_id)
+        request_fingerprint = fingerprint(user_id, notification_type.value, message, priority.value, send_at)
+        try:
+            original_id = await idempotency_store.claim(
+                user_id, idempotency_key, notification_id, request_fingerprint
+            )
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if original_id is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            # Ответ строится по сохранённой записи — тот же, что у исходного запроса;
+            # если исходный запрос её ещё не создал — по параметрам, с которыми он её создаст
+            original = await NotificationService.get_notification(original_id)
+            if original is None:
+                original = NotificationRecord(
+                    id=original_id, user_id=user_id, message=message, type=notification_type,
+                    status=NotificationStatus.PENDING, priority=priority, send_at=due_send_at(send_at)
+                )
+            return _accepted_record(original)
+
+    try:
+        record = await NotificationService.create_notification(
+            user_id, message, notification_type, notification_id, priority, send_at
         )
+    except Exception:
+        if idempotency_key:
+            await idempotency_store.release(user_id, idempotency_key, notification_id, request_fingerprint)
+        raise
+    if not record.scheduled:
+        await dispatcher.dispatch(record)
 
+    return _accepted_record(record)
+
+def _accepted(notification_id: str, user_id: int, notification_type: NotificationType) -> dict:
     return {
         "message": "Notification processing started",
+        "id": notification_id,
         "user_id": user_id,
         "type": notification_type.value,
         "status": "accepted"
     }
 
+def _accepted_record(record: NotificationRecord) -> dict:
+    accepted = _accepted(record.id, record.user_id, record.type)
+    if record.scheduled:
+        accepted["send_at"] = record.send_at.isoformat()
+    return accepted
+
+def _json_bytes(value) -> bytes:
+    # Как у JSONResponse: UTF-8 без экранирования и без пробелов
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+def _records_response(content: dict) -> Response:
+    """
+    JSON-ответ, байт в байт как у JSONResponse; значения-списки — записи NotificationRecord,
+    их JSON (to_json) вклеивается в тело без dict и jsonable_encoder
+    """
+    body = b",".join(
+        _json_bytes(key) + b":" + (
+            b"[" + b",".join(record.to_json() for record in value) + b"]"
+            if isinstance(value, list) else _json_bytes(value)
+        )
+        for key, value in content.items()
+    )
+    return Response(b"{" + body + b"}", media_type="application/json")
+
+def _parse_batch_body(body: bytes, ndjson: bool) -> list:
+    if ndjson:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("Body must be a JSON array")
+    return items
+
+@router.post("/batch",
+    summary="Массовая отправка уведомлений",
+    description="Принимает JSON-массив или NDJSON (application/x-ndjson) объектов {user_id, message, type}; "
+                "необязательные поля — priority, send_at, idempotency_key",
+    response_description="id принятых уведомлений и ошибки по отклонённым",
+    status_code=202
+)
+async def send_notifications_batch(request: Request):
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    try:
+        raw_items = _parse_batch_body(await request.body(), ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+
+    if len(raw_items) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(raw_items)} > {settings.batch_max_items}"
+        )
+
+    valid: List[SendNotificationData] = []
+    valid_indexes: List[int] = []
+    rejected = []
+    for index, raw in enumerate(raw_items):
+        try:
+            valid.append(SendNotificationData.model_validate(raw))
+            valid_indexes.append(index)
+        except ValidationError as e:
+            rejected.append({"index": index, "errors": e.errors(include_url=False, include_input=False)})
+
+    # Элементы с ключом идемпотентности: повторы отдают исходный id без новой отправки
+    accepted = []
+    notification_ids = [
+        new_notification_id(item.user_id) if item.idempotency_key else None for item in valid
+    ]
+    claims = {
+        position: (
+            item.user_id,
+            item.idempotency_key,
+            notification_ids[position],
+            fingerprint(item.user_id, item.type, item.message, item.priority, item.send_at)
+        )
+        for position, item in enumerate(valid) if item.idempotency_key
+    }
+    stored_values = await idempotency_store.claim_many(list(claims.values())) if claims else []
+    for (position, (_, key, _, request_fingerprint)), stored in zip(list(claims.items()), stored_values):
+        if stored is None:
+            continue
+        del claims[position]
+        try:
+            original_id = idempotency_store.original(key, stored, request_fingerprint)
+            accepted.append({"index": valid_indexes[position], "id": original_id, "replayed": True})
+        except IdempotencyConflict as e:
+            rejected.append({"index": valid_indexes[position], "errors": [
+                {"type": "idempotency_conflict", "loc": ["idempotency_key"], "msg": str(e)}
+            ]})
+    fresh = [
+        position for position, item in enumerate(valid)
+        if not item.idempotency_key or position in claims
+    ]
+
+    queue_mode = settings.delivery_mode == "queue"
+    try:
+        created = await NotificationService.create_notifications(
+            [valid[position] for position in fresh],
+            enqueue=queue_mode,
+            notification_ids=[notification_ids[position] for position in fresh]
+        )
+    except Exception:
+        for user_id, key, notification_id, request_fingerprint in claims.values():
+            await idempotency_store.release(user_id, key, notification_id, request_fingerprint)
+        raise
+    await dispatcher.dispatch_many(created, enqueued=queue_mode)
+
+    accepted.extend(
+        {"index": valid_indexes[position], "id": record.id}
+        for position, record in zip(fresh, created)
+    )
+    accepted.sort(key=lambda entry: entry["index"])
+    rejected.sort(key=lambda entry: entry["index"])
+
+    return {
+        "message": "Batch processing started",
+        "accepted": accepted,
+        "rejected": rejected,
+        "accepted_count": len(accepted),
+        "rejected_count": len(rejected)
+    }
+
 @router.get("/",
     summary="Получение уведомлений пользователя",
     description="Получение списка уведомлений для конкретного пользователя с возможной фильтрацией по статусу",
@@ -63,16 +229,219 @@ async def send_notification(
 )
 async def get_notifications(
     user_id: int = Query(..., gt=0, description="ID пользователя"),
-    status: Optional[Literal["sent", "pending", "failed"]] = Query(None, description="Фильтр по статусу")
+    status: Optional[Literal["sent", "pending", "failed", "cancelled"]] = Query(None, description="Фильтр по статусу"),
+    cursor: Optional[str] = Query(None, description="Курсор страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(settings.history_page_size, ge=1, le=settings.history_max_page_size, description="Размер страницы"),
+    archive: bool = Query(False, description="Продолжать историю в архиве после записей в Redis")
 ):
     try:
         status_enum = NotificationStatus(status) if status else None
-        notifications = NotificationService.get_user_notifications(user_id, status_enum)
+        notifications, next_cursor = await NotificationService.get_user_notifications(
+            user_id, status_enum, cursor, limit, archive
+        )
+
+        with phase("serialize"):
+            return _records_response({
+                "user_id": user_id,
+                "notifications": notifications,
+                "count": len(notifications),
+                "next_cursor": next_cursor
+            })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/dead-letter",
+    summary="Уведомления, исчерпавшие попытки доставки",
+    description="Постраничный список уведомлений в статусе failed из dead-letter, от новых к старым",
+    response_description="Список недоставленных уведомлений"
+)
+async def get_dead_letter(
+    cursor: Optional[str] = Query(None, description="Курсор страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(settings.history_page_size, ge=1, le=settings.history_max_page_size, description="Размер страницы")
+):
+    try:
+        entries, next_cursor = await dead_letter_index.page(cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    records = await NotificationService.get_notifications_by_ids([member for member, _ in entries])
+    notifications = [record for record in records if record is not None]
+
+    return _records_response({
+        "notifications": notifications,
+        "count": len(notifications),
+        "next_cursor": next_cursor
+    })
+
+
+@router.get("/admin",
+    summary="Поиск уведомлений всех пользователей по статусу и каналу",
+    description="Постраничный список из индексов по статусу и каналу, от новых к старым. "
+                "Время — вход в текущий статус; у pending — когда уведомление должно уйти в доставку",
+    response_description="Список уведомлений"
+)
+async def search_notifications(
+    status: Optional[List[NotificationStatus]] = Query(None, description="Статусы (можно повторять), по умолчанию все"),
+    notification_type: Optional[List[NotificationType]] = Query(None, description="Каналы (можно повторять), по умолчанию все"),
+    since: Optional[datetime] = Query(None, description="Не раньше (UTC)"),
+    until: Optional[datetime] = Query(None, description="Раньше (UTC)"),
+    older_than: Optional[float] = Query(None, ge=0, description="Не позже, чем столько секунд назад"),
+    cursor: Optional[str] = Query(None, description="Курсор страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(settings.history_page_size, ge=1, le=settings.history_max_page_size, description="Размер страницы")
+):
+    until_score = to_timestamp(naive_utc(until)) if until else None
+    if older_than is not None:
+        until_score = min(until_score or float("inf"), time.time() - older_than)
+    try:
+        entries, next_cursor = await StatusIndex.page(
+            status or list(NotificationStatus),
+            notification_type or list(NotificationType),
+            to_timestamp(naive_utc(since)) if since else None,
+            until_score,
+            cursor,
+            limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    records = await NotificationService.get_notifications_by_ids([member for member, _ in entries])
+    notifications = [record for record in records if record is not None]
+
+    return _records_response({
+        "notifications": notifications,
+        "count": len(notifications),
+        "next_cursor": next_cursor
+    })
+
+
+@router.get("/export",
+    summary="Выгрузка истории уведомлений",
+    description="Потоковая выгрузка уведомлений всех пользователей в gzip-сжатом NDJSON с фильтрами по времени, статусу и каналу",
+    response_description="Файл notifications.ndjson.gz"
+)
+async def export_notifications(
+    since: Optional[datetime] = Query(None, description="created_at не раньше (UTC)"),
+    until: Optional[datetime] = Query(None, description="created_at раньше (UTC)"),
+    status: Optional[NotificationStatus] = Query(None, description="Фильтр по статусу"),
+    notification_type: Optional[NotificationType] = Query(None, description="Фильтр по каналу")
+):
+    export_filter = ExportFilter(since, until, status, notification_type)
+    return StreamingResponse(
+        NotificationExporter.stream(export_filter),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="notifications.ndjson.gz"'}
+    )
+
+
+@router.get("/stats",
+    summary="Счётчики уведомлений",
+    description="Число уведомлений по статусам и каналам: общее и для указанных пользователей (user_id можно повторять)",
+    response_description="Счётчики уведомлений"
+)
+async def get_stats(
+    user_id: Optional[List[int]] = Query(None, description="ID пользователей"),
+):
+    if user_id and len(user_id) > settings.stats_max_users:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many users: {len(user_id)} > {settings.stats_max_users}"
+        )
+    result = {"global": await NotificationStats.get_global()}
+    if user_id:
+        result["users"] = await NotificationStats.get_users(user_id)
+    return result
+
+
+@router.get("/cache/stats",
+    summary="Статистика кэша истории",
+    description="Счётчики попаданий, промахов и вытеснений кэша истории в этом процессе",
+    response_description="Счётчики кэша"
+)
+async def get_cache_stats():
+    return history_cache.stats()
+
+
+async def _server_sent_events(user_id: int):
+    async for kind, event in push_hub.listen(user_id):
+        if kind == "ping":
+            yield b": ping\n\n"
+        else:
+            yield f"event: {kind}\ndata: {json.dumps(event or {})}\n\n".encode()
+
 
-        return {
-            "user_id": user_id,
-            "notifications": [notification.dict() for notification in notifications],
-            "count": len(notifications)
-        }
+@router.get("/stream",
+    summary="Поток изменений статусов",
+    description="Server-Sent Events: событие status на каждое создание и смену статуса уведомления пользователя. "
+                "Событие reset — часть изменений потеряна, историю нужно перечитать и переподключиться",
+    response_description="Поток text/event-stream"
+)
+async def stream_notifications(
+    user_id: int = Query(..., gt=0, description="ID пользователя")
+):
+    try:
+        push_hub.check_available()
+    except PushUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return StreamingResponse(
+        _server_sent_events(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _check_notification_id(notification_id: str) -> None:
+    try:
+        parse_notification_id(notification_id)
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/{notification_id}/cancel",
+    summary="Отмена отложенной отправки",
+    description="Отменяет уведомление с send_at, которое ещё не отдано в доставку; статус становится cancelled",
+    response_description="Отменённое уведомление"
+)
+async def cancel_notification(notification_id: str):
+    _check_notification_id(notification_id)
+    try:
+        record = await NotificationService.cancel_scheduled(notification_id)
+    except (NotScheduled, InvalidTransition) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Notification {notification_id} not found")
+    return Response(record.to_json(), media_type="application/json")
+
+
+@router.post("/{notification_id}/reschedule",
+    summary="Перенос отложенной отправки",
+    description="Переносит уведомление с send_at, которое ещё не отдано в доставку, на новое время",
+    response_description="Уведомление с новым send_at"
+)
+async def reschedule_notification(
+    notification_id: str,
+    send_at: datetime = Query(..., description="Новое время отправки; без часового пояса — UTC")
+):
+    _check_notification_id(notification_id)
+    try:
+        record = await NotificationService.reschedule(notification_id, send_at)
+    except NotScheduled as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Notification {notification_id} not found")
+    return Response(record.to_json(), media_type="application/json")
+
+
+# Должен быть последним: иначе перехватит статические пути вида /dead-letter
+@router.get("/{notification_id}",
+    summary="Получение уведомления по id",
+    description="Возвращает одно уведомление по id, полученному при отправке",
+    response_description="Уведомление"
+)
+async def get_notification(notification_id: str):
+    try:
+        parse_notification_id(notification_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    record = await NotificationService.get_notification(notification_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Notification {notification_id} not found")
+    return Response(record.to_json(), media_type="application/json")
@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.health import health
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/livez",
+    summary="Проверка жизни процесса",
+    description="Отвечает, пока работает цикл событий; Redis не проверяется, чтобы его сбой не перезапускал процессы",
+    response_description="Процесс жив"
+)
+async def livez():
+    return {"status": "ok"}
+
+
+@router.get("/readyz",
+    summary="Готовность принимать запросы",
+    description="503 до окончания прогрева и пока Redis не отвечает; в ответе задержка Redis и отставание очередей",
+    response_description="Задержка Redis, отставание очередей и длительность шагов прогрева"
+)
+async def readyz():
+    try:
+        return await health.readiness()
+    except RuntimeError as e:
+        return JSONResponse({"status": "unavailable", "detail": str(e)}, status_code=503)
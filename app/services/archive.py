@@ -0,0 +1,120 @@
+import bisect
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models.notification import NotificationRecord
+from app.services.timeindex import next_cursor, parse_cursor
+
+# Курсор истории, перешедшей из Redis в архив
+ARCHIVE_CURSOR_PREFIX = "archive:"
+
+
+def _score(record: NotificationRecord) -> float:
+    """Тот же score, что у записи в user_notifications"""
+    return record.created_at.timestamp()
+
+
+class ArchiveStore:
+    """
+    Архив уведомлений на локальном диске, по сегменту на день created_at.
+    `{day}.seg` — только дописываемая последовательность gzip-блоков,
+    `{day}.idx` — строка JSON на блок: смещение, длина, интервал времени и пользователи блока.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, day: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{day}.{suffix}")
+
+    def append(self, records: List[NotificationRecord]) -> None:
+        """
+        Дописывает записи блоком в сегмент каждого дня. Строка индекса пишется
+        после данных: блок без индекса не читается, и записи остаются в Redis.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        by_day: Dict[str, List[NotificationRecord]] = {}
+        for record in records:
+            by_day.setdefault(record.created_at.date().isoformat(), []).append(record)
+
+        for day, day_records in by_day.items():
+            day_records.sort(key=lambda record: (record.user_id, record.created_at))
+            block = gzip.compress(
+                b"".join(record.to_json() + b"\n" for record in day_records)
+            )
+            with open(self._path(day, "seg"), "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(block)
+                f.flush()
+                os.fsync(f.fileno())
+
+            scores = [_score(record) for record in day_records]
+            entry = {
+                "offset": offset,
+                "length": len(block),
+                "count": len(day_records),
+                "min_score": min(scores),
+                "max_score": max(scores),
+                "users": sorted({record.user_id for record in day_records}),
+            }
+            with open(self._path(day, "idx"), "a") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def days(self) -> List[str]:
+        """Дни архива от новых к старым"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            (name[:-len(".idx")] for name in os.listdir(self.directory) if name.endswith(".idx")),
+            reverse=True
+        )
+
+    def read_user_day(self, day: str, user_id: int, max_score: float) -> List[NotificationRecord]:
+        """Записи пользователя за день со score <= max_score; читаются только его блоки"""
+        with open(self._path(day, "idx")) as f:
+            blocks = [json.loads(line) for line in f if line.strip()]
+
+        records: Dict[str, NotificationRecord] = {}
+        with open(self._path(day, "seg"), "rb") as seg:
+            for block in blocks:
+                users = block["users"]
+                position = bisect.bisect_left(users, user_id)
+                if position == len(users) or users[position] != user_id:
+                    continue
+                if block["min_score"] > max_score:
+                    continue
+                seg.seek(block["offset"])
+                for line in gzip.decompress(seg.read(block["length"])).splitlines():
+                    record = NotificationRecord.model_validate_json(line)
+                    # Повтор блока после сбоя компактора между записью и удалением из Redis
+                    if record.user_id == user_id and _score(record) <= max_score:
+                        records[record.id] = record
+        return list(records.values())
+
+    def page_user(
+        self, user_id: int, cursor: Optional[str], limit: int
+    ) -> Tuple[List[NotificationRecord], Optional[str]]:
+        """Страница архивной истории пользователя с тем же курсором, что и у индекса в Redis"""
+        max_score, offset = parse_cursor(cursor)
+        bound = float(max_score)
+        candidates: List[NotificationRecord] = []
+        for day in self.days():
+            if datetime.fromisoformat(day).timestamp() > bound:
+                continue
+            records = self.read_user_day(day, user_id, bound)
+            # Порядок как у ZREVRANGEBYSCORE: по score, при равенстве — по id
+            records.sort(key=lambda record: (_score(record), record.id), reverse=True)
+            candidates.extend(records)
+            if len(candidates) >= offset + limit:
+                break
+
+        page = candidates[offset:offset + limit]
+        return page, next_cursor([_score(record) for record in page], max_score, offset, limit)
+
+
+archive_store = ArchiveStore(settings.archive_dir)
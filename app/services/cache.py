@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+from app.config import settings
+from app.services.events import event_bus
+
+
+class HistoryCache:
+    """
+    LRU + TTL кэш страниц истории внутри процесса.
+    Записи пользователя сбрасываются по событию из event_bus; пока подписки нет, кэш не используется.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[int, Hashable], Tuple[float, object]]" = OrderedDict()
+        self._by_user: Dict[int, Set[Hashable]] = {}
+        # Логические часы инвалидаций: время последней инвалидации каждого пользователя
+        # (не больше max_entries записей; всё старше _floor считается инвалидированным)
+        self._clock = 0
+        self._floor = 0
+        self._invalidated: "OrderedDict[int, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def active(self) -> bool:
+        return settings.cache_enabled and event_bus.connected
+
+    def generation(self) -> int:
+        """Снимок часов перед чтением из Redis, см. put"""
+        return self._clock
+
+    def get(self, user_id: int, query: Hashable) -> Optional[object]:
+        if not self.active:
+            return None
+        entry = self._entries.get((user_id, query))
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop((user_id, query))
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, query))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: int, query: Hashable, value: object, generation: int) -> None:
+        # Если пока читали, пришла инвалидация — результат мог устареть
+        if not self.active or generation < self._floor:
+            return
+        if self._invalidated.get(user_id, 0) > generation:
+            return
+        self._entries[(user_id, query)] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end((user_id, query))
+        self._by_user.setdefault(user_id, set()).add(query)
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._forget(key)
+            self.evictions += 1
+
+    def _forget(self, key: Tuple[int, Hashable]) -> None:
+        user_id, query = key
+        queries = self._by_user.get(user_id)
+        if queries is not None:
+            queries.discard(query)
+            if not queries:
+                del self._by_user[user_id]
+
+    def _drop(self, key: Tuple[int, Hashable]) -> None:
+        self._entries.pop(key, None)
+        self._forget(key)
+
+    def invalidate(self, user_id: int) -> None:
+        self._clock += 1
+        self._invalidated[user_id] = self._clock
+        self._invalidated.move_to_end(user_id)
+        if len(self._invalidated) > self.max_entries:
+            _, self._floor = self._invalidated.popitem(last=False)
+        for query in self._by_user.pop(user_id, ()):
+            self._entries.pop((user_id, query), None)
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+        self._clock += 1
+        self._floor = self._clock
+
+    def on_event(self, event: dict) -> None:
+        self.invalidate(int(event["user_id"]))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.cache_enabled,
+            "active": self.active,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+history_cache = HistoryCache(settings.cache_max_entries, settings.cache_ttl)
+event_bus.subscribe(history_cache.on_event, on_reset=history_cache.clear)
@@ -0,0 +1,89 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+from app.config import settings
+from app.models.notification import NotificationRecord, NotificationStatus
+from app.services import scripts
+from app.services.archive import archive_store
+from app.services.cache import history_cache
+from app.services.events import event_bus
+from app.services.export import ExportFilter, NotificationExporter
+from app.services.keys import notification_key, parse_notification_id, user_index_key
+from app.services.notifications import NotificationService
+from app.services.redis import redis_service
+from app.services.status_index import StatusIndex
+from app.services.timeindex import dead_letter_index
+
+# Статусы, после которых уведомление больше не меняется
+ARCHIVED_STATUSES = (NotificationStatus.SENT, NotificationStatus.FAILED, NotificationStatus.CANCELLED)
+
+
+class ArchiveCompactor:
+    """
+    Переносит уведомления в конечном статусе старше retention_days из Redis в archive_store.
+    Одновременно работает один компактор: блокировка archive_lock_key в Redis.
+    """
+
+    async def _acquire(self, token: str) -> bool:
+        async with redis_service.get_connection() as r:
+            return bool(await r.set(
+                settings.archive_lock_key, token, nx=True, ex=settings.archive_lock_ttl
+            ))
+
+    async def _release(self, token: str) -> None:
+        async with redis_service.get_connection() as r:
+            script = r.register_script(scripts.DELETE_IF_EQUAL)
+            await script(keys=[settings.archive_lock_key], args=[token])
+
+    async def _move(self, records: List[NotificationRecord]) -> int:
+        """Сначала запись на диск, затем удаление из Redis: при сбое запись не теряется"""
+        await asyncio.to_thread(archive_store.append, records)
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for record in records:
+                    _, local_id = parse_notification_id(record.id)
+                    pipe.delete(notification_key(record.id))
+                    # local_id — член индекса у записей старого формата
+                    pipe.zrem(user_index_key(record.user_id), record.id, local_id)
+                    dead_letter_index.remove_in(pipe, record.id)
+                    StatusIndex.remove_in(pipe, record)
+                    event_bus.publish_in(pipe, NotificationService._event(record))
+                await pipe.execute()
+
+        for user_id in {record.user_id for record in records}:
+            history_cache.invalidate(user_id)
+        return len(records)
+
+    async def compact_once(self) -> int:
+        """Один проход по всем уведомлениям; возвращает число перенесённых"""
+        token = uuid.uuid4().hex
+        if not await self._acquire(token):
+            return 0
+
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=settings.retention_days)
+            moved = 0
+            batch: List[NotificationRecord] = []
+            async for record in NotificationExporter.iter_records(ExportFilter(until=cutoff)):
+                if record.status not in ARCHIVED_STATUSES:
+                    continue
+                batch.append(record)
+                if len(batch) >= settings.archive_batch_size:
+                    moved += await self._move(batch)
+                    batch = []
+            if batch:
+                moved += await self._move(batch)
+            return moved
+        finally:
+            await self._release(token)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.compact_once()
+            except Exception as e:
+                print(f"Archive compaction failed: {e}")
+            await asyncio.sleep(settings.archive_interval)
+
+compactor = ArchiveCompactor()
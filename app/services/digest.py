@@ -0,0 +1,65 @@
+import time
+from typing import List
+from app.config import settings
+from app.models.notification import NotificationPriority, NotificationRecord, NotificationType
+from app.services.keys import digest_key
+from app.services.redis import redis_service
+from app.services.timeindex import digest_index
+
+
+def digest_member(notification_type: NotificationType, user_id: int) -> str:
+    return f"{notification_type.value}:{user_id}"
+
+
+def digest_message(records: List[NotificationRecord]) -> str:
+    """Текст сводки: одно уведомление отправляется как есть, несколько — списком"""
+    if len(records) == 1:
+        return records[0].message
+    return "\n".join(f"• {record.message}" for record in records)
+
+
+class DigestBuffer:
+    """
+    Буфер уведомлений пользователя по каналу: список id в Redis и срок сводки в digest_index.
+    Срок ставится первым уведомлением окна и сдвигается на «сейчас» при digest_max_items.
+    """
+
+    @staticmethod
+    def enabled(notification_type: NotificationType) -> bool:
+        return notification_type.value in settings.digest_channels
+
+    @staticmethod
+    def accepts(record: NotificationRecord) -> bool:
+        """Критичные (коды, OTP) не ждут окна сводки и уходят сразу в свою полосу"""
+        return DigestBuffer.enabled(record.type) and record.priority != NotificationPriority.CRITICAL
+
+    @staticmethod
+    async def add(records: List[NotificationRecord]) -> None:
+        now = time.time()
+        members = [digest_member(record.type, record.user_id) for record in records]
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for record, member in zip(records, members):
+                    pipe.rpush(digest_key(member), record.id)
+                    pipe.zadd(digest_index.key, {member: now + settings.digest_window}, nx=True)
+                results = await pipe.execute()
+
+            full = {
+                member for member, length in zip(members, results[::2])
+                if length >= settings.digest_max_items
+            }
+            if full:
+                await r.zadd(digest_index.key, {member: now for member in full}, lt=True)
+
+    @staticmethod
+    async def take(member: str) -> List[str]:
+        """Атомарно забирает накопленные id"""
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.lrange(digest_key(member), 0, -1)
+                pipe.delete(digest_key(member))
+                notification_ids, _ = await pipe.execute()
+        return notification_ids
+
+
+digest_buffer = DigestBuffer()
@@ -0,0 +1,37 @@
+import asyncio
+from app.config import settings
+from app.models.notification import NotificationStatus
+from app.services.digest import digest_buffer
+from app.services.dispatcher import dispatcher
+from app.services.notifications import NotificationService
+from app.services.timeindex import digest_index
+
+class DigestPoller:
+    """Забирает сводки с наступившим сроком и отдаёт каждую в доставку одной задачей"""
+
+    async def flush(self, member: str) -> int:
+        notification_ids = await digest_buffer.take(member)
+        records = [
+            record for record in await NotificationService.get_notifications_by_ids(notification_ids)
+            if record is not None and record.status == NotificationStatus.PENDING
+        ]
+        if records:
+            dispatcher.submit(records[0], lambda _: NotificationService.deliver_digest(records))
+        return len(records)
+
+    async def poll_once(self) -> int:
+        members = await digest_index.pop_due(settings.digest_batch_size)
+        for member in members:
+            await self.flush(member)
+        return len(members)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if await self.poll_once() >= settings.digest_batch_size:
+                    continue
+            except Exception as e:
+                print(f"Digest poll failed: {e}")
+            await asyncio.sleep(settings.digest_poll_interval)
+
+digest_poller = DigestPoller()
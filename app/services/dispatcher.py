@@ -0,0 +1,302 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from app.config import settings
+from app.models.notification import NotificationPriority, NotificationRecord, NotificationType
+from app.services.digest import digest_buffer
+from app.services.keys import rate_limit_key
+from app.services.metrics import DELIVERIES_IN_FLIGHT, DISPATCH_QUEUE_DEPTH, QUEUE_TIME
+from app.services.notifications import NotificationService
+from app.services.queue import delivery_queue
+from app.services.ratelimit import rate_limiter
+
+Deliver = Callable[[NotificationRecord], Awaitable[NotificationRecord]]
+
+def _consume_result(future: asyncio.Future) -> None:
+    # Ошибка уже залогирована; помечаем её полученной для fire-and-forget отправок
+    if not future.cancelled():
+        future.exception()
+
+
+class PriorityLanes:
+    """
+    Очереди полос приоритета со взвешенным справедливым выбором (stride scheduling):
+    у полосы «проход» растёт на 1/вес с каждой выданной задачей, выдаётся полоса
+    с наименьшим проходом. Доля полосы под нагрузкой пропорциональна весу, а полоса,
+    долго стоявшая пустой, не копит кредит и не забирает всё разом.
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = {priority: weights[priority.value] for priority in NotificationPriority}
+        self._lanes: Dict[NotificationPriority, deque] = {priority: deque() for priority in NotificationPriority}
+        self._pass = {priority: 0.0 for priority in NotificationPriority}
+        self._now = 0.0
+        self._items = asyncio.Semaphore(0)
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def _append(self, priority: NotificationPriority, enqueued_at: float, item) -> None:
+        lane = self._lanes[priority]
+        if not lane:
+            self._pass[priority] = max(self._pass[priority], self._now)
+        lane.append((enqueued_at, item))
+        self._items.release()
+
+    def put_nowait(self, priority: NotificationPriority, item) -> None:
+        self._append(priority, time.monotonic(), item)
+        self._unfinished += 1
+        self._finished.clear()
+
+    def requeue(self, priority: NotificationPriority, enqueued_at: float, item) -> None:
+        """Возвращает выданную задачу в конец полосы; для join она по-прежнему не завершена"""
+        self._append(priority, enqueued_at, item)
+
+    async def claim(self) -> None:
+        """Резервирует задачу: после claim pop не бывает пустым"""
+        await self._items.acquire()
+
+    def pop(self) -> Tuple[NotificationPriority, float, object]:
+        """Полоса с наименьшим проходом; при равенстве — более срочная"""
+        priority = min(
+            (priority for priority, lane in self._lanes.items() if lane),
+            key=lambda priority: self._pass[priority]
+        )
+        self._now = self._pass[priority]
+        self._pass[priority] += 1 / self.weights[priority]
+        enqueued_at, item = self._lanes[priority].popleft()
+        return priority, enqueued_at, item
+
+    def task_done(self) -> None:
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+
+class ChannelDispatcher:
+    """
+    Доставка одного канала фиксированным числом воркеров.
+    Всё, что не помещается в лимиты, ждёт в полосах приоритета, а не порождает новые задачи.
+    Задача выбирается после получения токена канала: срочное уведомление,
+    пришедшее во время ожидания лимита, уходит следующим.
+    Задачи получателя, упёршегося в свой лимит, откладываются в сторону до появления токена,
+    а воркер с токеном канала берёт следующую задачу: один частый получатель не занимает воркеры.
+    """
+
+    def __init__(
+        self,
+        notification_type: NotificationType,
+        deliver: Deliver,
+        concurrency: int,
+        rate: float,
+        burst: int,
+        recipient_rate: float,
+        recipient_burst: int
+    ):
+        self.notification_type = notification_type
+        self.deliver = deliver
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[PriorityLanes] = None
+        self._workers: List[asyncio.Task] = []
+        # Отложенные задачи получателей, ждущих токен, и таймеры их возврата в полосы
+        self._parked: Dict[int, List[Tuple[NotificationPriority, float, object]]] = {}
+        self._unpark_timers: Dict[int, asyncio.TimerHandle] = {}
+        self._in_flight = DELIVERIES_IN_FLIGHT.labels(notification_type.value)
+        self._queue_time = {
+            priority: QUEUE_TIME.labels(notification_type.value, priority.value)
+            for priority in NotificationPriority
+        }
+        # Значение выставляется при каждом изменении очереди: set_function не пишется в файлы
+        # multiprocess-режима, и /metrics собранный из воркеров показывал бы 0
+        self._queue_depth = DISPATCH_QUEUE_DEPTH.labels(notification_type.value)
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = PriorityLanes(settings.priority_weights)
+        self._parked = {}
+        self._unpark_timers = {}
+        self._workers = [
+            loop.create_task(self._work()) for _ in range(self.concurrency)
+        ]
+
+    @property
+    def queued(self) -> int:
+        if self._queue is None:
+            return 0
+        return self._queue.qsize() + sum(len(entries) for entries in self._parked.values())
+
+    async def _acquire(self, rate: float, burst: int) -> None:
+        key = rate_limit_key(self.notification_type.value)
+        while True:
+            wait_ms = await rate_limiter.acquire([(key, rate, burst)])
+            if wait_ms <= 0:
+                return
+            await asyncio.sleep(wait_ms / 1000)
+
+    def _park(self, user_id: int, entry, wait_ms: int = 0) -> None:
+        """Откладывает задачу получателя; wait_ms — когда вернуть его задачи в полосы"""
+        self._parked.setdefault(user_id, []).append(entry)
+        if user_id not in self._unpark_timers:
+            self._unpark_timers[user_id] = self._loop.call_later(wait_ms / 1000, self._unpark, user_id)
+
+    def _unpark(self, user_id: int) -> None:
+        self._unpark_timers.pop(user_id, None)
+        for entry in self._parked.pop(user_id, []):
+            self._queue.requeue(*entry)
+
+    async def _next(self):
+        """
+        Задача, для получателя которой есть токен. Задачи отложенных получателей
+        откладываются без запроса к Redis; первая задача получателя без токена откладывает его.
+        """
+        while True:
+            entry = self._queue.pop()
+            record, future, _ = entry[2]
+            if record.user_id in self._parked:
+                self._park(record.user_id, entry)
+            else:
+                key = rate_limit_key(self.notification_type.value, record.user_id)
+                try:
+                    wait_ms = await rate_limiter.acquire([(key, self.recipient_rate, self.recipient_burst)])
+                except Exception as e:
+                    print(f"Delivery via {self.notification_type.value} failed: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+                    self._queue.task_done()
+                else:
+                    if wait_ms <= 0:
+                        return entry
+                    self._park(record.user_id, entry, wait_ms)
+            # Токен канала уже взят и достаётся следующей задаче
+            await self._queue.claim()
+
+    async def _work(self) -> None:
+        while True:
+            await self._queue.claim()
+            await self._acquire(self.rate, self.burst)
+            priority, enqueued_at, (record, future, deliver) = await self._next()
+            self._queue_depth.set(self.queued)
+            try:
+                with self._in_flight.track_inprogress():
+                    self._queue_time[priority].observe(time.monotonic() - enqueued_at)
+                    result = await deliver(record)
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                print(f"Delivery via {self.notification_type.value} failed: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, record: NotificationRecord, deliver: Optional[Deliver] = None) -> asyncio.Future:
+        """deliver заменяет доставку канала для этой задачи (сводки); лимиты берутся по record"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        future.add_done_callback(_consume_result)
+        self._queue.put_nowait(record.priority, (record, future, deliver or self.deliver))
+        self._queue_depth.set(self.queued)
+        return future
+
+    async def join(self) -> None:
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self) -> None:
+        # Воркеры, запущенные в другом (уже завершённом) цикле, просто отбрасываем
+        if self._loop is asyncio.get_running_loop():
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        for timer in self._unpark_timers.values():
+            timer.cancel()
+        self._unpark_timers = {}
+        self._parked = {}
+        self._workers = []
+        self._loop = None
+        self._queue = None
+        self._queue_depth.set(0)
+
+
+class Dispatcher:
+    def __init__(self, channels: Dict[NotificationType, ChannelDispatcher]):
+        self.channels = channels
+
+    def submit(self, record: NotificationRecord, deliver: Optional[Deliver] = None) -> asyncio.Future:
+        """Ставит уведомление в очередь своего канала; future завершится после доставки"""
+        return self.channels[record.type].submit(record, deliver)
+
+    async def dispatch(self, record: NotificationRecord) -> None:
+        """
+        Передаёт уже сохранённое уведомление в доставку согласно delivery_mode,
+        а уведомления каналов из digest_channels, кроме критичных, — в буфер сводок.
+        """
+        if digest_buffer.accepts(record):
+            await digest_buffer.add([record])
+        elif settings.delivery_mode == "queue":
+            await delivery_queue.enqueue(record.id, record.priority)
+        else:
+            self.submit(record)
+
+    async def dispatch_many(self, records: List[NotificationRecord], enqueued: bool = False) -> None:
+        """
+        Как dispatch для пачки; enqueued — задачи уже добавлены в стрим вместе с записями.
+        Отложенные уведомления пропускаются: их в срок отдаёт SchedulePoller.
+        """
+        records = [record for record in records if not record.scheduled]
+        digests = [record for record in records if digest_buffer.accepts(record)]
+        if digests:
+            await digest_buffer.add(digests)
+        if not enqueued:
+            self.submit_many(record for record in records if not digest_buffer.accepts(record))
+
+    def submit_many(self, records: Iterable[NotificationRecord]) -> None:
+        for record in records:
+            self.submit(record)
+
+    async def join(self) -> None:
+        await asyncio.gather(*(channel.join() for channel in self.channels.values()))
+
+    async def close(self) -> None:
+        await asyncio.gather(*(channel.close() for channel in self.channels.values()))
+
+
+dispatcher = Dispatcher({
+    NotificationType.TELEGRAM: ChannelDispatcher(
+        NotificationType.TELEGRAM,
+        NotificationService.deliver,
+        concurrency=settings.telegram_concurrency,
+        rate=settings.telegram_rate_limit,
+        burst=settings.telegram_burst,
+        recipient_rate=settings.telegram_recipient_rate_limit,
+        recipient_burst=settings.telegram_recipient_burst
+    ),
+    NotificationType.EMAIL: ChannelDispatcher(
+        NotificationType.EMAIL,
+        NotificationService.deliver,
+        concurrency=settings.email_concurrency,
+        rate=settings.email_rate_limit,
+        burst=settings.email_burst,
+        recipient_rate=settings.email_recipient_rate_limit,
+        recipient_burst=settings.email_recipient_burst
+    ),
+})
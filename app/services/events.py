@@ -0,0 +1,69 @@
+import asyncio
+import json
+from typing import Callable, List
+from app.config import settings
+from app.services.redis import redis_service
+
+Handler = Callable[[dict], None]
+
+
+class EventBus:
+    """
+    События об изменении уведомлений через Redis pub/sub.
+    В каждом процессе одна подписка, события раздаются локальным обработчикам.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.connected = False
+        self._handlers: List[Handler] = []
+        self._reset_handlers: List[Callable[[], None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return settings.cache_enabled or settings.push_enabled
+
+    def subscribe(self, handler: Handler, on_reset: Callable[[], None] = None) -> None:
+        """on_reset вызывается при потере подписки: события за это время могли пропасть"""
+        self._handlers.append(handler)
+        if on_reset is not None:
+            self._reset_handlers.append(on_reset)
+
+    def encode(self, event: dict) -> str:
+        return json.dumps(event, separators=(",", ":"))
+
+    def publish_in(self, pipe, event: dict) -> None:
+        if self.enabled:
+            pipe.publish(self.channel, self.encode(event))
+
+    def dispatch(self, event: dict) -> None:
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Event handler failed: {e}")
+
+    def _reset(self) -> None:
+        self.connected = False
+        for handler in self._reset_handlers:
+            handler()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                async with redis_service.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self.connected = True
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                self._reset()
+                raise
+            except Exception as e:
+                print(f"Event subscription lost: {e}")
+            self._reset()
+            await asyncio.sleep(1)
+
+
+event_bus = EventBus(settings.events_channel)
@@ -0,0 +1,109 @@
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from app.config import settings
+from app.models.notification import NotificationRecord, NotificationStatus, NotificationType, naive_utc
+from app.services.keys import NOTIFICATION_PREFIX, notification_id_from_key
+from app.services.redis import redis_service
+
+
+class ExportFilter:
+    """Фильтр выгрузки: created_at в [since, until), статус и канал"""
+
+    def __init__(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        status: Optional[NotificationStatus] = None,
+        notification_type: Optional[NotificationType] = None
+    ):
+        self.since = naive_utc(since)
+        self.until = naive_utc(until)
+        self.status = status
+        self.type = notification_type
+
+    def match(self, record: NotificationRecord) -> bool:
+        if self.since is not None and record.created_at < self.since:
+            return False
+        if self.until is not None and record.created_at >= self.until:
+            return False
+        if self.status is not None and record.status != self.status:
+            return False
+        if self.type is not None and record.type != self.type:
+            return False
+        return True
+
+
+class NotificationExporter:
+    @staticmethod
+    async def iter_records(
+        export_filter: ExportFilter, scan_count: Optional[int] = None
+    ) -> AsyncIterator[NotificationRecord]:
+        """
+        Обходит все уведомления инкрементальным SCAN: за шаг — одна порция ключей
+        и один pipeline HGETALL, в памяти держится только текущая порция.
+        Записи, изменённые во время обхода, могут попасть в выгрузку в любом состоянии.
+        """
+        count = scan_count or settings.export_scan_count
+        async with redis_service.get_connection() as r:
+            keys = []
+            # scan_iter обходит и все узлы Redis Cluster
+            async for key in r.scan_iter(match=f"{NOTIFICATION_PREFIX}:*", count=count):
+                keys.append(key)
+                if len(keys) >= count:
+                    async for record in NotificationExporter._load(r, keys, export_filter):
+                        yield record
+                    keys = []
+            async for record in NotificationExporter._load(r, keys, export_filter):
+                yield record
+
+    @staticmethod
+    async def _load(r, keys: List[str], export_filter: ExportFilter) -> AsyncIterator[NotificationRecord]:
+        if not keys:
+            return
+        async with r.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(key)
+            rows = await pipe.execute()
+        for key, data in zip(keys, rows):
+            if not data:
+                continue
+            try:
+                record = NotificationRecord.from_redis_hash(data, notification_id_from_key(key))
+            except Exception as e:
+                print(f"Error parsing notification {key}: {e}")
+                continue
+            if export_filter.match(record):
+                yield record
+
+    @staticmethod
+    async def iter_ndjson(records: AsyncIterator[NotificationRecord]) -> AsyncIterator[bytes]:
+        async for record in records:
+            yield record.to_json() + b"\n"
+
+    @staticmethod
+    async def gzip_chunks(
+        lines: AsyncIterator[bytes], chunk_size: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Сжимает поток строк в gzip, отдавая блоки не меньше chunk_size байт"""
+        chunk_size = chunk_size or settings.export_chunk_size
+        compressor = zlib.compressobj(settings.export_compression_level, zlib.DEFLATED, 31)
+        buffer = []
+        size = 0
+        async for line in lines:
+            buffer.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                compressed = compressor.compress(b"".join(buffer))
+                buffer.clear()
+                size = 0
+                if compressed:
+                    yield compressed
+        yield compressor.compress(b"".join(buffer)) + compressor.flush()
+
+    @staticmethod
+    def stream(export_filter: ExportFilter) -> AsyncIterator[bytes]:
+        """gzip-сжатый NDJSON всех уведомлений, подходящих под фильтр"""
+        return NotificationExporter.gzip_chunks(
+            NotificationExporter.iter_ndjson(NotificationExporter.iter_records(export_filter))
+        )
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Dict, Optional
+import fastapi.routing
+from fastapi import FastAPI
+from app.config import settings
+from app.models.notification import NotificationRecord, NotificationStatus, NotificationType
+from app.models.user import SendNotificationData
+from app.services import scripts
+from app.services.queue import delivery_queue
+from app.services.redis import redis_service
+from app.services.timeindex import retry_index, schedule_index
+
+
+def _warm_codecs() -> None:
+    """Первые кодирование и разбор записи во всех форматах — до первого запроса"""
+    record = NotificationRecord(
+        id="1:warmup", user_id=1, message="warm-up", type=NotificationType.EMAIL,
+        status=NotificationStatus.PENDING
+    )
+    for data in (record.to_legacy_hash(), record.to_compact_hash()):
+        NotificationRecord.from_redis_hash({key: str(value) for key, value in data.items()}, record.id)
+    record.to_json()
+    SendNotificationData.model_validate({"user_id": 1, "message": "warm-up", "type": "email"})
+
+
+def _warm_routes(app: FastAPI) -> None:
+    """
+    FastAPI при первом запросе к маршруту читает исходник обработчика для контекста ошибок
+    (inspect.getsourcelines, десятки мс) и кэширует результат — читаем заранее
+    """
+    extract = getattr(fastapi.routing, "_extract_endpoint_context", None)
+    if extract is None:
+        return
+    for route in app.routes:
+        if isinstance(route, fastapi.routing.APIRoute):
+            extract(route.dependant.call)
+
+
+class Health:
+    """
+    Прогрев процесса API в lifespan и проверка готовности для /readyz.
+    Процесс готов после прогрева, пока Redis отвечает на PING.
+    """
+
+    def __init__(self):
+        self.warmed_up = False
+        self.startup_ms: Dict[str, float] = {}
+
+    async def _step(self, name: str, step) -> None:
+        started = time.perf_counter()
+        try:
+            await step
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {e}")
+        self.startup_ms[name] = (time.perf_counter() - started) * 1000
+
+    async def warm_up(self, app: Optional[FastAPI] = None) -> None:
+        """Соединения пула, Lua-скрипты, кодеки моделей и маршруты; длительность шагов — в startup_ms"""
+        if await redis_service.connect():
+            connections = min(settings.redis_warm_connections, settings.redis_max_connections)
+            await self._step("redis_pool", redis_service.warm_up(connections))
+            await self._step("scripts", redis_service.load_scripts(scripts.ALL_SCRIPTS))
+        warm_ups = [("codecs", _warm_codecs)]
+        if app is not None:
+            warm_ups.append(("routes", lambda: _warm_routes(app)))
+        for name, warm in warm_ups:
+            started = time.perf_counter()
+            warm()
+            self.startup_ms[name] = (time.perf_counter() - started) * 1000
+        self.warmed_up = True
+
+    async def _queue_lag(self) -> dict:
+        """Задачи в стримах доставки и возраст самой старой; опоздание поллеров повторов и отложенных"""
+        now = time.time()
+        streams = list(delivery_queue.streams.values())
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for stream in streams:
+                    pipe.xlen(stream)
+                    pipe.xrange(stream, count=1)
+                pipe.zrange(retry_index.key, 0, 0, withscores=True)
+                pipe.zrange(schedule_index.key, 0, 0, withscores=True)
+                *lanes, retry, schedule = await pipe.execute()
+
+        depth = 0
+        oldest: Optional[float] = None
+        for size, first in zip(lanes[::2], lanes[1::2]):
+            depth += size
+            if first:
+                # id записи стрима — `{мс}-{номер}`
+                added = int(first[0][0].partition("-")[0]) / 1000
+                oldest = added if oldest is None else min(oldest, added)
+
+        def overdue(entries) -> float:
+            return max(0.0, now - entries[0][1]) if entries else 0.0
+
+        return {
+            "queue_depth": depth,
+            "queue_lag_s": max(0.0, now - oldest) if oldest is not None else 0.0,
+            "retry_lag_s": overdue(retry),
+            "schedule_lag_s": overdue(schedule),
+        }
+
+    async def readiness(self) -> dict:
+        """Задержка PING и отставание очередей; RuntimeError — процесс не готов принимать запросы"""
+        if not self.warmed_up:
+            raise RuntimeError("Warm-up is not finished")
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(redis_service.connection.ping(), settings.readiness_timeout)
+        except Exception as e:
+            raise RuntimeError(f"Redis is unavailable: {e!r}")
+        latency_ms = (time.perf_counter() - started) * 1000
+        try:
+            lag = await self._queue_lag()
+        except Exception as e:
+            raise RuntimeError(f"Redis is unavailable: {e!r}")
+        return {"status": "ready", "redis_latency_ms": latency_ms, **lag, "startup_ms": self.startup_ms}
+
+health = Health()
@@ -0,0 +1,89 @@
+import hashlib
+from datetime import datetime
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.models.notification import naive_utc
+from app.services import scripts
+from app.services.keys import idempotency_key
+from app.services.redis import redis_service
+
+# (user_id, ключ идемпотентности, id нового уведомления, отпечаток запроса)
+Claim = Tuple[int, str, str, str]
+
+
+def fingerprint(
+    user_id: int,
+    notification_type: str,
+    message: str,
+    priority: str = "normal",
+    send_at: Optional[datetime] = None
+) -> str:
+    """Отпечаток параметров запроса: повтор ключа с другими параметрами — ошибка клиента"""
+    payload = f"{user_id}\n{notification_type}\n{message}"
+    # Без приоритета и send_at отпечаток прежний: ключи, выданные до их появления, остаются в силе
+    if priority != "normal" or send_at is not None:
+        send_at = naive_utc(send_at)
+        payload += f"\n{priority}\n{send_at.isoformat() if send_at else ''}"
+    return hashlib.blake2b(payload.encode(), digest_size=12).hexdigest()
+
+
+class IdempotencyConflict(Exception):
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"Idempotency-Key {key} was used with different parameters")
+
+
+class IdempotencyStore:
+    """
+    Ключ идемпотентности -> id уведомления, созданного по первому запросу.
+    Захват — SET NX с TTL: из одновременных дубликатов побеждает ровно один.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def _value(notification_id: str, request_fingerprint: str) -> str:
+        return f"{notification_id} {request_fingerprint}"
+
+    @staticmethod
+    def original(key: str, stored: str, request_fingerprint: str) -> str:
+        """id исходного уведомления из значения ключа; IdempotencyConflict при других параметрах"""
+        notification_id, _, stored_fingerprint = stored.partition(" ")
+        if stored_fingerprint != request_fingerprint:
+            raise IdempotencyConflict(key)
+        return notification_id
+
+    async def claim(
+        self, user_id: int, key: str, notification_id: str, request_fingerprint: str
+    ) -> Optional[str]:
+        """None — ключ захвачен для notification_id, иначе id исходного уведомления"""
+        stored = (await self.claim_many([(user_id, key, notification_id, request_fingerprint)]))[0]
+        return None if stored is None else self.original(key, stored, request_fingerprint)
+
+    async def claim_many(self, claims: List[Claim]) -> List[Optional[str]]:
+        """
+        Захват пачки ключей за один pipeline; дубликаты внутри пачки тоже находятся.
+        Возвращает None для захваченных ключей и прежнее значение для остальных (см. original).
+        """
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for user_id, key, notification_id, request_fingerprint in claims:
+                    pipe.set(
+                        idempotency_key(user_id, key),
+                        self._value(notification_id, request_fingerprint),
+                        nx=True, ex=self.ttl, get=True
+                    )
+                return await pipe.execute()
+
+    async def release(self, user_id: int, key: str, notification_id: str, request_fingerprint: str) -> None:
+        """Освобождает ключ, если уведомление так и не было создано"""
+        async with redis_service.get_connection() as r:
+            script = r.register_script(scripts.DELETE_IF_EQUAL)
+            await script(
+                keys=[idempotency_key(user_id, key)],
+                args=[self._value(notification_id, request_fingerprint)]
+            )
+
+
+idempotency_store = IdempotencyStore(settings.idempotency_ttl)
@@ -0,0 +1,38 @@
+import os
+import threading
+import time
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+class UlidGenerator:
+    """
+    Монотонные ULID: 48 бит времени в мс + 80 случайных бит, 26 символов Crockford base32.
+    Внутри одной миллисекунды случайная часть увеличивается на единицу,
+    поэтому id одного процесса строго возрастают и лексикографически упорядочены.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self) -> str:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._last_random += 1
+            else:
+                self._last_ms = now_ms
+                self._last_random = int.from_bytes(os.urandom(10), "big") >> 1
+            value = (now_ms << 80) | self._last_random
+
+        chars = []
+        for _ in range(26):
+            chars.append(CROCKFORD[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+
+ulid = UlidGenerator()
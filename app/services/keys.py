@@ -0,0 +1,97 @@
+from typing import Tuple
+from redis.crc import key_slot
+from app.config import settings
+from app.services.ids import ulid
+
+NOTIFICATION_PREFIX = "notification"
+USER_INDEX_PREFIX = "user_notifications"
+STATS_PREFIX = "notification_stats"
+GLOBAL_STATS_KEY = STATS_PREFIX
+IDEMPOTENCY_PREFIX = "idempotency"
+DIGEST_PREFIX = "digest"
+RATE_LIMIT_PREFIX = "ratelimit"
+STATUS_INDEX_PREFIX = "status_index"
+DELIVERY_LEASE_PREFIX = "delivering"
+
+
+def hash_tags_enabled() -> bool:
+    return settings.redis_cluster or settings.redis_hash_tags
+
+
+def hash_tag(value) -> str:
+    """
+    В Redis Cluster ключи с одинаковым `{тегом}` лежат в одном слоте, поэтому
+    скрипты и транзакции над ними допустимы. Без тегов ключи остаются прежними.
+    """
+    return f"{{{value}}}" if hash_tags_enabled() else str(value)
+
+
+def same_slot(key: str, other: str) -> bool:
+    return key_slot(key.encode()) == key_slot(other.encode())
+
+
+def new_notification_id(user_id: int) -> str:
+    """Уникальный id уведомления: `{user_id}:{ulid}`"""
+    return f"{user_id}:{ulid.new()}"
+
+
+def parse_notification_id(notification_id: str) -> Tuple[int, str]:
+    """Разбирает id на user_id и локальную часть; ValueError для чужого формата"""
+    user_id, sep, local_id = notification_id.partition(":")
+    if not sep or not local_id or not user_id.isdigit():
+        raise ValueError(f"Invalid notification id: {notification_id}")
+    return int(user_id), local_id
+
+
+def notification_key(notification_id: str) -> str:
+    """Хеш уведомления; с тегами — в слоте пользователя: `notification:{user_id}:{ulid}`"""
+    user_id, sep, local_id = notification_id.partition(":")
+    if not sep or not hash_tags_enabled():
+        return f"{NOTIFICATION_PREFIX}:{notification_id}"
+    return f"{NOTIFICATION_PREFIX}:{hash_tag(user_id)}:{local_id}"
+
+
+def notification_id_from_key(key: str) -> str:
+    """Обратное к notification_key, понимает ключи с тегами и без"""
+    return key[len(NOTIFICATION_PREFIX) + 1:].replace("{", "").replace("}", "")
+
+
+def delivery_lease_key(notification_id: str) -> str:
+    """Аренда доставки уведомления, в слоте пользователя"""
+    user_id, _, local_id = notification_id.partition(":")
+    return f"{DELIVERY_LEASE_PREFIX}:{hash_tag(user_id)}:{local_id}"
+
+
+def user_index_key(user_id: int) -> str:
+    """Sorted set с id уведомлений пользователя, score = created_at"""
+    return f"{USER_INDEX_PREFIX}:{hash_tag(user_id)}"
+
+
+def user_stats_key(user_id: int) -> str:
+    """Хеш счётчиков пользователя, поля `{type}:{status}`"""
+    return f"{STATS_PREFIX}:{hash_tag(user_id)}"
+
+
+def idempotency_key(user_id: int, key: str) -> str:
+    """Ключи идемпотентности разных пользователей не пересекаются"""
+    return f"{IDEMPOTENCY_PREFIX}:{hash_tag(user_id)}:{key}"
+
+
+def digest_key(member: str) -> str:
+    """Список id уведомлений, ждущих сводки; member — `{type}:{user_id}`"""
+    notification_type, _, user_id = member.partition(":")
+    return f"{DIGEST_PREFIX}:{notification_type}:{hash_tag(user_id)}"
+
+
+def rate_limit_key(channel: str, user_id: int = None) -> str:
+    """
+    Bucket канала или получателя в канале. Bucket берутся отдельными вызовами скрипта,
+    поэтому bucket получателей — в слотах своих пользователей, а не все в одном слоте канала.
+    """
+    key = f"{RATE_LIMIT_PREFIX}:{channel}"
+    return key if user_id is None else f"{key}:{hash_tag(user_id)}"
+
+
+def status_index_key(notification_type: str, status: str) -> str:
+    """Общий для всех пользователей sorted set id уведомлений канала в статусе"""
+    return f"{STATUS_INDEX_PREFIX}:{notification_type}:{status}"
@@ -0,0 +1,122 @@
+import os
+import time
+from typing import Callable, Optional
+from prometheus_client import Counter, Gauge, Histogram, multiprocess
+
+# Границы для быстрых операций: команды Redis и обработка запросов API
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"], buckets=FAST_BUCKETS
+)
+REDIS_COMMAND_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Время выполнения команды Redis (pipeline — целиком)",
+    ["command"], buckets=FAST_BUCKETS
+)
+REDIS_ERRORS = Counter(
+    "redis_command_errors_total", "Ошибки команд Redis", ["command", "error"]
+)
+SEND_DURATION = Histogram(
+    "notification_send_duration_seconds", "Время отправки уведомления в канал", ["channel"]
+)
+SENDS = Counter(
+    "notification_sends_total", "Отправки уведомлений по результату", ["channel", "result"]
+)
+RECOVERED = Counter(
+    "notification_recovered_total", "Зависшие pending, снова отданные в доставку", ["channel"]
+)
+QUEUE_TIME = Histogram(
+    "notification_queue_time_seconds", "Ожидание в диспетчере от постановки до начала отправки",
+    ["channel", "priority"], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+DELIVERIES_IN_FLIGHT = Gauge(
+    "notification_deliveries_in_flight", "Доставки, выполняемые воркерами диспетчера", ["channel"],
+    multiprocess_mode="livesum"
+)
+DISPATCH_QUEUE_DEPTH = Gauge(
+    "notification_dispatch_queue_depth", "Уведомления в очереди диспетчера процесса", ["channel"],
+    multiprocess_mode="livesum"
+)
+REDIS_QUEUE_DEPTH = Gauge(
+    "notification_redis_queue_depth", "Размер очередей доставки в Redis", ["queue"],
+    multiprocess_mode="mostrecent"
+)
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """
+    Убирает livesum-значения процесса из общего каталога PROMETHEUS_MULTIPROC_DIR:
+    иначе очереди и доставки завершившегося воркера остаются в сумме /metrics
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid if pid is not None else os.getpid())
+
+
+def cached_labels(metric) -> Callable:
+    """metric.labels с кэшем дочерних метрик: на горячем пути вдвое дешевле"""
+    children = {}
+
+    def child(*values):
+        try:
+            return children[values]
+        except KeyError:
+            children[values] = metric.labels(*values)
+            return children[values]
+
+    return child
+
+
+_redis_command_latency = cached_labels(REDIS_COMMAND_LATENCY)
+_request_latency = cached_labels(REQUEST_LATENCY)
+
+
+class RedisCommandTimer:
+    """Замер одной команды Redis: время в гистограмму, исключение — в счётчик ошибок"""
+
+    __slots__ = ("command", "started")
+
+    def __init__(self, command: str):
+        self.command = command
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _redis_command_latency(self.command).observe(time.perf_counter() - self.started)
+        if exc_type is not None:
+            REDIS_ERRORS.labels(self.command, exc_type.__name__).inc()
+        return False
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware с гистограммой задержки по шаблону маршрута, а не по пути:
+    `/api/notifications/{notification_id}`, чтобы число меток не росло с числом id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            _request_latency(
+                scope["method"], route.path if route is not None else "unmatched", status
+            ).observe(time.perf_counter() - started)
@@ -1,76 +1,545 @@
 import asyncio
+import random
+import time
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from app.models.notification import (
-    NotificationRecord, NotificationType, NotificationStatus
+    STATUS_CODES, NotificationPriority, NotificationRecord, NotificationType, NotificationStatus,
+    naive_utc, storage_status, to_epoch_us, to_timestamp
 )
+from app.models.user import SendNotificationData
+from app.config import settings
+from app.services import scripts
+from app.services.archive import ARCHIVE_CURSOR_PREFIX, archive_store
+from app.services.cache import history_cache
+from app.services.digest import digest_buffer, digest_message
+from app.services.events import event_bus
+from app.services.keys import (
+    delivery_lease_key, new_notification_id, notification_key, same_slot, user_index_key
+)
+from app.services.metrics import SEND_DURATION, SENDS
+from app.services.profiling import phase
+from app.services.queue import delivery_queue
 from app.services.redis import redis_service
+from app.services.stats import NotificationStats
+from app.services.status_index import StatusIndex
+from app.services.timeindex import dead_letter_index, page_sorted_set, retry_index, schedule_index
+from app.services.transports import transports
+
+# Из каких статусов допустим переход в данный.
+# Источник у каждого перехода один: по нему скрипт переносит счётчик статуса
+ALLOWED_TRANSITIONS = {
+    NotificationStatus.PENDING: (NotificationStatus.PENDING,),
+    NotificationStatus.SENT: (NotificationStatus.PENDING,),
+    NotificationStatus.FAILED: (NotificationStatus.PENDING,),
+    NotificationStatus.CANCELLED: (NotificationStatus.PENDING,),
+}
+
+# Сопутствующая операция перехода: (ключ, op, a, b), см. scripts.TRANSITION
+IndexOp = Tuple[str, str, object, object]
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед попыткой attempts + 1 с равномерным джиттером"""
+    delay = min(settings.retry_max_delay, settings.retry_base_delay * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def due_send_at(send_at: Optional[datetime]) -> Optional[datetime]:
+    """send_at в UTC без часового пояса; None, если время уже наступило — отправка сразу"""
+    send_at = naive_utc(send_at)
+    if send_at is None or send_at <= datetime.utcnow():
+        return None
+    return send_at
+
+class NotScheduled(Exception):
+    def __init__(self, notification_id: str):
+        self.notification_id = notification_id
+        super().__init__(f"Notification {notification_id} is not scheduled or is already being delivered")
+
+class InvalidTransition(Exception):
+    def __init__(self, notification_id: str, current: Optional[str]):
+        self.notification_id = notification_id
+        self.current = current
+        super().__init__(f"Notification {notification_id} is {current or 'missing'}")
 
 class NotificationService:
     @staticmethod
-    async def send_telegram_notification(user_id: int, message: str) -> NotificationRecord:
-        record = NotificationRecord(
-            user_id=user_id,
-            message=message,
-            type=NotificationType.TELEGRAM,
-            status=NotificationStatus.PENDING
+    def _event(record: NotificationRecord) -> dict:
+        return {"user_id": record.user_id, "id": record.id, "status": record.status.value}
+
+    @staticmethod
+    def _create_in(pipe, record: NotificationRecord) -> str:
+        record.id = record.id or new_notification_id(record.user_id)
+        pipe.hset(notification_key(record.id), mapping=record.to_redis_hash())
+        pipe.zadd(user_index_key(record.user_id), {record.id: record.created_at.timestamp()})
+        NotificationStats.create_in(pipe, record.user_id, record.type)
+        if record.scheduled:
+            schedule_index.add_in(pipe, record.id, to_timestamp(record.send_at))
+        StatusIndex.create_in(pipe, record, to_timestamp(record.send_at or record.created_at))
+        event_bus.publish_in(pipe, NotificationService._event(record))
+        return record.id
+
+    @staticmethod
+    async def _rewrite(record: NotificationRecord) -> None:
+        """Полная перезапись хеша: нужна только при смене формата хранения"""
+        key = notification_key(record.id)
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=record.to_redis_hash())
+                await pipe.execute()
+
+    @staticmethod
+    async def _apply_ops(ops: List[IndexOp], record: Optional[NotificationRecord] = None) -> None:
+        """Операции перехода вне скрипта; record — опубликовать событие о нём"""
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for key, op, a, b in ops:
+                    if op == "zadd":
+                        pipe.zadd(key, {b: a})
+                    elif op == "zrem":
+                        pipe.zrem(key, a)
+                    elif op == "hincrby":
+                        pipe.hincrby(key, a, b)
+                if record is not None:
+                    event_bus.publish_in(pipe, NotificationService._event(record))
+                await pipe.execute()
+
+    @staticmethod
+    async def _transition(
+        record: NotificationRecord,
+        status: NotificationStatus,
+        fields: Tuple[str, ...] = (),
+        ops: List[IndexOp] = ()
+    ) -> None:
+        """
+        Атомарно переводит уведомление в status, обновляя только поля fields,
+        и выполняет сопутствующие операции с индексами за один вызов скрипта.
+        Бросает InvalidTransition, если текущий статус в Redis не допускает перехода.
+        В Redis Cluster операции над ключами других слотов (общие индексы и счётчики)
+        выполняются сразу после скрипта, уже не атомарно с ним.
+        """
+        status_field, status_value = storage_status(status)
+        (source,) = ALLOWED_TRANSITIONS[status]
+        allowed = storage_status(source)[1]
+        ops = (
+            list(ops)
+            + NotificationStats.transition_ops(record.user_id, record.type, source, status)
+            + StatusIndex.transition_ops(record, source, status, time.time())
         )
-        
-        with redis_service.get_connection() as r:
-            r.hset(f"notification:{record.user_id}:{record.created_at.timestamp()}",
-                    mapping=record.to_redis_hash())
-        
-        await asyncio.sleep(2)
-
-        record.status = NotificationStatus.SENT
-        record.sent_at = datetime.utcnow()
-
-        with redis_service.get_connection() as r:
-            r.hset(f"notification:{record.user_id}:{record.created_at.timestamp()}", 
-                    mapping=record.to_redis_hash())
-        
-        return record
+        key = notification_key(record.id)
+        remote_ops = []
+        if settings.redis_cluster:
+            # Скрипт в кластере видит только ключи своего слота, остальные — после перехода
+            remote_ops = [op for op in ops if not same_slot(op[0], key)]
+            ops = [op for op in ops if same_slot(op[0], key)]
+        record.status = status
+        values = record.redis_fields(*fields)
+
+        args = [status_field, status_value, allowed, len(values)]
+        for name, value in values.items():
+            args.extend([name, value])
+        for _, op, a, b in ops:
+            args.extend([op, a, "" if b is None else b])
+        if event_bus.enabled:
+            args.extend([event_bus.channel, event_bus.encode(NotificationService._event(record))])
+
+        async with redis_service.get_connection() as r:
+            script = r.register_script(scripts.TRANSITION)
+            code, current = await script(
+                keys=[key] + [op_key for op_key, _, _, _ in ops],
+                args=args
+            )
+
+        if code == -2:
+            stored = await NotificationService.get_notification(record.id)
+            if stored.status not in ALLOWED_TRANSITIONS[status]:
+                raise InvalidTransition(record.id, stored.status.value)
+            await NotificationService._rewrite(record)
+            await NotificationService._apply_ops(ops + remote_ops, record)
+        elif code != 1:
+            raise InvalidTransition(record.id, current or None)
+        elif remote_ops:
+            await NotificationService._apply_ops(remote_ops)
+
+        history_cache.invalidate(record.user_id)
 
     @staticmethod
-    async def send_email_notification(user_id: int, message: str) -> NotificationRecord:
+    async def create_notification(
+        user_id: int,
+        message: str,
+        notification_type: NotificationType,
+        notification_id: Optional[str] = None,
+        priority: NotificationPriority = NotificationPriority.NORMAL,
+        send_at: Optional[datetime] = None
+    ) -> NotificationRecord:
+        """
+        Сохраняет уведомление со статусом pending; record.id — notification_id,
+        если он выдан заранее (см. idempotency), иначе новый уникальный id.
+        С будущим send_at уведомление попадает в schedule_index (record.scheduled).
+        """
         record = NotificationRecord(
+            id=notification_id,
             user_id=user_id,
             message=message,
-            type=NotificationType.EMAIL,
-            status=NotificationStatus.PENDING
+            type=notification_type,
+            status=NotificationStatus.PENDING,
+            priority=priority,
+            send_at=due_send_at(send_at)
         )
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                NotificationService._create_in(pipe, record)
+                await pipe.execute()
+        history_cache.invalidate(record.user_id)
+        return record
+
+    @staticmethod
+    async def create_notifications(
+        items: List[SendNotificationData],
+        enqueue: bool = False,
+        notification_ids: Optional[List[Optional[str]]] = None
+    ) -> List[NotificationRecord]:
+        """
+        Сохраняет пачку уже провалидированных уведомлений чанками через pipeline.
+        При enqueue=True задачи доставки добавляются в стрим в тех же pipeline
+        (кроме каналов из digest_channels и отложенных уведомлений).
+        notification_ids — заранее выданные id (None в позиции — новый id).
+        """
+        created = []
+        chunk_size = settings.batch_chunk_size
+        notification_ids = notification_ids or [None] * len(items)
+
+        async with redis_service.get_connection() as r:
+            for start in range(0, len(items), chunk_size):
+                async with r.pipeline(transaction=False) as pipe:
+                    chunk = zip(items[start:start + chunk_size], notification_ids[start:start + chunk_size])
+                    for item, notification_id in chunk:
+                        record = NotificationRecord.model_construct(
+                            id=notification_id,
+                            user_id=item.user_id,
+                            message=item.message,
+                            type=NotificationType(item.type),
+                            status=NotificationStatus.PENDING,
+                            created_at=datetime.utcnow(),
+                            sent_at=None,
+                            priority=NotificationPriority(item.priority),
+                            send_at=due_send_at(item.send_at)
+                        )
+                        NotificationService._create_in(pipe, record)
+                        # Уведомления каналов со сводками ставит в буфер Dispatcher.dispatch_many
+                        if enqueue and not record.scheduled and not digest_buffer.accepts(record):
+                            delivery_queue.enqueue_in(pipe, record.id, record.priority)
+                        created.append(record)
+                    await pipe.execute()
+
+        for user_id in {record.user_id for record in created}:
+            history_cache.invalidate(user_id)
+        return created
+
+    @staticmethod
+    async def get_notification(notification_id: str) -> Optional[NotificationRecord]:
+        async with redis_service.get_connection() as r:
+            data = await r.hgetall(notification_key(notification_id))
+        return NotificationRecord.from_redis_hash(data, notification_id) if data else None
+
+    @staticmethod
+    async def get_notifications_by_ids(notification_ids: List[str]) -> List[Optional[NotificationRecord]]:
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for notification_id in notification_ids:
+                    pipe.hgetall(notification_key(notification_id))
+                rows = await pipe.execute()
+        return [
+            NotificationRecord.from_redis_hash(data, notification_id) if data else None
+            for notification_id, data in zip(notification_ids, rows)
+        ]
+
+    @staticmethod
+    async def cancel_scheduled(notification_id: str) -> Optional[NotificationRecord]:
+        """
+        Отменяет отложенную отправку: уведомление уходит из schedule_index и становится cancelled.
+        None — уведомления нет; NotScheduled — оно не отложено или уже отдано в доставку.
+        """
+        record = await NotificationService.get_notification(notification_id)
+        if record is None:
+            return None
+        # Кто удалил id из индекса, тот им и распоряжается: поллер его уже не заберёт
+        if not await schedule_index.remove(notification_id):
+            raise NotScheduled(notification_id)
+        await NotificationService._transition(record, NotificationStatus.CANCELLED)
+        return record
 
+    @staticmethod
+    async def reschedule(notification_id: str, send_at: datetime) -> Optional[NotificationRecord]:
+        """
+        Переносит отложенную отправку на send_at (наступившее время — отправка при следующем опросе).
+        None — уведомления нет; NotScheduled — оно не отложено или уже отдано в доставку.
+        """
+        record = await NotificationService.get_notification(notification_id)
+        if record is None:
+            return None
+        record.send_at = naive_utc(send_at)
+        due = to_timestamp(record.send_at)
+        if not await schedule_index.move(notification_id, due):
+            raise NotScheduled(notification_id)
 
-        with redis_service.get_connection() as r:
-            r.hset(f"notification:{record.user_id}:{record.created_at.timestamp()}", 
-                    mapping=record.to_redis_hash())
+        key = notification_key(notification_id)
+        async with redis_service.get_connection() as r:
+            # Поле в формате, в котором хранится сама запись
+            compact = await r.hexists(key, "u")
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.zadd(StatusIndex.key(record.type, NotificationStatus.PENDING), {notification_id: due}, xx=True)
+                if compact:
+                    pipe.hset(key, "d", to_epoch_us(record.send_at))
+                else:
+                    pipe.hset(key, "send_at", record.send_at.isoformat())
+                event_bus.publish_in(pipe, NotificationService._event(record))
+                await pipe.execute()
+        history_cache.invalidate(record.user_id)
+        return record
 
-        await asyncio.sleep(3)
+    @staticmethod
+    async def _send(record: NotificationRecord) -> None:
+        await transports.get(record.type).send(record)
 
-        record.status = NotificationStatus.SENT
-        record.sent_at = datetime.utcnow()
+    @staticmethod
+    async def record_failure(record: NotificationRecord, error: Exception) -> NotificationRecord:
+        """
+        Планирует повтор через retry_index с экспоненциальной задержкой,
+        а после retry_max_attempts попыток переводит в failed и dead-letter.
+        """
+        record.attempts += 1
+        record.last_error = f"{type(error).__name__}: {error}"[:500]
+        now = time.time()
 
-        with redis_service.get_connection() as r:
-            r.hset(f"notification:{record.user_id}:{record.created_at.timestamp()}", 
-                    mapping=record.to_redis_hash())
+        if record.attempts >= settings.retry_max_attempts:
+            await NotificationService._transition(
+                record, NotificationStatus.FAILED, ("attempts", "last_error"),
+                [
+                    (retry_index.key, "zrem", record.id, None),
+                    (dead_letter_index.key, "zadd", now, record.id),
+                ]
+            )
+        else:
+            due = now + retry_delay(record.attempts)
+            await NotificationService._transition(
+                record, NotificationStatus.PENDING, ("attempts", "last_error"),
+                [
+                    (retry_index.key, "zadd", due, record.id),
+                    (StatusIndex.key(record.type, NotificationStatus.PENDING), "zadd", due, record.id),
+                ]
+            )
 
         return record
 
     @staticmethod
-    def get_user_notifications(user_id: int, status: Optional[NotificationStatus] = None) -> List[NotificationRecord]:
+    async def deliver(record: NotificationRecord) -> NotificationRecord:
+        """
+        Отправляет уведомление по его каналу и помечает его отправленным.
+        Ошибка канала не пробрасывается, а фиксируется через record_failure.
+        Копия задачи уже отправленного или отправляемого уведомления пропускается.
+        """
+        if not (await NotificationService._claim_delivery([record]))[0]:
+            print(f"Notification {record.id} is already delivered or in delivery, copy skipped")
+            return record
+        try:
+            try:
+                await NotificationService._measured_send(record)
+            except Exception as e:
+                print(f"Send via {record.type.value} to {record.user_id} failed: {e}")
+                return await NotificationService.record_failure(record, e)
+
+            await NotificationService._mark_sent(record, datetime.utcnow())
+            return record
+        finally:
+            await NotificationService._release_delivery([record])
+
+    @staticmethod
+    async def deliver_digest(records: List[NotificationRecord]) -> List[NotificationRecord]:
+        """
+        Отправляет уведомления одного пользователя и канала одним сообщением
+        и помечает отправленными все записи; при ошибке канала повтор планируется для каждой.
+        """
+        claimed = await NotificationService._claim_delivery(records)
+        records = [record for record, ok in zip(records, claimed) if ok]
+        if not records:
+            return records
+        try:
+            return await NotificationService._deliver_digest(records)
+        finally:
+            await NotificationService._release_delivery(records)
+
+    @staticmethod
+    async def _deliver_digest(records: List[NotificationRecord]) -> List[NotificationRecord]:
+        first = records[0]
+        digest = NotificationRecord.model_construct(
+            user_id=first.user_id,
+            message=digest_message(records),
+            type=first.type,
+            status=NotificationStatus.PENDING,
+            created_at=first.created_at,
+            sent_at=None
+        )
+        try:
+            await NotificationService._measured_send(digest)
+        except Exception as e:
+            print(f"Digest via {first.type.value} to {first.user_id} failed: {e}")
+            for record in records:
+                await NotificationService.record_failure(record, e)
+            return records
+
+        sent_at = datetime.utcnow()
+        await asyncio.gather(*(NotificationService._mark_sent(record, sent_at) for record in records))
+        return records
+
+    @staticmethod
+    async def _claim_delivery(records: List[NotificationRecord]) -> List[bool]:
+        """
+        Берёт записи в доставку: аренда (SET NX) и сохранённый статус pending.
+        Копия, поставленная восстановлением, пока запись ждала в очереди, не берётся:
+        её уже отправили или отправляют. У взятых score в индексе pending сдвигается
+        на текущее время — восстановление не считает их зависшими.
+        """
+        now = time.time()
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for record in records:
+                    pipe.set(delivery_lease_key(record.id), "1", nx=True, ex=settings.delivery_lease_ttl)
+                    pipe.hmget(notification_key(record.id), "status", "s")
+                    pipe.zadd(StatusIndex.key(record.type, NotificationStatus.PENDING), {record.id: now}, xx=True)
+                results = await pipe.execute()
+
+            claimed, stale = [], []
+            for i, record in enumerate(records):
+                leased, (status, code), _ = results[3 * i:3 * i + 3]
+                pending = status == NotificationStatus.PENDING.value or code == STATUS_CODES[NotificationStatus.PENDING]
+                claimed.append(bool(leased) and pending)
+                if leased and not pending:
+                    stale.append(delivery_lease_key(record.id))
+            if stale:
+                async with r.pipeline(transaction=False) as pipe:
+                    for key in stale:
+                        pipe.delete(key)
+                    await pipe.execute()
+        return claimed
+
+    @staticmethod
+    async def _release_delivery(records: List[NotificationRecord]) -> None:
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for record in records:
+                    pipe.delete(delivery_lease_key(record.id))
+                await pipe.execute()
+
+    @staticmethod
+    async def _measured_send(record: NotificationRecord) -> None:
+        channel = record.type.value
+        started = time.perf_counter()
+        try:
+            await NotificationService._send(record)
+        except Exception:
+            SEND_DURATION.labels(channel).observe(time.perf_counter() - started)
+            SENDS.labels(channel, "failure").inc()
+            raise
+        SEND_DURATION.labels(channel).observe(time.perf_counter() - started)
+        SENDS.labels(channel, "success").inc()
+
+    @staticmethod
+    async def _mark_sent(record: NotificationRecord, sent_at: datetime) -> None:
+        record.sent_at = sent_at
+        try:
+            await NotificationService._transition(record, NotificationStatus.SENT, ("sent_at",))
+        except InvalidTransition as e:
+            print(f"Delivered notification was not updated: {e}")
+
+    @staticmethod
+    async def send_telegram_notification(user_id: int, message: str) -> NotificationRecord:
+        record = await NotificationService.create_notification(
+            user_id, message, NotificationType.TELEGRAM
+        )
+        return await NotificationService.deliver(record)
+
+    @staticmethod
+    async def send_email_notification(user_id: int, message: str) -> NotificationRecord:
+        record = await NotificationService.create_notification(
+            user_id, message, NotificationType.EMAIL
+        )
+        return await NotificationService.deliver(record)
+
+    @staticmethod
+    async def get_user_notifications(
+        user_id: int,
+        status: Optional[NotificationStatus] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        archive: bool = False
+    ) -> Tuple[List[NotificationRecord], Optional[str]]:
+        """
+        Возвращает страницу истории (от новых к старым) и курсор следующей страницы.
+        При archive=True после истории в Redis курсор продолжается в архиве.
+        Записи, не прошедшие фильтр по статусу или уже удалённые, не укорачивают страницу:
+        выборка продолжается, пока страница не заполнится или история не кончится, но просматривает
+        не больше history_max_scan записей — тогда страница короче, а курсор ведёт дальше.
+        """
+        archived = bool(cursor and cursor.startswith(ARCHIVE_CURSOR_PREFIX))
+        query = (status, cursor, limit, archive)
+        if not archived:
+            cached = history_cache.get(user_id, query)
+            if cached is not None:
+                return cached
+        generation = history_cache.generation()
+
+        notifications: List[NotificationRecord] = []
+        next_cursor = cursor
+        budget = max(settings.history_max_scan, limit)
+        while True:
+            remaining = min(limit - len(notifications), budget)
+            budget -= remaining
+            if next_cursor and next_cursor.startswith(ARCHIVE_CURSOR_PREFIX):
+                records, next_cursor = await asyncio.to_thread(
+                    archive_store.page_user, user_id, next_cursor[len(ARCHIVE_CURSOR_PREFIX):], remaining
+                )
+                if next_cursor is not None:
+                    next_cursor = ARCHIVE_CURSOR_PREFIX + next_cursor
+            else:
+                records, next_cursor = await NotificationService._history_chunk(user_id, next_cursor, remaining)
+                if next_cursor is None and archive:
+                    next_cursor = ARCHIVE_CURSOR_PREFIX
+            notifications.extend(n for n in records if status is None or n.status == status)
+            if next_cursor is None or len(notifications) >= limit or budget <= 0:
+                break
+
+        if not archived:
+            history_cache.put(user_id, query, (notifications, next_cursor), generation)
+        return notifications, next_cursor
+
+    @staticmethod
+    async def _history_chunk(
+        user_id: int, cursor: Optional[str], limit: int
+    ) -> Tuple[List[NotificationRecord], Optional[str]]:
+        """Одна выборка из индекса пользователя в Redis, без фильтра по статусу"""
         notifications = []
 
-        with redis_service.get_connection() as r:
-            keys = r.keys(f"notification:{user_id}:*")
+        with phase("storage"):
+            async with redis_service.get_connection() as r:
+                entries, next_cursor = await page_sorted_set(r, user_index_key(user_id), cursor, limit)
+                # Записи до появления id в индексе хранились только временной меткой
+                notification_ids = [
+                    member if ":" in member else f"{user_id}:{member}" for member, _ in entries
+                ]
+
+                async with r.pipeline(transaction=False) as pipe:
+                    for notification_id in notification_ids:
+                        pipe.hgetall(notification_key(notification_id))
+                    rows = await pipe.execute()
 
-            for key in keys:
-                data = r.hgetall(key)
-                if data:
-                    try:
-                        notification = NotificationRecord.from_redis_hash(data)
-                        if status is None or notification.status == status:
-                            notifications.append(notification)
-                    except Exception as e:
-                        print(f"Error parsing notification {key}: {e}")
+        with phase("decode"):
+            for notification_id, data in zip(notification_ids, rows):
+                if not data:
+                    continue
+                try:
+                    notifications.append(NotificationRecord.from_redis_hash(data, notification_id))
+                except Exception as e:
+                    print(f"Error parsing notification {notification_id}: {e}")
 
-        return sorted(notifications, key=lambda x: x.created_at, reverse=True)
\ No newline at end of file
+        return notifications, next_cursor
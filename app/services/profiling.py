@@ -0,0 +1,107 @@
+import asyncio
+import cProfile
+import hmac
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from app.config import settings
+
+# Время этапов текущего профилируемого запроса; None — запрос не профилируется
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+
+
+class phase:
+    """
+    Замер этапа запроса для Server-Timing: `with phase("storage"): ...`.
+    Вне профилируемого запроса — одна проверка contextvar.
+    """
+
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _timings.get()
+        if self.timings is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.timings is not None:
+            elapsed = time.perf_counter() - self.started
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed
+        return False
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items())
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует cProfile запрос с заголовком `X-Profile: <profiling_token>`
+    или случайную долю profiling_sample_rate запросов.
+    Отчёт (.prof: pstats, snakeviz, flameprof) сохраняется в profiling_dir;
+    помеченному запросу добавляются Server-Timing с этапами и X-Profile-Report с именем отчёта.
+    cProfile видит весь поток, поэтому одновременно профилируется один запрос,
+    и в отчёт попадают конкурентные запросы того же event loop.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._active = False
+
+    def _flagged(self, scope) -> bool:
+        token = settings.profiling_token
+        if not token:
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return hmac.compare_digest(value, token.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active:
+            await self.app(scope, receive, send)
+            return
+
+        flagged = self._flagged(scope)
+        if not flagged and not random.random() < settings.profiling_sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        timings: Dict[str, float] = {}
+        context_token = _timings.set(timings)
+        report = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(4).hex()}.prof"
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if flagged and message["type"] == "http.response.start":
+                timings["total"] = time.perf_counter() - started
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", server_timing(timings).encode()),
+                    (b"x-profile-report", report.encode()),
+                ]
+            await send(message)
+
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            _timings.reset(context_token)
+            self._active = False
+            await asyncio.to_thread(self._save, profiler, report)
+
+    def _save(self, profiler: cProfile.Profile, report: str) -> None:
+        try:
+            os.makedirs(settings.profiling_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(settings.profiling_dir, report))
+        except OSError as e:
+            print(f"Failed to save profile {report}: {e}")
@@ -0,0 +1,102 @@
+import asyncio
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+from app.config import settings
+from app.services.events import event_bus
+
+# Что получает клиент: ("status", событие), ("ping", None) или ("reset", None) —
+# часть событий потеряна, историю нужно перечитать; после reset поток закрывается
+PushMessage = Tuple[str, Optional[dict]]
+
+
+class PushUnavailable(Exception):
+    pass
+
+
+class PushSubscription:
+    """Буфер событий одного клиента, не больше buffer_size"""
+
+    def __init__(self, user_id: int, buffer_size: int):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(maxsize=buffer_size)
+        self.lost = False
+
+    def offer(self, event: dict) -> None:
+        if self.lost:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент: буфер не растёт, поток завершится reset
+            self.lost = True
+
+    def reset(self) -> None:
+        self.lost = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class PushHub:
+    """
+    Раздаёт события event_bus подключённым клиентам процесса.
+    Подписка на Redis одна на процесс, у каждого клиента — свой ограниченный буфер.
+    """
+
+    def __init__(self, buffer_size: int, max_clients: int):
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self._subscriptions: Dict[int, Set[PushSubscription]] = {}
+        self.clients = 0
+
+    def check_available(self) -> None:
+        if not settings.push_enabled:
+            raise PushUnavailable("Push is disabled")
+        if not event_bus.connected:
+            raise PushUnavailable("Event subscription is not established")
+        if self.clients >= self.max_clients:
+            raise PushUnavailable("Too many push clients")
+
+    def subscribe(self, user_id: int) -> PushSubscription:
+        subscription = PushSubscription(user_id, self.buffer_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        self.clients += 1
+        return subscription
+
+    def unsubscribe(self, subscription: PushSubscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+        self.clients -= 1
+
+    def on_event(self, event: dict) -> None:
+        for subscription in self._subscriptions.get(event.get("user_id"), ()):
+            subscription.offer(event)
+
+    def on_reset(self) -> None:
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.reset()
+
+    async def listen(self, user_id: int) -> AsyncIterator[PushMessage]:
+        """События пользователя; ("ping", None) раз в push_heartbeat секунд тишины"""
+        subscription = self.subscribe(user_id)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.push_heartbeat)
+                except asyncio.TimeoutError:
+                    event = None
+                if subscription.lost:
+                    yield "reset", None
+                    return
+                yield ("ping", None) if event is None else ("status", event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+push_hub = PushHub(settings.push_buffer_size, settings.push_max_clients)
+event_bus.subscribe(push_hub.on_event, on_reset=push_hub.on_reset)
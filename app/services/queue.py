@@ -0,0 +1,135 @@
+import math
+from typing import Dict, List, Tuple
+from redis.exceptions import ResponseError
+from app.config import settings
+from app.models.notification import NotificationPriority
+from app.services.redis import redis_service
+
+# (стрим, id записи в стриме, поля)
+Entry = Tuple[str, str, dict]
+
+class DeliveryQueue:
+    """
+    Очередь доставки на Redis Streams с consumer group.
+    У каждой полосы приоритета свой стрим, чтобы рассылка не задерживала коды:
+    normal — `stream`, остальные — `{stream}:{priority}`.
+    """
+
+    def __init__(self, stream: str, group: str):
+        self.stream = stream
+        self.group = group
+        self.streams: Dict[NotificationPriority, str] = {
+            priority: self.stream_for(priority) for priority in NotificationPriority
+        }
+
+    def stream_for(self, priority: NotificationPriority) -> str:
+        if priority == NotificationPriority.NORMAL:
+            return self.stream
+        return f"{self.stream}:{priority.value}"
+
+    async def ensure_group(self) -> None:
+        async with redis_service.get_connection() as r:
+            for stream in self.streams.values():
+                try:
+                    await r.xgroup_create(stream, self.group, id="0", mkstream=True)
+                except ResponseError as e:
+                    if "BUSYGROUP" not in str(e):
+                        raise
+
+    def enqueue_in(
+        self, pipe, notification_id: str, priority: NotificationPriority = NotificationPriority.NORMAL
+    ) -> None:
+        pipe.xadd(self.stream_for(priority), {"id": notification_id})
+
+    async def enqueue(
+        self, notification_id: str, priority: NotificationPriority = NotificationPriority.NORMAL
+    ) -> str:
+        async with redis_service.get_connection() as r:
+            return await r.xadd(self.stream_for(priority), {"id": notification_id})
+
+    def _quotas(self, count: int) -> Dict[str, int]:
+        """Доли count по priority_weights, не меньше одной задачи, в сумме не больше count"""
+        weights = {priority: settings.priority_weights[priority.value] for priority in self.streams}
+        total = sum(weights.values())
+        quotas = {}
+        left = count
+        for priority, weight in weights.items():
+            quota = min(left, max(1, math.floor(count * weight / total)))
+            if quota > 0:
+                quotas[self.streams[priority]] = quota
+                left -= quota
+        return quotas
+
+    @staticmethod
+    def _entries(response) -> List[Entry]:
+        return [
+            (stream, entry_id, fields)
+            for stream, entries in response or [] for entry_id, fields in entries
+        ]
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> List[Entry]:
+        """
+        До count задач: сначала каждой полосе её доля, недобранное — по порядку приоритета.
+        Если задач нет ни в одной полосе, ждёт до block_ms.
+        """
+        entries: List[Entry] = []
+        async with redis_service.get_connection() as r:
+            quotas = self._quotas(count)
+            async with r.pipeline(transaction=False) as pipe:
+                for stream, quota in quotas.items():
+                    pipe.xreadgroup(self.group, consumer, {stream: ">"}, count=quota)
+                responses = await pipe.execute()
+            exhausted = set()
+            for (stream, quota), response in zip(quotas.items(), responses):
+                read = self._entries(response)
+                entries.extend(read)
+                if len(read) < quota:
+                    exhausted.add(stream)
+
+            for stream in self.streams.values():
+                left = count - len(entries)
+                if left <= 0:
+                    break
+                if stream not in exhausted:
+                    entries.extend(self._entries(
+                        await r.xreadgroup(self.group, consumer, {stream: ">"}, count=left)
+                    ))
+
+            if not entries:
+                response = await r.xreadgroup(
+                    self.group, consumer, {stream: ">" for stream in self.streams.values()},
+                    count=count, block=block_ms
+                )
+                entries = self._entries(response)
+        return entries
+
+    async def claim_stale(self, consumer: str, min_idle_ms: int, count: int) -> List[Entry]:
+        """Забирает себе задачи, зависшие у упавших консьюмеров"""
+        claimed: List[Entry] = []
+        async with redis_service.get_connection() as r:
+            for stream in self.streams.values():
+                if len(claimed) >= count:
+                    break
+                _, entries, _ = await r.xautoclaim(
+                    stream, self.group, consumer,
+                    min_idle_time=min_idle_ms, start_id="0-0", count=count - len(claimed)
+                )
+                claimed.extend((stream, entry_id, fields) for entry_id, fields in entries if fields)
+        return claimed
+
+    async def ack(self, stream: str, entry_id: str) -> None:
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.xack(stream, self.group, entry_id)
+                pipe.xdel(stream, entry_id)
+                await pipe.execute()
+
+    async def size(self) -> int:
+        """Задачи во всех полосах"""
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for stream in self.streams.values():
+                    pipe.xlen(stream)
+                return sum(await pipe.execute())
+
+delivery_queue = DeliveryQueue(settings.queue_stream, settings.queue_group)
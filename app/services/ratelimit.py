@@ -0,0 +1,24 @@
+from typing import List, Tuple
+from app.services import scripts
+from app.services.redis import redis_service
+
+Bucket = Tuple[str, float, int]
+
+class RateLimiter:
+    """Token bucket, общий для всех процессов через Redis"""
+
+    async def acquire(self, buckets: List[Bucket]) -> int:
+        """Пытается взять токен из всех bucket (key, rate/s, capacity); возвращает паузу в мс"""
+        buckets = [bucket for bucket in buckets if bucket[1] > 0]
+        if not buckets:
+            return 0
+
+        args = []
+        for _, rate, capacity in buckets:
+            args.extend([rate, max(capacity, 1)])
+
+        async with redis_service.get_connection() as r:
+            script = r.register_script(scripts.TOKEN_BUCKET)
+            return int(await script(keys=[key for key, _, _ in buckets], args=args))
+
+rate_limiter = RateLimiter()
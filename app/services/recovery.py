@@ -0,0 +1,62 @@
+import asyncio
+from app.config import settings
+from app.models.notification import NotificationStatus, NotificationType
+from app.services.dispatcher import dispatcher
+from app.services.metrics import RECOVERED
+from app.services.notifications import NotificationService
+from app.services.redis import redis_service
+from app.services.status_index import StatusIndex
+from app.services.timeindex import retry_index, schedule_index
+
+class PendingRecovery:
+    """
+    Снова отдаёт в доставку pending, ждущие дольше recovery_pending_after секунд:
+    задачи из памяти упавшего процесса или потерянные между сохранением и постановкой в очередь.
+    Ищет по индексу pending каждого канала, без обхода ключей.
+    Уведомление, ещё ждущее в очереди, получит вторую задачу, но отправлено будет один раз:
+    доставка проверяет аренду и сохранённый статус (NotificationService._claim_delivery).
+    """
+
+    async def _waiting(self, notification_ids) -> set:
+        """id, которые ещё ждут повтора или send_at — их отдаст свой поллер"""
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for notification_id in notification_ids:
+                    pipe.zscore(retry_index.key, notification_id)
+                    pipe.zscore(schedule_index.key, notification_id)
+                scores = await pipe.execute()
+        return {
+            notification_id for i, notification_id in enumerate(notification_ids)
+            if scores[2 * i] is not None or scores[2 * i + 1] is not None
+        }
+
+    async def poll_once(self) -> int:
+        recovered = 0
+        for notification_type in NotificationType:
+            notification_ids = await StatusIndex.claim_stale_pending(
+                notification_type, settings.recovery_pending_after, settings.recovery_batch_size
+            )
+            if not notification_ids:
+                continue
+
+            waiting = await self._waiting(notification_ids)
+            records = await NotificationService.get_notifications_by_ids(notification_ids)
+            for notification_id, record in zip(notification_ids, records):
+                if record is None or record.status != NotificationStatus.PENDING:
+                    # Запись удалена или индекс отстал от перехода (Redis Cluster)
+                    await StatusIndex.remove(notification_type, NotificationStatus.PENDING, notification_id)
+                elif notification_id not in waiting:
+                    await dispatcher.dispatch(record)
+                    RECOVERED.labels(notification_type.value).inc()
+                    recovered += 1
+        return recovered
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Pending recovery failed: {e}")
+            await asyncio.sleep(settings.recovery_interval)
+
+pending_recovery = PendingRecovery()
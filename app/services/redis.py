@@ -1,45 +1,178 @@
-import redis
+import asyncio
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from redis.asyncio.cluster import ClusterPipeline, RedisCluster
 from redis.exceptions import ConnectionError, TimeoutError
-from contextlib import contextmanager
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from app.config import settings
+from app.services.metrics import RedisCommandTimer
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with RedisCommandTimer("MULTI" if self.is_transaction else "PIPELINE"):
+            return await super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Клиент с замером времени и ошибок каждой команды и pipeline"""
+
+    async def execute_command(self, *args, **options):
+        with RedisCommandTimer(str(args[0]).upper()):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class InstrumentedClusterPipeline(ClusterPipeline):
+    def __init__(self, client: RedisCluster, transaction: Optional[bool] = None):
+        super().__init__(client, transaction)
+        self.command_name = "MULTI" if transaction else "PIPELINE"
+
+    async def execute(self, raise_on_error: bool = True, allow_redirections: bool = True):
+        with RedisCommandTimer(self.command_name):
+            return await super().execute(raise_on_error, allow_redirections)
+
+
+class InstrumentedCluster(RedisCluster):
+    """Клиент Redis Cluster с теми же замерами, что и InstrumentedRedis"""
+
+    async def execute_command(self, *args, **options):
+        with RedisCommandTimer(str(args[0]).upper()):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: Optional[bool] = None, shard_hint: Optional[str] = None) -> ClusterPipeline:
+        if shard_hint:
+            return super().pipeline(transaction, shard_hint)
+        return InstrumentedClusterPipeline(self, transaction)
+
 
 class RedisService:
-    def __init__(self, host: str = "redis-server", port: int = 6379, db: int = 0):
+    def __init__(
+        self,
+        host: str = "redis-server",
+        port: int = 6379,
+        db: int = 0,
+        max_connections: int = 50,
+        socket_timeout: float = 5.0,
+        socket_connect_timeout: float = 5.0,
+        health_check_interval: int = 30,
+        cluster: bool = False
+    ):
         self.host = host
         self.port = port
         self.db = db
+        self.max_connections = max_connections
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout
+        self.health_check_interval = health_check_interval
+        self.cluster = cluster
+        self._pool: Optional[redis.ConnectionPool] = None
         self._connection: Optional[redis.Redis] = None
-    
-    def connect(self) -> bool:
-        """Устанавливает соединение с Redis"""
-        try:
-            self._connection = redis.Redis(
+
+    def _create_client(self) -> redis.Redis:
+        if self.cluster:
+            # Узлы кластера находятся по host:port; db в кластере всегда 0
+            return InstrumentedCluster(
                 host=self.host,
                 port=self.port,
-                db=self.db,
-                socket_connect_timeout=5,
+                max_connections=self.max_connections,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_connect_timeout,
+                health_check_interval=self.health_check_interval,
                 decode_responses=True
             )
-            self._connection.ping()
+        self._pool = redis.ConnectionPool(
+            host=self.host,
+            port=self.port,
+            db=self.db,
+            max_connections=self.max_connections,
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.socket_connect_timeout,
+            health_check_interval=self.health_check_interval,
+            decode_responses=True
+        )
+        return InstrumentedRedis(connection_pool=self._pool)
+
+    async def connect(self) -> bool:
+        """Создаёт пул соединений и проверяет доступность Redis"""
+        try:
+            await self.connection.ping()
             print("Redis подключён!")
             return True
         except (ConnectionError, TimeoutError) as e:
             print(f"Не удалось подключиться к Redis: {e}")
             return False
 
+    async def warm_up(self, connections: int) -> None:
+        """Открывает connections соединений пула заранее: первые запросы не ждут connect"""
+        await asyncio.gather(*(self.connection.ping() for _ in range(connections)))
+
+    async def load_scripts(self, sources: List[str]) -> None:
+        """SCRIPT LOAD заранее: первый вызов скрипта — сразу EVALSHA, без NOSCRIPT и EVAL"""
+        # По одной команде: в кластере SCRIPT LOAD уходит на все узлы, pipeline так не умеет
+        for source in sources:
+            await self.connection.script_load(source)
+
+    async def close(self) -> None:
+        """Закрывает клиент и все соединения пула"""
+        if self._connection is not None:
+            await self._connection.aclose()
+            self._connection = None
+        if self._pool is not None:
+            await self._pool.aclose()
+            self._pool = None
+
     @property
     def connection(self) -> redis.Redis:
-        if not self._connection:
-            if not self.connect():
-                raise ConnectionError("Redis connection not established")
+        if self._connection is None:
+            self._connection = self._create_client()
         return self._connection
 
-    @contextmanager
-    def get_connection(self):
+    @asynccontextmanager
+    async def pubsub(self):
+        """
+        Подписка pub/sub. У клиента кластера её нет: подписываемся через отдельное
+        соединение с одним из узлов — PUBLISH в кластере доходит до всех узлов.
+        """
+        if not self.cluster:
+            async with self.connection.pubsub() as pubsub:
+                yield pubsub
+            return
+
+        await self.connection.initialize()
+        node = self.connection.get_random_node()
+        client = redis.Redis(
+            host=node.host,
+            port=node.port,
+            socket_connect_timeout=self.socket_connect_timeout,
+            decode_responses=True
+        )
+        try:
+            async with client.pubsub() as pubsub:
+                yield pubsub
+        finally:
+            await client.aclose()
+
+    @asynccontextmanager
+    async def get_connection(self):
         try:
             yield self.connection
         except (ConnectionError, TimeoutError) as e:
             print(f"Redis connection error: {e}")
             raise
 
-redis_service = RedisService()
\ No newline at end of file
+redis_service = RedisService(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    db=settings.redis_db,
+    max_connections=settings.redis_max_connections,
+    socket_timeout=settings.redis_socket_timeout,
+    socket_connect_timeout=settings.redis_socket_connect_timeout,
+    health_check_interval=settings.redis_health_check_interval,
+    cluster=settings.redis_cluster
+)
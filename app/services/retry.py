@@ -0,0 +1,30 @@
+import asyncio
+from app.config import settings
+from app.models.notification import NotificationStatus
+from app.services.dispatcher import dispatcher
+from app.services.notifications import NotificationService
+from app.services.timeindex import retry_index
+
+class RetryPoller:
+    """Пачками забирает наступившие повторы из retry_index и отдаёт их в доставку"""
+
+    async def poll_once(self) -> int:
+        notification_ids = await retry_index.pop_due(settings.retry_batch_size)
+        if not notification_ids:
+            return 0
+
+        for record in await NotificationService.get_notifications_by_ids(notification_ids):
+            if record is not None and record.status == NotificationStatus.PENDING:
+                await dispatcher.dispatch(record)
+        return len(notification_ids)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if await self.poll_once() >= settings.retry_batch_size:
+                    continue
+            except Exception as e:
+                print(f"Retry poll failed: {e}")
+            await asyncio.sleep(settings.retry_poll_interval)
+
+retry_poller = RetryPoller()
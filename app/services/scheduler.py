@@ -0,0 +1,33 @@
+import asyncio
+from app.config import settings
+from app.models.notification import NotificationStatus
+from app.services.dispatcher import dispatcher
+from app.services.notifications import NotificationService
+from app.services.timeindex import schedule_index
+
+class SchedulePoller:
+    """
+    Пачками забирает из schedule_index уведомления с наступившим send_at и отдаёт их в доставку.
+    Отложенные уведомления — только элементы sorted set: ни задач, ни таймеров на каждое.
+    """
+
+    async def poll_once(self) -> int:
+        notification_ids = await schedule_index.pop_due(settings.schedule_batch_size)
+        if not notification_ids:
+            return 0
+
+        for record in await NotificationService.get_notifications_by_ids(notification_ids):
+            if record is not None and record.status == NotificationStatus.PENDING:
+                await dispatcher.dispatch(record)
+        return len(notification_ids)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if await self.poll_once() >= settings.schedule_batch_size:
+                    continue
+            except Exception as e:
+                print(f"Schedule poll failed: {e}")
+            await asyncio.sleep(settings.schedule_poll_interval)
+
+schedule_poller = SchedulePoller()
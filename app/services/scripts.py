@@ -0,0 +1,111 @@
+"""Lua-скрипты сервиса. Вызываются через register_script: EVALSHA с откатом на EVAL."""
+
+# Атомарно проверяет несколько token bucket и списывает по токену из каждого,
+# только если все разрешают. Возвращает 0 или сколько мс подождать.
+TOKEN_BUCKET = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - ts) * rate / 1000)
+    if available < 1 then
+        wait = math.max(wait, math.ceil((1 - available) * 1000 / rate))
+    end
+    tokens[i] = available
+end
+if wait == 0 then
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i * 2 - 1])
+        local capacity = tonumber(ARGV[i * 2])
+        redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+        redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000) + 1000)
+    end
+end
+return wait
+"""
+
+# Атомарно забирает до ARGV[2] элементов со score <= ARGV[1]
+POP_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+# Атомарно забирает до ARGV[3] элементов со score <= ARGV[1], оставляя их в наборе
+# со score ARGV[2]: следующий вызов увидит их не раньше, чем наступит новый score
+CLAIM_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[2], member)
+end
+return due
+"""
+
+# Переход статуса уведомления.
+# KEYS[1] — хеш уведомления, KEYS[2..] — ключи для сопутствующих операций.
+# ARGV: поле статуса, новый статус, допустимые текущие статусы через пробел,
+#       число пар поле/значение, сами пары, затем по тройке (op, a, b) на каждый KEYS[2..]:
+#       zadd score member | zrem member - | hincrby field delta,
+#       и необязательные канал и сообщение для PUBLISH.
+# Возвращает {1, старый статус}, {0, текущий статус} при недопустимом переходе,
+# {-1, ''} если уведомления нет, {-2, ''} если хеш записан в другом формате.
+TRANSITION = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {-1, ''}
+    end
+    return {-2, ''}
+end
+local allowed = false
+for status in string.gmatch(ARGV[3], '%S+') do
+    if status == current then
+        allowed = true
+    end
+end
+if not allowed then
+    return {0, current}
+end
+local fields = {ARGV[1], ARGV[2]}
+local pos = 5
+for i = 1, tonumber(ARGV[4]) do
+    fields[#fields + 1] = ARGV[pos]
+    fields[#fields + 1] = ARGV[pos + 1]
+    pos = pos + 2
+end
+redis.call('HSET', KEYS[1], unpack(fields))
+for k = 2, #KEYS do
+    local op = ARGV[pos]
+    if op == 'zadd' then
+        redis.call('ZADD', KEYS[k], ARGV[pos + 1], ARGV[pos + 2])
+    elseif op == 'zrem' then
+        redis.call('ZREM', KEYS[k], ARGV[pos + 1])
+    elseif op == 'hincrby' then
+        redis.call('HINCRBY', KEYS[k], ARGV[pos + 1], ARGV[pos + 2])
+    end
+    pos = pos + 3
+end
+if ARGV[pos] then
+    redis.call('PUBLISH', ARGV[pos], ARGV[pos + 1])
+end
+return {1, current}
+"""
+
+# Удаляет KEYS[1], только если его значение равно ARGV[1]:
+# снятие своей блокировки, освобождение своего ключа идемпотентности
+DELETE_IF_EQUAL = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+ALL_SCRIPTS = [TOKEN_BUCKET, POP_DUE, CLAIM_DUE, TRANSITION, DELETE_IF_EQUAL]
@@ -0,0 +1,78 @@
+from typing import Dict, List
+from app.models.notification import NotificationStatus, NotificationType
+from app.services.keys import GLOBAL_STATS_KEY, user_stats_key
+from app.services.redis import redis_service
+
+
+def counter_field(notification_type: NotificationType, status: NotificationStatus) -> str:
+    return f"{notification_type.value}:{status.value}"
+
+
+class NotificationStats:
+    """
+    Счётчики уведомлений в хешах Redis: по пользователю и общий, поля `{type}:{status}`.
+    Меняются в тех же pipeline и скриптах, что и сами уведомления.
+    """
+
+    @staticmethod
+    def create_in(pipe, user_id: int, notification_type: NotificationType) -> None:
+        field = counter_field(notification_type, NotificationStatus.PENDING)
+        pipe.hincrby(user_stats_key(user_id), field, 1)
+        pipe.hincrby(GLOBAL_STATS_KEY, field, 1)
+
+    @staticmethod
+    def transition_ops(
+        user_id: int,
+        notification_type: NotificationType,
+        source: NotificationStatus,
+        status: NotificationStatus
+    ) -> list:
+        """Операции скрипта перехода, переносящие единицу из source в status"""
+        if source == status:
+            return []
+        ops = []
+        for key in (user_stats_key(user_id), GLOBAL_STATS_KEY):
+            ops.append((key, "hincrby", counter_field(notification_type, source), -1))
+            ops.append((key, "hincrby", counter_field(notification_type, status), 1))
+        return ops
+
+    @staticmethod
+    def summarize(counters: Dict[str, str]) -> dict:
+        by_type_status = {
+            t.value: {s.value: 0 for s in NotificationStatus} for t in NotificationType
+        }
+        for field, value in counters.items():
+            notification_type, _, status = field.partition(":")
+            if notification_type in by_type_status and status in by_type_status[notification_type]:
+                by_type_status[notification_type][status] = int(value)
+
+        by_status = {s.value: 0 for s in NotificationStatus}
+        for counts in by_type_status.values():
+            for status, count in counts.items():
+                by_status[status] += count
+
+        return {
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "by_type": {t: sum(counts.values()) for t, counts in by_type_status.items()},
+            "by_type_and_status": by_type_status
+        }
+
+    @staticmethod
+    async def get_global() -> dict:
+        async with redis_service.get_connection() as r:
+            counters = await r.hgetall(GLOBAL_STATS_KEY)
+        return NotificationStats.summarize(counters)
+
+    @staticmethod
+    async def get_users(user_ids: List[int]) -> Dict[int, dict]:
+        """Счётчики нескольких пользователей за один pipeline"""
+        async with redis_service.get_connection() as r:
+            async with r.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.hgetall(user_stats_key(user_id))
+                rows = await pipe.execute()
+        return {
+            user_id: NotificationStats.summarize(counters)
+            for user_id, counters in zip(user_ids, rows)
+        }
@@ -0,0 +1,78 @@
+import time
+from typing import Iterable, List, Optional
+from app.models.notification import NotificationRecord, NotificationStatus, NotificationType
+from app.services import scripts
+from app.services.keys import status_index_key
+from app.services.redis import redis_service
+from app.services.timeindex import Page, page_sorted_sets
+
+
+class StatusIndex:
+    """
+    Sorted set id уведомлений на каждую пару (канал, статус), общий для всех пользователей.
+    score — время входа в статус; у pending — время, к которому уведомление должно уйти
+    в доставку: создание, send_at отложенного или срок повтора.
+    Меняются в тех же pipeline и скриптах, что и сами уведомления.
+    """
+
+    @staticmethod
+    def key(notification_type: NotificationType, status: NotificationStatus) -> str:
+        return status_index_key(notification_type.value, status.value)
+
+    @staticmethod
+    def create_in(pipe, record: NotificationRecord, at: float) -> None:
+        pipe.zadd(StatusIndex.key(record.type, NotificationStatus.PENDING), {record.id: at})
+
+    @staticmethod
+    def remove_in(pipe, record: NotificationRecord) -> None:
+        pipe.zrem(StatusIndex.key(record.type, record.status), record.id)
+
+    @staticmethod
+    def transition_ops(
+        record: NotificationRecord,
+        source: NotificationStatus,
+        status: NotificationStatus,
+        at: float
+    ) -> list:
+        """Операции скрипта перехода, переносящие id из индекса source в индекс status"""
+        if source == status:
+            return []
+        return [
+            (StatusIndex.key(record.type, source), "zrem", record.id, None),
+            (StatusIndex.key(record.type, status), "zadd", at, record.id),
+        ]
+
+    @staticmethod
+    async def page(
+        statuses: Iterable[NotificationStatus],
+        types: Iterable[NotificationType],
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Page:
+        """Страница id уведомлений в любом из statuses и types со score в [since, until), от новых к старым"""
+        keys = [StatusIndex.key(t, s) for s in statuses for t in types]
+        async with redis_service.get_connection() as r:
+            return await page_sorted_sets(r, keys, cursor, limit, since, until)
+
+    @staticmethod
+    async def claim_stale_pending(
+        notification_type: NotificationType, older_than: float, limit: int
+    ) -> List[str]:
+        """
+        Pending со score не позже time() - older_than; score забранных сдвигается на текущее время,
+        поэтому каждое достаётся одному вызывающему и не раньше чем через older_than снова
+        """
+        now = time.time()
+        async with redis_service.get_connection() as r:
+            script = r.register_script(scripts.CLAIM_DUE)
+            return await script(
+                keys=[StatusIndex.key(notification_type, NotificationStatus.PENDING)],
+                args=[now - older_than, now, limit]
+            )
+
+    @staticmethod
+    async def remove(notification_type: NotificationType, status: NotificationStatus, notification_id: str) -> None:
+        async with redis_service.get_connection() as r:
+            await r.zrem(StatusIndex.key(notification_type, status), notification_id)
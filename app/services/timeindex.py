@@ -0,0 +1,126 @@
+import math
+import time
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.services import scripts
+from app.services.redis import redis_service
+
+Page = Tuple[List[Tuple[str, float]], Optional[str]]
+
+
+def parse_cursor(cursor: Optional[str]) -> Tuple[str, int]:
+    """
+    Курсор `{score}:{offset}`: страница начинается со score включительно,
+    пропуская offset элементов с этим score, уже отданных на прошлых страницах.
+    """
+    if not cursor:
+        return "+inf", 0
+    score, _, offset = cursor.partition(":")
+    try:
+        max_score, skip = float(score), int(offset or 0)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    # nan Redis не примет, inf и отрицательный offset next_cursor не выдаёт
+    if not math.isfinite(max_score) or skip < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return repr(max_score), skip
+
+
+async def page_sorted_set(r, key: str, cursor: Optional[str], limit: int) -> Page:
+    """Страница sorted set от больших score к меньшим с устойчивым к одинаковым score курсором"""
+    max_score, offset = parse_cursor(cursor)
+    entries = await r.zrevrangebyscore(
+        key, max_score, "-inf", start=offset, num=limit, withscores=True
+    )
+    return entries, next_cursor([score for _, score in entries], max_score, offset, limit)
+
+
+async def page_sorted_sets(
+    r,
+    keys: List[str],
+    cursor: Optional[str],
+    limit: int,
+    since: Optional[float] = None,
+    until: Optional[float] = None
+) -> Page:
+    """
+    Как page_sorted_set, но по объединению нескольких sorted set и только со score в [since, until).
+    Из каждого набора читается не больше offset + limit элементов, слияние — в процессе.
+    """
+    max_score, offset = parse_cursor(cursor)
+    if until is not None and (max_score == "+inf" or float(max_score) >= until):
+        max_score, offset = f"({until!r}", 0
+    min_score = "-inf" if since is None else repr(since)
+
+    async with r.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.zrevrangebyscore(key, max_score, min_score, start=0, num=offset + limit, withscores=True)
+        rows = await pipe.execute()
+    # Порядок как у ZREVRANGEBYSCORE: по score, при равных — по члену, оба по убыванию
+    merged = sorted(
+        (entry for row in rows for entry in row), key=lambda entry: (entry[1], entry[0]), reverse=True
+    )
+    entries = merged[offset:offset + limit]
+    return entries, next_cursor([score for _, score in entries], max_score, offset, limit)
+
+
+def next_cursor(scores: List[float], max_score: str, offset: int, limit: int) -> Optional[str]:
+    """Курсор страницы после scores, полученной по parse_cursor(...) == (max_score, offset)"""
+    if len(scores) < limit:
+        return None
+
+    last_score = scores[-1]
+    ties = 0
+    for score in reversed(scores):
+        if score != last_score:
+            break
+        ties += 1
+    if ties == len(scores) and max_score == repr(last_score):
+        ties += offset
+    return f"{last_score!r}:{ties}"
+
+
+class TimeIndex:
+    """Sorted set id уведомлений, score — unix-время"""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def add_in(self, pipe, notification_id: str, at: float) -> None:
+        pipe.zadd(self.key, {notification_id: at})
+
+    def remove_in(self, pipe, notification_id: str) -> None:
+        pipe.zrem(self.key, notification_id)
+
+    async def add(self, notification_id: str, at: float) -> None:
+        async with redis_service.get_connection() as r:
+            await r.zadd(self.key, {notification_id: at})
+
+    async def remove(self, notification_id: str) -> bool:
+        async with redis_service.get_connection() as r:
+            return bool(await r.zrem(self.key, notification_id))
+
+    async def move(self, notification_id: str, at: float) -> bool:
+        """Переносит элемент на время at, только если он ещё в индексе"""
+        async with redis_service.get_connection() as r:
+            if await r.zadd(self.key, {notification_id: at}, xx=True, ch=True):
+                return True
+            # Счётчик изменений равен нулю и при том же score
+            return await r.zscore(self.key, notification_id) == at
+
+    async def pop_due(self, limit: int, now: Optional[float] = None) -> List[str]:
+        """Забирает наступившие элементы; каждый достаётся ровно одному вызывающему"""
+        now = time.time() if now is None else now
+        async with redis_service.get_connection() as r:
+            script = r.register_script(scripts.POP_DUE)
+            return await script(keys=[self.key], args=[now, limit])
+
+    async def page(self, cursor: Optional[str] = None, limit: int = 50) -> Page:
+        """Страница от новых к старым, как у истории пользователя"""
+        async with redis_service.get_connection() as r:
+            return await page_sorted_set(r, self.key, cursor, limit)
+
+retry_index = TimeIndex(settings.retry_key)
+dead_letter_index = TimeIndex(settings.dead_letter_key)
+digest_index = TimeIndex(settings.digest_key)
+schedule_index = TimeIndex(settings.schedule_key)
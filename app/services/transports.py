@@ -0,0 +1,255 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from typing import TYPE_CHECKING, Dict, List, Optional
+from app.config import settings
+from app.models.notification import NotificationRecord, NotificationType
+
+# aiosmtplib и httpx нужны только настоящим транспортам: импорт при первом использовании
+# не замедляет старт процесса с каналами-заглушками
+if TYPE_CHECKING:
+    import aiosmtplib
+    import httpx
+
+# Время «отправки» каналов-заглушек, секунды
+SIMULATED_DELAYS = {
+    NotificationType.TELEGRAM: 2,
+    NotificationType.EMAIL: 3,
+}
+
+
+class Transport(ABC):
+    """Отправка уведомления в канал; ошибка отправки — исключение"""
+
+    @abstractmethod
+    async def send(self, record: NotificationRecord) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class SimulatedTransport(Transport):
+    """Заглушка канала: отправка занимает delay секунд"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def send(self, record: NotificationRecord) -> None:
+        await asyncio.sleep(self.delay)
+
+
+class _SmtpSession:
+    def __init__(self, client: "aiosmtplib.SMTP"):
+        self.client = client
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SmtpTransport(Transport):
+    """
+    Пул авторизованных SMTP-сессий: соединение и TLS/AUTH — один раз на сессию,
+    дальше письма идут по ней подряд. Не больше pool_size сессий, каждая закрывается
+    после max_messages писем или idle_timeout секунд простоя.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sender: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = False,
+        start_tls: Optional[bool] = None,
+        pool_size: int = 4,
+        max_messages: int = 100,
+        idle_timeout: float = 30.0,
+        timeout: float = 10.0
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.pool_size = pool_size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connections = 0
+        self._idle: List[_SmtpSession] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def message(self, record: NotificationRecord) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = settings.email_address_template.format(user_id=record.user_id)
+        message["Subject"] = settings.email_subject
+        message.set_content(record.message)
+        return message
+
+    async def _connect(self) -> _SmtpSession:
+        import aiosmtplib
+        client = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await client.connect()
+        self.connections += 1
+        return _SmtpSession(client)
+
+    async def _discard(self, session: _SmtpSession) -> None:
+        try:
+            await session.client.quit()
+        except Exception:
+            session.client.close()
+
+    async def _take(self) -> _SmtpSession:
+        now = time.monotonic()
+        while self._idle:
+            session = self._idle.pop()
+            if session.client.is_connected and now - session.last_used < self.idle_timeout:
+                return session
+            await self._discard(session)
+        return await self._connect()
+
+    @asynccontextmanager
+    async def session(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            session = await self._take()
+            try:
+                yield session
+            except Exception:
+                session.client.close()
+                raise
+            session.sent += 1
+            session.last_used = time.monotonic()
+            if session.sent >= self.max_messages:
+                await self._discard(session)
+            else:
+                self._idle.append(session)
+
+    async def send(self, record: NotificationRecord) -> None:
+        import aiosmtplib
+        message = self.message(record)
+        try:
+            async with self.session() as session:
+                await session.client.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Сервер мог закрыть простаивавшую сессию раньше idle_timeout: одна попытка на новой
+            async with self.session() as session:
+                await session.client.send_message(message)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for session in idle:
+            await self._discard(session)
+        self._slots = None
+
+
+class TelegramTransport(Transport):
+    """
+    Bot API sendMessage через общий httpx.AsyncClient: keep-alive соединения
+    (и HTTP/2, если сервер его согласует) переиспользуются всеми отправками процесса.
+    chat_id личного чата с ботом совпадает с id пользователя Telegram.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        token: str,
+        pool_size: int = 30,
+        http2: bool = True,
+        timeout: float = 10.0,
+        transport: Optional["httpx.AsyncBaseTransport"] = None
+    ):
+        self.url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self.pool_size = pool_size
+        self.http2 = http2
+        self.timeout = timeout
+        self.transport = transport
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+                ),
+                transport=self.transport
+            )
+        return self._client
+
+    async def send(self, record: NotificationRecord) -> None:
+        response = await self.client.post(self.url, json={"chat_id": record.user_id, "text": record.message})
+        response.raise_for_status()
+        body = response.json()
+        if not body.get("ok"):
+            raise RuntimeError(f"Telegram API error: {body.get('description')}")
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_transport(notification_type: NotificationType) -> Transport:
+    if notification_type == NotificationType.TELEGRAM and settings.telegram_transport == "http":
+        return TelegramTransport(
+            settings.telegram_api_url,
+            settings.telegram_bot_token,
+            pool_size=settings.telegram_concurrency,
+            http2=settings.telegram_http2,
+            timeout=settings.transport_timeout
+        )
+    if notification_type == NotificationType.EMAIL and settings.email_transport == "smtp":
+        return SmtpTransport(
+            settings.smtp_host,
+            settings.smtp_port,
+            settings.smtp_sender,
+            username=settings.smtp_username,
+            password=settings.smtp_password,
+            use_tls=settings.smtp_use_tls,
+            start_tls=settings.smtp_start_tls,
+            pool_size=settings.smtp_pool_size,
+            max_messages=settings.smtp_max_messages,
+            idle_timeout=settings.smtp_idle_timeout,
+            timeout=settings.transport_timeout
+        )
+    return SimulatedTransport(SIMULATED_DELAYS[notification_type])
+
+
+class Transports:
+    """Транспорт каждого канала; создаётся при первой отправке, закрывается при остановке процесса"""
+
+    def __init__(self):
+        self._transports: Dict[NotificationType, Transport] = {}
+
+    def get(self, notification_type: NotificationType) -> Transport:
+        transport = self._transports.get(notification_type)
+        if transport is None:
+            transport = self._transports[notification_type] = create_transport(notification_type)
+        return transport
+
+    async def close(self) -> None:
+        transports, self._transports = self._transports, {}
+        for transport in transports.values():
+            await transport.close()
+
+
+transports = Transports()
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import time
+from typing import Set
+from app.config import settings
+from app.models.notification import NotificationStatus
+from app.services.digest_poller import digest_poller
+from app.services.dispatcher import dispatcher
+from app.services.metrics import mark_process_dead
+from app.services.notifications import NotificationService
+from app.services.queue import Entry, delivery_queue
+from app.services.redis import redis_service
+from app.services.recovery import pending_recovery
+from app.services.retry import retry_poller
+from app.services.scheduler import schedule_poller
+from app.services.transports import transports
+
+
+class DeliveryWorker:
+    """Читает задачи доставки из Redis Stream и выполняет их с ограничением параллелизма"""
+
+    def __init__(self, consumer: str, concurrency: int):
+        self.consumer = consumer
+        self.concurrency = concurrency
+        self._tasks: Set[asyncio.Task] = set()
+        self._last_claim = 0.0
+        self._stopping = asyncio.Event()
+
+    async def _process(self, entry: Entry) -> None:
+        stream, entry_id, fields = entry
+        try:
+            record = await NotificationService.get_notification(fields["id"])
+            if record is not None and record.status == NotificationStatus.PENDING:
+                await dispatcher.submit(record)
+            await delivery_queue.ack(stream, entry_id)
+        except Exception as e:
+            print(f"Delivery of {entry_id} failed: {e}")
+
+    def _spawn(self, entries) -> None:
+        for entry in entries:
+            task = asyncio.create_task(self._process(entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def poll(self) -> None:
+        """Одна итерация: подобрать зависшие задачи и прочитать новые"""
+        free = self.concurrency - len(self._tasks)
+        if free <= 0:
+            await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+            return
+
+        now = time.monotonic()
+        if now - self._last_claim >= settings.worker_claim_interval:
+            self._last_claim = now
+            claimed = await delivery_queue.claim_stale(self.consumer, settings.worker_claim_idle_ms, free)
+            self._spawn(claimed)
+            free -= len(claimed)
+            if free <= 0:
+                return
+
+        self._spawn(await delivery_queue.read(self.consumer, free, settings.worker_block_ms))
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        await delivery_queue.ensure_group()
+        print(f"Worker {self.consumer} started, concurrency={self.concurrency}")
+        while not self._stopping.is_set():
+            await self.poll()
+        await self.drain()
+
+
+async def main(consumer: str, concurrency: int) -> None:
+    worker = DeliveryWorker(consumer, concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    await redis_service.connect()
+    tasks = [asyncio.create_task(retry_poller.run()), asyncio.create_task(schedule_poller.run())]
+    if settings.digest_channels:
+        tasks.append(asyncio.create_task(digest_poller.run()))
+    if settings.recovery_enabled:
+        tasks.append(asyncio.create_task(pending_recovery.run()))
+    try:
+        await worker.run()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await dispatcher.close()
+        await transports.close()
+        await redis_service.close()
+        mark_process_dead()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воркер доставки уведомлений")
+    parser.add_argument("--consumer", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--concurrency", type=int, default=settings.worker_concurrency)
+    args = parser.parse_args()
+    asyncio.run(main(args.consumer, args.concurrency))
@@ -0,0 +1,90 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import fakeredis
+from redis.asyncio.connection import AbstractConnection
+from app.services.redis import redis_service
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def use_redis(kind: str) -> None:
+    """
+    fake — Redis внутри процесса (fakeredis), real — redis-server из настроек
+    (REDIS_HOST, REDIS_PORT, REDIS_DB).
+    """
+    if kind == "fake":
+        redis_service._connection = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+class CommandCounter:
+    """Считает команды, отправленные в Redis этим процессом, включая команды pipeline и скриптов"""
+
+    def __init__(self):
+        self.count = 0
+
+    @contextmanager
+    def counting(self):
+        original = AbstractConnection.pack_command
+        counter = self
+
+        def pack_command(connection, *args):
+            counter.count += 1
+            return original(connection, *args)
+
+        AbstractConnection.pack_command = pack_command
+        try:
+            yield self
+        finally:
+            AbstractConnection.pack_command = original
+
+
+def summarize(samples: List[float], elapsed: Optional[float] = None) -> Dict[str, float]:
+    """Перцентили задержки в мс и пропускная способность в запросах в секунду"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    result = {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+    if elapsed:
+        result["throughput_rps"] = len(ordered) / elapsed
+    return result
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(name: str, results: dict, path: Optional[str] = None) -> str:
+    """Сохраняет результаты в JSON: bench/results/{name}-{время}.json по умолчанию"""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), **results}, f, indent=2, ensure_ascii=False)
+    return path
@@ -0,0 +1,170 @@
+"""
+Нагрузочный прогон API: открытая модель нагрузки с заданным RPS и смесью запросов.
+
+    python -m bench.load --rps 200 --duration 30 --mix send=1,history=3
+    REDIS_HOST=localhost python -m bench.load --redis real --transport http
+
+Задержка считается от запланированного момента запроса, а не от фактической отправки,
+поэтому отставание генератора не прячет хвосты (coordinated omission).
+"""
+import argparse
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from typing import Dict, List
+import httpx
+import uvicorn
+from app.config import settings
+from app.main import app
+from app.models.user import SendNotificationData
+from app.services.notifications import NotificationService
+from bench.common import CommandCounter, save_results, summarize, use_redis
+
+OPERATIONS = ("send", "history")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """`send=1,history=3` -> доли операций"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+@asynccontextmanager
+async def serve(transport: str, port: int):
+    """Поднимает app.main:app вместе с lifespan и отдаёт клиент к нему"""
+    if transport == "asgi":
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://bench"
+            ) as client:
+                yield client
+        return
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def seed(users: int, history_size: int) -> None:
+    """Наполняет историю каждого пользователя history_size уведомлениями"""
+    items = [
+        SendNotificationData(user_id=user_id, message=f"Seed {i}", type="email")
+        for user_id in range(1, users + 1)
+        for i in range(history_size)
+    ]
+    for start in range(0, len(items), settings.batch_chunk_size * 10):
+        await NotificationService.create_notifications(items[start:start + settings.batch_chunk_size * 10])
+
+
+async def request(client: httpx.AsyncClient, operation: str, user_id: int) -> httpx.Response:
+    if operation == "send":
+        return await client.post("/api/notifications/", params={
+            "user_id": user_id,
+            "message": "Benchmark notification",
+            "notification_type": random.choice(("telegram", "email")),
+        })
+    return await client.get("/api/notifications/", params={"user_id": user_id})
+
+
+async def run(args) -> dict:
+    use_redis(args.redis)
+    rng = random.Random(args.seed)
+    operations = list(args.mix)
+    weights = [args.mix[name] for name in operations]
+    total = int(args.rps * args.duration)
+    plan = [(rng.choices(operations, weights)[0], rng.randint(1, args.users)) for _ in range(total)]
+
+    samples: Dict[str, List[float]] = {name: [] for name in operations}
+    errors: Dict[str, int] = {name: 0 for name in operations}
+    counter = CommandCounter()
+
+    async with serve(args.transport, args.port) as client:
+        await seed(args.users, args.history_size)
+        loop = asyncio.get_running_loop()
+
+        async def fire(operation: str, user_id: int, scheduled: float) -> None:
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                response = await request(client, operation, user_id)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                samples[operation].append(loop.time() - scheduled)
+            else:
+                errors[operation] += 1
+
+        with counter.counting():
+            start = loop.time() + 0.1
+            await asyncio.gather(*(
+                fire(operation, user_id, start + i / args.rps)
+                for i, (operation, user_id) in enumerate(plan)
+            ))
+            elapsed = loop.time() - start
+
+    everything = [latency for values in samples.values() for latency in values]
+    return {
+        "config": {
+            "rps": args.rps,
+            "duration": args.duration,
+            "mix": args.mix,
+            "users": args.users,
+            "history_size": args.history_size,
+            "redis": args.redis,
+            "transport": args.transport,
+            "storage_format": settings.storage_format,
+            "delivery_mode": settings.delivery_mode,
+            "cache_enabled": settings.cache_enabled,
+        },
+        "elapsed_s": elapsed,
+        "total": summarize(everything, elapsed),
+        "operations": {name: summarize(values, elapsed) for name, values in samples.items()},
+        "errors": errors,
+        # Включая команды фоновой доставки, выполненные за время прогона
+        "redis_commands": counter.count,
+        "redis_commands_per_request": counter.count / max(1, total),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон отправки и истории уведомлений")
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=10, help="Длительность, с")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("send=1,history=1"))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--history-size", type=int, default=50, help="Уведомлений на пользователя до старта")
+    parser.add_argument("--redis", choices=["fake", "real"], default="fake")
+    parser.add_argument("--transport", choices=["asgi", "http"], default="asgi")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Файл результатов (по умолчанию bench/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    path = save_results("load", results, args.out)
+    total = results["total"]
+    print(
+        f"{total.get('count', 0)} ok, {sum(results['errors'].values())} errors, "
+        f"{total.get('throughput_rps', 0):.0f} rps, p50 {total.get('p50_ms', 0):.1f} ms, "
+        f"p99 {total.get('p99_ms', 0):.1f} ms, "
+        f"{results['redis_commands_per_request']:.1f} Redis commands/request -> {path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
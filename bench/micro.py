@@ -0,0 +1,200 @@
+"""
+Микробенчмарки кодирования записи и чтения истории.
+
+    python -m bench.micro --sizes 10,1000,100000
+"""
+import argparse
+import asyncio
+import time
+import timeit
+from datetime import datetime
+from unittest.mock import patch
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.models.notification import NotificationRecord, NotificationStatus, NotificationType
+from app.models.user import SendNotificationData
+from app.routers.notification import _records_response
+from app.services.metrics import MetricsMiddleware, RedisCommandTimer
+from app.services.notifications import NotificationService
+from bench.common import save_results, summarize, use_redis
+
+
+def bench_codec(number: int) -> dict:
+    """Время to_redis_hash/from_redis_hash в мкс на запись для каждого формата хранения"""
+    record = NotificationRecord(
+        id="1:01J0000000000000000000000",
+        user_id=1,
+        message="Benchmark notification " * 4,
+        type=NotificationType.EMAIL,
+        status=NotificationStatus.SENT,
+        sent_at=datetime.utcnow(),
+    )
+    results = {}
+    for storage_format in ("hash", "compact"):
+        with patch.object(settings, "storage_format", storage_format):
+            data = record.to_redis_hash()
+            encode = min(timeit.repeat(record.to_redis_hash, number=number, repeat=5))
+            decode = min(timeit.repeat(
+                lambda: NotificationRecord.from_redis_hash(data, record.id), number=number, repeat=5
+            ))
+        results[storage_format] = {
+            "to_redis_hash_us": encode / number * 1e6,
+            "from_redis_hash_us": decode / number * 1e6,
+            "payload_bytes": sum(len(k) + len(str(v)) for k, v in data.items()),
+        }
+    return results
+
+
+def bench_response(limit: int, number: int) -> dict:
+    """Кодирование страницы истории из limit записей в мкс: через dict и jsonable_encoder и напрямую"""
+    records = [
+        NotificationRecord(
+            id=f"1:01J{i:022d}",
+            user_id=1,
+            message="Benchmark notification " * 4,
+            type=NotificationType.EMAIL,
+            status=NotificationStatus.SENT,
+            sent_at=datetime.utcnow(),
+        )
+        for i in range(limit)
+    ]
+
+    def page(notifications) -> dict:
+        return {"user_id": 1, "notifications": notifications, "count": limit, "next_cursor": None}
+
+    def via_dict() -> bytes:
+        return JSONResponse(jsonable_encoder(page([record.model_dump() for record in records]))).body
+
+    def direct() -> bytes:
+        return _records_response(page(records)).body
+
+    assert via_dict() == direct()
+    number = max(1, number // limit)
+    return {
+        "records": limit,
+        "jsonable_encoder_us": min(timeit.repeat(via_dict, number=number, repeat=5)) / number * 1e6,
+        "direct_us": min(timeit.repeat(direct, number=number, repeat=5)) / number * 1e6,
+    }
+
+
+async def bench_instrumentation(number: int) -> dict:
+    """Накладные расходы метрик в мкс: middleware на запрос и замер одной команды Redis"""
+    class Route:
+        path = "/api/notifications/"
+
+    async def endpoint(scope, receive, send):
+        scope["route"] = Route
+        await send({"type": "http.response.start", "status": 200})
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET"}
+    instrumented = MetricsMiddleware(endpoint)
+
+    async def timed(app) -> float:
+        best = float("inf")
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(number):
+                await app(dict(scope), None, send)
+            best = min(best, time.perf_counter() - started)
+        return best / number * 1e6
+
+    def timer():
+        with RedisCommandTimer("GET"):
+            pass
+
+    bare_us = await timed(endpoint)
+    return {
+        "middleware_per_request_us": await timed(instrumented) - bare_us,
+        "redis_command_timer_us": min(timeit.repeat(timer, number=number, repeat=5)) / number * 1e6,
+    }
+
+
+async def bench_history(sizes, repeat: int, limit: int) -> dict:
+    """Задержка чтения первой и последней страницы истории при разном её размере"""
+    results = {}
+    for user_id, size in enumerate(sizes, start=1):
+        items = [SendNotificationData(user_id=user_id, message=f"Seed {i}", type="email") for i in range(size)]
+        started = time.perf_counter()
+        await NotificationService.create_notifications(items)
+        seeded = time.perf_counter() - started
+
+        first = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await NotificationService.get_user_notifications(user_id, limit=limit)
+            first.append(time.perf_counter() - started)
+
+        # Курсор последней страницы: score самой старой записи
+        _, cursor = await NotificationService.get_user_notifications(user_id, limit=max(1, size - limit))
+        last = []
+        for _ in range(repeat if cursor else 0):
+            started = time.perf_counter()
+            await NotificationService.get_user_notifications(user_id, cursor=cursor, limit=limit)
+            last.append(time.perf_counter() - started)
+
+        results[str(size)] = {
+            "seed_s": seeded,
+            "first_page": summarize(first),
+            "last_page": summarize(last),
+        }
+    return results
+
+
+async def run(args) -> dict:
+    use_redis(args.redis)
+    return {
+        "config": {
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+            "limit": args.limit,
+            "redis": args.redis,
+            "storage_format": settings.storage_format,
+        },
+        "codec": bench_codec(args.number),
+        "response": bench_response(args.limit, args.number),
+        "instrumentation": await bench_instrumentation(args.number),
+        "history": await bench_history(args.sizes, args.repeat, args.limit),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарки кодирования записи и чтения истории")
+    parser.add_argument("--sizes", type=lambda v: [int(s) for s in v.split(",")], default=[10, 1000, 100000])
+    parser.add_argument("--repeat", type=int, default=50, help="Повторов чтения страницы")
+    parser.add_argument("--limit", type=int, default=settings.history_page_size)
+    parser.add_argument("--number", type=int, default=20000, help="Вызовов кодирования на замер")
+    parser.add_argument("--redis", choices=["fake", "real"], default="fake")
+    parser.add_argument("--out", help="Файл результатов (по умолчанию bench/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    path = save_results("micro", results, args.out)
+    for storage_format, codec in results["codec"].items():
+        print(
+            f"{storage_format}: to_redis_hash {codec['to_redis_hash_us']:.2f} us, "
+            f"from_redis_hash {codec['from_redis_hash_us']:.2f} us"
+        )
+    response = results["response"]
+    print(
+        f"history page of {response['records']}: jsonable_encoder {response['jsonable_encoder_us']:.0f} us, "
+        f"direct {response['direct_us']:.0f} us"
+    )
+    instrumentation = results["instrumentation"]
+    print(
+        f"metrics: middleware {instrumentation['middleware_per_request_us']:.2f} us/request, "
+        f"redis command {instrumentation['redis_command_timer_us']:.2f} us"
+    )
+    for size, history in results["history"].items():
+        print(
+            f"history {size}: first page p50 {history['first_page']['p50_ms']:.2f} ms, "
+            f"last page p50 {history['last_page'].get('p50_ms', 0):.2f} ms"
+        )
+    print(f"-> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Задержка полос приоритета под рассылкой: в диспетчер канала разом ставится кампания bulk,
+а коды (critical) приходят с постоянной частотой, пока она отправляется.
+
+    python -m bench.priority --bulk 20000 --critical-rps 20 --send-ms 20 --concurrency 30
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+from app.models.notification import (
+    NotificationPriority, NotificationRecord, NotificationStatus, NotificationType
+)
+from app.services.dispatcher import ChannelDispatcher
+from bench.common import save_results, summarize, use_redis
+
+
+def record(user_id: int, priority: NotificationPriority) -> NotificationRecord:
+    return NotificationRecord.model_construct(
+        user_id=user_id, message="Benchmark", type=NotificationType.TELEGRAM,
+        status=NotificationStatus.PENDING, priority=priority
+    )
+
+
+async def run(args) -> dict:
+    use_redis(args.redis)
+    waits: Dict[NotificationPriority, List[float]] = {priority: [] for priority in NotificationPriority}
+    submitted: Dict[int, float] = {}
+
+    async def deliver(item: NotificationRecord) -> NotificationRecord:
+        # Ожидание до начала отправки — то же, что notification_queue_time_seconds
+        waits[item.priority].append(time.perf_counter() - submitted[id(item)])
+        await asyncio.sleep(args.send_ms / 1000)
+        return item
+
+    channel = ChannelDispatcher(
+        NotificationType.TELEGRAM, deliver, concurrency=args.concurrency,
+        rate=args.rate, burst=max(1, int(args.rate)), recipient_rate=0, recipient_burst=0
+    )
+
+    def submit(item: NotificationRecord) -> asyncio.Future:
+        submitted[id(item)] = time.perf_counter()
+        return channel.submit(item)
+
+    started = time.perf_counter()
+    futures = [submit(record(i + 1, NotificationPriority.BULK)) for i in range(args.bulk)]
+    campaign = asyncio.gather(*futures)
+
+    critical = []
+    while not campaign.done():
+        critical.append(submit(record(len(critical) + 1, NotificationPriority.CRITICAL)))
+        await asyncio.sleep(1 / args.critical_rps)
+    await asyncio.gather(*critical)
+    elapsed = time.perf_counter() - started
+    await channel.close()
+
+    return {
+        "params": vars(args),
+        "elapsed_s": elapsed,
+        "queue_time": {
+            priority.value: summarize(samples) for priority, samples in waits.items() if samples
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Задержка critical под кампанией bulk в одном канале")
+    parser.add_argument("--bulk", type=int, default=5000, help="Размер кампании")
+    parser.add_argument("--critical-rps", type=float, default=20)
+    parser.add_argument("--send-ms", type=float, default=20, help="Время одной отправки")
+    parser.add_argument("--concurrency", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=0, help="Лимит канала, сообщений в секунду")
+    parser.add_argument("--redis", choices=["fake", "real"], default="fake")
+    parser.add_argument("--out", help="Файл результатов (по умолчанию bench/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    path = save_results("priority", results, args.out)
+    for priority, stats in results["queue_time"].items():
+        print(
+            f"{priority}: {stats['count']} sent, queue time p50 {stats['p50_ms']:.1f} ms, "
+            f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms"
+        )
+    print(f"-> {path}")
+
+
+if __name__ == "__main__":
+    main()
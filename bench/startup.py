@@ -0,0 +1,101 @@
+"""
+Холодный старт API: от запуска интерпретатора до первого обслуженного запроса.
+Каждый замер — новый процесс: импорт app.main, lifespan, первый и второй запросы через ASGI.
+Сравниваются прогрев в lifespan и прежний старт (только PING, остальное — на первом запросе).
+
+    python -m bench.startup --runs 5 --redis real
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+REQUESTS = [
+    ("POST", "/api/notifications/", {"user_id": 1, "message": "Cold start", "notification_type": "email"}),
+    ("GET", "/api/notifications/", {"user_id": 1}),
+]
+
+
+async def child(args) -> dict:
+    """Один холодный старт в этом процессе; время — от запуска интерпретатора (args.spawned)"""
+    # Клиент и fakeredis — обвязка замера, их импорт в import_ms не входит
+    import fakeredis
+    from httpx import AsyncClient, ASGITransport
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+    from app.services.health import health
+    from app.services.redis import redis_service
+    from bench.common import use_redis
+
+    use_redis(args.redis)
+    if args.variant == "baseline":
+        async def connect_only(app=None):
+            await redis_service.connect()
+        health.warm_up = connect_only
+
+    result = {"import_ms": (imported - started) * 1000}
+    lifespan_started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        result["lifespan_ms"] = (time.perf_counter() - lifespan_started) * 1000
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            for attempt in ("first", "second"):
+                for method, path, params in REQUESTS:
+                    request_started = time.perf_counter()
+                    response = await client.request(method, path, params=params)
+                    response.raise_for_status()
+                    result[f"{attempt}_{method.lower()}_ms"] = (time.perf_counter() - request_started) * 1000
+                if attempt == "first":
+                    result["cold_start_ms"] = (time.time() - args.spawned) * 1000
+    return result
+
+
+def run(args) -> dict:
+    from bench.common import summarize
+    results: Dict[str, Dict[str, dict]] = {}
+    for variant in ("baseline", "warm_up"):
+        samples: Dict[str, List[float]] = {}
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, "-m", "bench.startup", "--child", "--variant", variant,
+                 "--redis", args.redis, "--spawned", repr(time.time())],
+                capture_output=True, text=True, check=True
+            ).stdout
+            for name, value in json.loads(output.strip().splitlines()[-1]).items():
+                samples.setdefault(name, []).append(value / 1000)
+        results[variant] = {name: summarize(values) for name, values in samples.items()}
+    return {"params": vars(args), "variants": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Холодный старт API до первого обслуженного запроса")
+    parser.add_argument("--runs", type=int, default=5, help="Процессов на вариант")
+    parser.add_argument("--redis", choices=["fake", "real"], default="fake")
+    parser.add_argument("--out", help="Файл результатов (по умолчанию bench/results/)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--variant", default="warm_up", help=argparse.SUPPRESS)
+    parser.add_argument("--spawned", type=float, default=0.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args))))
+        return
+
+    from bench.common import save_results
+    results = run(args)
+    path = save_results("startup", results, args.out)
+    for variant, stats in results["variants"].items():
+        print(
+            f"{variant}: cold start p50 {stats['cold_start_ms']['p50_ms']:.0f} ms "
+            f"(import {stats['import_ms']['p50_ms']:.0f} ms, lifespan {stats['lifespan_ms']['p50_ms']:.1f} ms), "
+            f"first POST {stats['first_post_ms']['p50_ms']:.1f} ms / second {stats['second_post_ms']['p50_ms']:.1f} ms, "
+            f"first GET {stats['first_get_ms']['p50_ms']:.1f} ms / second {stats['second_get_ms']['p50_ms']:.1f} ms"
+        )
+    print(f"-> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Пропускная способность транспортов каналов на локальных стендах:
+SMTP — aiosmtpd в отдельном потоке, Telegram Bot API — ASGI-приложение под uvicorn.
+Сравниваются пул соединений и новое соединение на каждое сообщение.
+
+    python -m bench.transports --messages 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import time
+import uvicorn
+from aiosmtpd.controller import Controller
+from app.models.notification import NotificationRecord, NotificationStatus, NotificationType
+from app.services.transports import SmtpTransport, TelegramTransport
+from bench.common import save_results
+
+
+class SmtpStandIn:
+    """Принимает письма и считает SMTP-сессии"""
+
+    def __init__(self):
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+class BotApiStandIn:
+    """sendMessage с ответом ok; соединения считаются по адресу клиента"""
+
+    def __init__(self):
+        self.connections = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.connections.add(tuple(scope["client"]))
+        while (await receive()).get("more_body"):
+            pass
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps({"ok": True}).encode()})
+
+
+def record(user_id: int, notification_type: NotificationType) -> NotificationRecord:
+    return NotificationRecord.model_construct(
+        user_id=user_id, message="Benchmark", type=notification_type, status=NotificationStatus.PENDING
+    )
+
+
+async def measure(send, messages: int, concurrency: int) -> dict:
+    """send(user_id) — одна отправка; concurrency одновременных отправителей"""
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for user_id in range(1, messages + 1):
+        queue.put_nowait(user_id)
+
+    async def worker():
+        while not queue.empty():
+            await send(queue.get_nowait())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"messages": messages, "elapsed_s": elapsed, "messages_per_s": messages / elapsed}
+
+
+async def bench_smtp(args) -> dict:
+    handler = SmtpStandIn()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.smtp_port)
+    controller.start()
+    try:
+        results = {}
+        # max_messages=1 — новая сессия (соединение, EHLO) на каждое письмо
+        for name, max_messages in (("pooled", 10 ** 9), ("per_message", 1)):
+            handler.sessions.clear()
+            transport = SmtpTransport(
+                "127.0.0.1", args.smtp_port, "bench@example.com",
+                pool_size=args.concurrency, max_messages=max_messages
+            )
+            try:
+                result = await measure(
+                    lambda user_id: transport.send(record(user_id, NotificationType.EMAIL)),
+                    args.messages, args.concurrency
+                )
+            finally:
+                await transport.close()
+            result["connections"] = len(handler.sessions)
+            result["messages_per_connection"] = args.messages / max(1, len(handler.sessions))
+            results[name] = result
+        return results
+    finally:
+        controller.stop()
+
+
+async def bench_telegram(args) -> dict:
+    api = BotApiStandIn()
+    server = uvicorn.Server(uvicorn.Config(api, host="127.0.0.1", port=args.http_port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        url = f"http://127.0.0.1:{args.http_port}"
+        shared = TelegramTransport(url, "bench", pool_size=args.concurrency)
+
+        async def send_pooled(user_id: int) -> None:
+            await shared.send(record(user_id, NotificationType.TELEGRAM))
+
+        async def send_per_message(user_id: int) -> None:
+            transport = TelegramTransport(url, "bench", pool_size=1)
+            try:
+                await transport.send(record(user_id, NotificationType.TELEGRAM))
+            finally:
+                await transport.close()
+
+        results = {}
+        for name, send in (("pooled", send_pooled), ("per_message", send_per_message)):
+            api.connections.clear()
+            result = await measure(send, args.messages, args.concurrency)
+            result["connections"] = len(api.connections)
+            result["messages_per_connection"] = args.messages / max(1, len(api.connections))
+            results[name] = result
+        await shared.close()
+        return results
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def run(args) -> dict:
+    return {
+        "params": vars(args),
+        "smtp": await bench_smtp(args),
+        # Без TLS HTTP/2 не согласуется: стенд меряет keep-alive HTTP/1.1
+        "telegram": await bench_telegram(args),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Транспорты каналов: пул соединений против соединения на сообщение")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--http-port", type=int, default=8766)
+    parser.add_argument("--out", help="Файл результатов (по умолчанию bench/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    path = save_results("transports", results, args.out)
+    for channel in ("smtp", "telegram"):
+        for name, result in results[channel].items():
+            print(
+                f"{channel} {name}: {result['messages_per_s']:.0f} msg/s, "
+                f"{result['connections']} connections, "
+                f"{result['messages_per_connection']:.1f} msg/connection"
+            )
+    print(f"-> {path}")
+
+
+if __name__ == "__main__":
+    main()
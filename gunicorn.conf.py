@@ -0,0 +1,15 @@
+"""
+Настройки gunicorn для нескольких процессов API:
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/metrics gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker -w 4 app.main:app
+
+Воркер, завершившийся штатно, сам убирает свои значения метрик в lifespan; child_exit
+делает то же за упавший или убитый по таймауту.
+"""
+import os
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,109 @@
+import fakeredis
+import pytest
+from unittest.mock import patch
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from redis.asyncio import cluster
+from redis.crc import key_slot
+from redis.exceptions import ResponseError
+from app.config import settings
+from app.services.dispatcher import dispatcher
+from app.services.redis import RedisService, redis_service
+
+
+def check_slots(keys) -> None:
+    if len({key_slot(str(key).encode()) for key in keys}) > 1:
+        raise ResponseError("CROSSSLOT Keys in request don't hash to the same slot")
+
+
+class ClusterStandIn(fakeredis.FakeAsyncRedis):
+    """
+    Стенд Redis Cluster на fakeredis: как и кластер, отклоняет скрипты и транзакции
+    с ключами из разных слотов. Остальные команды выполняются как на одном узле.
+    """
+
+    async def execute_command(self, *args, **options):
+        if str(args[0]).upper() in ("EVAL", "EVALSHA"):
+            check_slots(args[3:3 + int(args[2])])
+        return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        if transaction:
+            execute = pipe.execute
+
+            async def checked_execute(raise_on_error: bool = True):
+                check_slots([command[1] for command, _ in pipe.command_stack if len(command) > 1])
+                return await execute(raise_on_error)
+
+            pipe.execute = checked_execute
+        return pipe
+
+
+class SingleNodeConnection(FakeAsyncRedisConnection):
+    """
+    Соединение узла кластера поверх fakeredis: на CLUSTER SLOTS отвечает,
+    что все слоты на этом узле, остальные команды выполняет fakeredis
+    """
+
+    _slots = None
+
+    def pack_command(self, *args):
+        if " ".join(map(str, args)).upper() == "CLUSTER SLOTS":
+            self._slots = [[0, 16383, [self.host, self.port, "fake"]]]
+            args = ("PING",)
+        return super().pack_command(*args)
+
+    async def read_response(self, **kwargs):
+        response = await super().read_response(**kwargs)
+        # Ответы команд подключения (CLIENT SETINFO) приходят раньше PONG
+        if self._slots is not None and response in ("PONG", b"PONG"):
+            response, self._slots = self._slots, None
+        return response
+
+
+@pytest.fixture
+def fake_redis():
+    """Подменяет соединение redis_service на fakeredis"""
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    with patch.object(redis_service, "_connection", fake):
+        yield fake
+
+
+@pytest.fixture
+def cluster_redis():
+    """Режим кластера поверх ClusterStandIn"""
+    fake = ClusterStandIn(decode_responses=True)
+    with patch.object(settings, "redis_cluster", True), patch.object(redis_service, "_connection", fake):
+        yield fake
+
+
+@pytest.fixture
+async def cluster_client():
+    """Настоящий клиент RedisService(cluster=True) с узлом кластера на fakeredis"""
+    server = fakeredis.FakeServer()
+
+    class FakeNode(cluster.ClusterNode):
+        def __init__(self, host, port, server_type=None, **kwargs):
+            kwargs.update(connection_class=SingleNodeConnection, server=server)
+            super().__init__(host, port, server_type, **kwargs)
+
+    service = RedisService(host="127.0.0.1", port=7000, cluster=True)
+    with patch.object(cluster, "ClusterNode", FakeNode), \
+            patch.object(settings, "redis_cluster", True), \
+            patch.object(redis_service, "_connection", service.connection):
+        yield service.connection
+        await service.close()
+
+
+@pytest.fixture(autouse=True)
+def mock_async_sleep():
+    """Мокает asyncio.sleep для ускорения тестов"""
+    with patch("asyncio.sleep", return_value=None):
+        yield
+
+
+@pytest.fixture(autouse=True)
+async def close_dispatcher():
+    """Останавливает воркеры диспетчера, запущенные в цикле теста"""
+    yield
+    await dispatcher.close()
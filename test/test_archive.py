@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import patch
+from app.config import settings
+from app.models.notification import NotificationStatus, NotificationType
+from app.services.archive import archive_store
+from app.services.compactor import compactor
+from app.services.keys import notification_key
+from app.services.notifications import NotificationService
+
+
+@pytest.fixture
+def archive_dir(tmp_path):
+    with patch.object(archive_store, "directory", str(tmp_path)), \
+            patch.object(settings, "retention_days", -1):
+        yield tmp_path
+
+
+async def create(user_id: int, message: str, delivered: bool):
+    record = await NotificationService.create_notification(user_id, message, NotificationType.EMAIL)
+    if delivered:
+        await NotificationService.deliver(record)
+    return record
+
+
+@pytest.mark.asyncio
+async def test_compaction_moves_delivered_notifications(fake_redis, archive_dir):
+    """
+    В архив уходят только доставленные уведомления, история листается дальше в архив
+    """
+    first = await create(91, "First", delivered=True)
+    second = await create(91, "Second", delivered=True)
+    pending = await create(91, "Pending", delivered=False)
+    await create(92, "Other", delivered=True)
+
+    assert await compactor.compact_once() == 3
+    assert await compactor.compact_once() == 0
+    assert not await fake_redis.exists(notification_key(first.id))
+    assert await fake_redis.exists(notification_key(pending.id))
+    assert sorted(p.suffix for p in archive_dir.iterdir()) == [".idx", ".seg"]
+
+    pages = []
+    cursor = None
+    while True:
+        notifications, cursor = await NotificationService.get_user_notifications(
+            91, cursor=cursor, limit=1, archive=True
+        )
+        pages.append([n.message for n in notifications])
+        if cursor is None:
+            break
+    # Граница Redis и архива проходится внутри страницы; полная страница всегда даёт курсор
+    assert pages == [["Pending"], ["Second"], ["First"], []]
+
+    archived, _ = await NotificationService.get_user_notifications(
+        91, status=NotificationStatus.SENT, cursor="archive:"
+    )
+    assert [n.id for n in archived] == [second.id, first.id]
+
+
+@pytest.mark.asyncio
+async def test_compaction_skips_when_locked(fake_redis, archive_dir):
+    """
+    Пока блокировку держит другой компактор, проход не выполняется
+    """
+    await create(93, "Sent", delivered=True)
+    await fake_redis.set(settings.archive_lock_key, "other")
+
+    assert await compactor.compact_once() == 0
+    assert await fake_redis.get(settings.archive_lock_key) == "other"
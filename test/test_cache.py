@@ -0,0 +1,122 @@
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from app.config import settings
+from app.models.notification import NotificationType
+from app.services.cache import HistoryCache, history_cache
+from app.services.events import event_bus
+from app.services.notifications import NotificationService
+
+
+@pytest.fixture
+def cache_enabled():
+    with patch.object(settings, "cache_enabled", True), \
+            patch.object(event_bus, "connected", True):
+        yield
+
+
+def test_lru_eviction_and_counters(cache_enabled):
+    """
+    При переполнении вытесняется давно не использованная запись
+    """
+    cache = HistoryCache(max_entries=2, ttl=60)
+    for user_id in (1, 2):
+        cache.put(user_id, "q", [user_id], cache.generation())
+    assert cache.get(1, "q") == [1]
+
+    cache.put(3, "q", [3], cache.generation())
+
+    assert cache.get(2, "q") is None
+    assert cache.get(1, "q") == [1]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(cache_enabled):
+    """
+    Запись старше TTL не отдаётся
+    """
+    cache = HistoryCache(max_entries=10, ttl=-1)
+    cache.put(1, "q", [1], cache.generation())
+    assert cache.get(1, "q") is None
+
+
+def test_result_read_before_invalidation_is_not_cached(cache_enabled):
+    """
+    Результат чтения, начатого до инвалидации, в кэш не попадает
+    """
+    cache = HistoryCache(max_entries=10, ttl=60)
+    generation = cache.generation()
+    cache.invalidate(1)
+    cache.put(1, "q", ["stale"], generation)
+    assert cache.get(1, "q") is None
+
+    cache.put(1, "q", ["fresh"], cache.generation())
+    assert cache.get(1, "q") == ["fresh"]
+
+
+def test_inactive_without_subscription():
+    """
+    Пока нет подписки на события, кэш не используется
+    """
+    cache = HistoryCache(max_entries=10, ttl=60)
+    with patch.object(settings, "cache_enabled", True):
+        cache.put(1, "q", [1], cache.generation())
+        assert cache.get(1, "q") is None
+
+
+async def wait_until(condition, timeout: float = 1.0):
+    """Ждёт условия, не используя замоканный asyncio.sleep"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition was not met in time"
+        tick = loop.create_future()
+        loop.call_later(0.005, tick.set_result, None)
+        await tick
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_through_pubsub(fake_redis):
+    """
+    Запись и перенос отложенного публикуют событие, и подписчик каждого процесса сбрасывает кэш пользователя
+    """
+    with patch.object(settings, "cache_enabled", True):
+        subscriber = asyncio.create_task(event_bus.run())
+        try:
+            await wait_until(lambda: event_bus.connected)
+            history_cache.clear()
+
+            await NotificationService.create_notification(71, "First", NotificationType.EMAIL)
+            first, _ = await NotificationService.get_user_notifications(71)
+            cached, _ = await NotificationService.get_user_notifications(71)
+            assert cached is first
+
+            # Запись «другого процесса»: локальную инвалидацию отключаем, остаётся только pub/sub
+            received = asyncio.Event()
+            event_bus.subscribe(lambda event: received.set())
+            with patch.object(history_cache, "invalidate", lambda user_id: None):
+                await NotificationService.create_notification(71, "Second", NotificationType.EMAIL)
+            await asyncio.wait_for(received.wait(), 1)
+
+            fresh, _ = await NotificationService.get_user_notifications(71)
+            assert [n.message for n in fresh] == ["Second", "First"]
+
+            received.clear()
+            later = await NotificationService.create_notification(
+                71, "Later", NotificationType.EMAIL, send_at=datetime(2099, 1, 1)
+            )
+            await asyncio.wait_for(received.wait(), 1)
+            await NotificationService.get_user_notifications(71)
+            received.clear()
+            with patch.object(history_cache, "invalidate", lambda user_id: None):
+                await NotificationService.reschedule(later.id, datetime(2099, 1, 2))
+            await asyncio.wait_for(received.wait(), 1)
+
+            fresh, _ = await NotificationService.get_user_notifications(71)
+            assert fresh[0].send_at == datetime(2099, 1, 2)
+        finally:
+            subscriber.cancel()
+            event_bus._handlers.pop()
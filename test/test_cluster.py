@@ -0,0 +1,155 @@
+from datetime import datetime
+import pytest
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from prometheus_client import REGISTRY
+from redis.crc import key_slot
+from redis.exceptions import ResponseError
+from app.config import settings
+from app.main import app
+from app.migrate_keys import backfill, migrate
+from app.models.notification import NotificationStatus, NotificationType
+from app.services.digest_poller import digest_poller
+from app.services.dispatcher import dispatcher
+from app.services.keys import rate_limit_key
+from app.services.notifications import NotificationService
+from app.services.redis import InstrumentedCluster
+
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_stand_in_rejects_keys_without_tags(cluster_redis):
+    """
+    Без хеш-тегов скрипт перехода трогает ключи разных слотов, и стенд его отклоняет
+    """
+    with patch.object(settings, "redis_cluster", False):
+        record = await NotificationService.create_notification(1, "Hello", NotificationType.EMAIL)
+        with pytest.raises(ResponseError, match="CROSSSLOT"):
+            await NotificationService.record_failure(record, RuntimeError("boom"))
+
+
+def test_recipient_buckets_spread_over_slots():
+    """
+    Bucket получателей канала лежат в слотах пользователей, а не все в одном слоте канала
+    """
+    with patch.object(settings, "redis_cluster", True):
+        assert rate_limit_key("telegram") == "ratelimit:telegram"
+        assert rate_limit_key("telegram", 42) == "ratelimit:telegram:{42}"
+        slots = {key_slot(rate_limit_key("telegram", user_id).encode()) for user_id in range(1, 101)}
+    assert len(slots) > 50
+
+
+@pytest.mark.asyncio
+async def test_flows_keep_scripts_within_one_slot(async_client, cluster_redis):
+    """
+    Отправка, повтор, dead letter, идемпотентность, пачки и сводки работают в режиме кластера
+    """
+    with patch.object(NotificationService, "_send", AsyncMock()), \
+            patch.object(settings, "digest_channels", ["telegram"]), \
+            patch.object(settings, "digest_window", 0):
+        params = {"user_id": 7, "message": "Paid", "notification_type": "email"}
+        first = await async_client.post("/api/notifications/", params=params, headers={"Idempotency-Key": "k"})
+        replay = await async_client.post("/api/notifications/", params=params, headers={"Idempotency-Key": "k"})
+        batch = await async_client.post("/api/notifications/batch", json=[
+            {"user_id": 7, "message": "One", "type": "telegram"},
+            {"user_id": 7, "message": "Two", "type": "telegram"},
+        ])
+        await dispatcher.join()
+        assert await digest_poller.poll_once() == 1
+        await dispatcher.join()
+
+    failed = await NotificationService.create_notification(7, "Lost", NotificationType.EMAIL)
+    with patch.object(settings, "retry_max_attempts", 1):
+        await NotificationService.record_failure(failed, RuntimeError("boom"))
+
+    assert replay.json()["id"] == first.json()["id"]
+    assert len(batch.json()["accepted"]) == 2
+    notifications, _ = await NotificationService.get_user_notifications(7)
+    assert [n.status for n in notifications] == [
+        NotificationStatus.FAILED, NotificationStatus.SENT, NotificationStatus.SENT, NotificationStatus.SENT
+    ]
+    assert await cluster_redis.zcard(settings.dead_letter_key) == 1
+    assert await cluster_redis.exists("user_notifications:{7}", "notification_stats:{7}") == 2
+
+    stats = (await async_client.get("/api/notifications/stats", params={"user_id": 7})).json()
+    assert stats["global"]["by_status"] == {"pending": 0, "sent": 3, "failed": 1, "cancelled": 0}
+    assert stats["users"]["7"]["by_status"] == stats["global"]["by_status"]
+
+
+@pytest.mark.asyncio
+async def test_cluster_client_runs_flows_with_metrics(cluster_client):
+    """
+    Клиент кластера из RedisService — InstrumentedCluster: создание, доставка и переходы
+    проходят через его pipeline и скрипты, команды и pipeline попадают в метрики
+    """
+    def commands(command: str) -> float:
+        return REGISTRY.get_sample_value("redis_command_duration_seconds_count", {"command": command}) or 0.0
+
+    pipelines_before, scripts_before = commands("PIPELINE"), commands("EVALSHA")
+
+    assert isinstance(cluster_client, InstrumentedCluster)
+    sent = await NotificationService.create_notification(8, "Hello", NotificationType.EMAIL)
+    with patch.object(NotificationService, "_send", AsyncMock()):
+        await NotificationService.deliver(sent)
+    failed = await NotificationService.create_notification(8, "Lost", NotificationType.EMAIL)
+    with patch.object(settings, "retry_max_attempts", 1):
+        await NotificationService.record_failure(failed, RuntimeError("boom"))
+
+    notifications, _ = await NotificationService.get_user_notifications(8)
+    assert [n.status for n in notifications] == [NotificationStatus.FAILED, NotificationStatus.SENT]
+    assert await cluster_client.zcard(settings.dead_letter_key) == 1
+    assert commands("PIPELINE") > pipelines_before
+    assert commands("EVALSHA") > scripts_before
+
+
+@pytest.mark.asyncio
+async def test_migrate_keys_adds_hash_tags(fake_redis):
+    """
+    Миграция переименовывает ключи пользователя, после неё данные читаются с тегами
+    """
+    record = await NotificationService.create_notification(5, "Hello", NotificationType.EMAIL)
+    with patch.object(NotificationService, "_send", AsyncMock()):
+        await NotificationService.deliver(record)
+
+    # migrate включает теги; patch вернёт прежнее значение после теста
+    with patch.object(settings, "redis_hash_tags", False):
+        assert await migrate(batch_size=1) == 3
+        assert await migrate() == 0
+
+        assert sorted(await fake_redis.keys("*")) == sorted([
+            f"notification:{{5}}:{record.id.split(':')[1]}",
+            "notification_stats", "notification_stats:{5}", "user_notifications:{5}",
+            "status_index:email:sent",
+        ])
+        notifications, _ = await NotificationService.get_user_notifications(5)
+        assert notifications[0].status == NotificationStatus.SENT
+
+
+@pytest.mark.asyncio
+async def test_backfill_indexes_baseline_hashes(fake_redis):
+    """
+    Хеши, записанные до появления индексов (ключ `notification:{user_id}:{timestamp}`),
+    после backfill видны в истории и в поиске по статусу; повторный запуск ничего не меняет
+    """
+    created = datetime(2024, 1, 2, 3, 4, 5)
+    for i, status in enumerate(("sent", "failed")):
+        at = created.replace(second=i)
+        await fake_redis.hset(f"notification:6:{at.timestamp()}", mapping={
+            "user_id": "6", "message": f"Old {i}", "type": "email",
+            "status": status, "created_at": at.isoformat()
+        })
+    assert await NotificationService.get_user_notifications(6) == ([], None)
+
+    assert await backfill(batch_size=1) == 2
+    assert await backfill() == 0
+
+    notifications, _ = await NotificationService.get_user_notifications(6)
+    assert [n.message for n in notifications] == ["Old 1", "Old 0"]
+    failed, _ = await NotificationService.get_user_notifications(6, status=NotificationStatus.FAILED)
+    assert [n.message for n in failed] == ["Old 1"]
+    assert await fake_redis.zrange("status_index:email:sent", 0, -1) == [notifications[1].id]
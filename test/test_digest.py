@@ -0,0 +1,88 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.models.notification import NotificationStatus
+from app.services.digest_poller import digest_poller
+from app.services.dispatcher import dispatcher
+from app.services.notifications import NotificationService
+
+
+@pytest.fixture
+def telegram_digests():
+    with patch.object(settings, "digest_channels", ["telegram"]), \
+            patch.object(NotificationService, "_send", AsyncMock()) as send:
+        yield send
+
+
+async def send_all(messages, notification_type="telegram", user_id=101):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        return [
+            (await client.post("/api/notifications/", params={
+                "user_id": user_id, "message": message, "notification_type": notification_type
+            })).json()["id"]
+            for message in messages
+        ]
+
+
+@pytest.mark.asyncio
+async def test_window_is_flushed_as_one_send(fake_redis, telegram_digests):
+    """
+    Уведомления окна уходят одним сообщением, и каждая запись истории становится sent
+    """
+    with patch.object(settings, "digest_window", 0):
+        ids = await send_all(["Paid", "Packed", "Shipped"])
+        await send_all(["Receipt"], notification_type="email")
+        await dispatcher.join()
+        assert telegram_digests.await_count == 1
+
+        assert await digest_poller.poll_once() == 1
+        await dispatcher.join()
+
+    assert telegram_digests.await_count == 2
+    digest = telegram_digests.await_args_list[-1].args[0]
+    assert digest.message == "• Paid\n• Packed\n• Shipped"
+
+    records = await NotificationService.get_notifications_by_ids(ids)
+    assert {record.status for record in records} == {NotificationStatus.SENT}
+    assert len({record.sent_at for record in records}) == 1
+    notifications, _ = await NotificationService.get_user_notifications(101)
+    assert len(notifications) == 4
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_is_flushed_before_window_ends(fake_redis, telegram_digests):
+    """
+    При digest_max_items сводка уходит сразу, не дожидаясь конца окна
+    """
+    with patch.object(settings, "digest_window", 3600), patch.object(settings, "digest_max_items", 2):
+        await send_all(["One"], user_id=102)
+        assert await digest_poller.poll_once() == 0
+
+        await send_all(["Two"], user_id=102)
+        assert await digest_poller.poll_once() == 1
+        await dispatcher.join()
+
+    assert telegram_digests.await_count == 1
+    assert telegram_digests.await_args.args[0].message == "• One\n• Two"
+
+
+@pytest.mark.asyncio
+async def test_critical_skips_digest(fake_redis, telegram_digests):
+    """
+    Критичные уведомления канала со сводками уходят сразу, не дожидаясь окна, — и по одному, и в пачке
+    """
+    with patch.object(settings, "digest_window", 3600):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            await client.post("/api/notifications/", params={
+                "user_id": 5, "message": "Ваш код: 1111", "notification_type": "telegram", "priority": "critical"
+            })
+            await client.post("/api/notifications/batch", json=[
+                {"user_id": 5, "message": "Ваш код: 2222", "type": "telegram", "priority": "critical"},
+                {"user_id": 5, "message": "Скидки", "type": "telegram", "priority": "bulk"},
+            ])
+        await dispatcher.join()
+
+    assert [call.args[0].message for call in telegram_digests.await_args_list] == ["Ваш код: 1111", "Ваш код: 2222"]
+    assert len(await fake_redis.lrange("digest:telegram:5", 0, -1)) == 1
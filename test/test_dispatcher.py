@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+from prometheus_client import REGISTRY
+from app.models.notification import (
+    NotificationPriority, NotificationRecord, NotificationStatus, NotificationType
+)
+from app.services.dispatcher import ChannelDispatcher, PriorityLanes
+from app.services.ratelimit import rate_limiter
+
+
+def make_record(
+    user_id: int,
+    priority: NotificationPriority = NotificationPriority.NORMAL,
+    message: str = "Hello"
+) -> NotificationRecord:
+    return NotificationRecord(
+        user_id=user_id,
+        message=message,
+        type=NotificationType.TELEGRAM,
+        status=NotificationStatus.PENDING,
+        priority=priority
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped(fake_redis):
+    """
+    Одновременно выполняется не больше concurrency доставок, остальные ждут в очереди;
+    размер очереди выставляется в метрику значением, а не функцией (её не видно в multiprocess)
+    """
+    in_flight = 0
+    peak = 0
+    release = asyncio.Event()
+    saturated = asyncio.Event()
+
+    async def deliver(record):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        if in_flight == 2:
+            saturated.set()
+        await release.wait()
+        in_flight -= 1
+        return record
+
+    channel = ChannelDispatcher(
+        NotificationType.TELEGRAM, deliver, concurrency=2,
+        rate=0, burst=0, recipient_rate=0, recipient_burst=0
+    )
+    futures = [channel.submit(make_record(i + 1)) for i in range(10)]
+    await saturated.wait()
+
+    def depth() -> float:
+        return REGISTRY.get_sample_value("notification_dispatch_queue_depth", {"channel": "telegram"})
+
+    assert peak == 2
+    assert channel.queued == 8
+    assert depth() == 8
+
+    release.set()
+    await asyncio.gather(*futures)
+    assert peak == 2
+    assert depth() == 0
+    await channel.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_propagates_to_future(fake_redis):
+    """
+    Ошибка доставки возвращается через future, воркер продолжает работу
+    """
+    async def deliver(record):
+        if record.user_id == 1:
+            raise RuntimeError("provider down")
+        return record
+
+    channel = ChannelDispatcher(
+        NotificationType.EMAIL, deliver, concurrency=1,
+        rate=0, burst=0, recipient_rate=0, recipient_burst=0
+    )
+
+    with pytest.raises(RuntimeError):
+        await channel.submit(make_record(1))
+    assert (await channel.submit(make_record(2))).user_id == 2
+    await channel.close()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_and_is_shared(fake_redis):
+    """
+    Bucket живёт в Redis: после исчерпания burst возвращается пауза, пока токены не накопятся
+    """
+    buckets = [("ratelimit:test", 1, 2), ("ratelimit:test:1", 100, 100)]
+
+    assert await rate_limiter.acquire(buckets) == 0
+    assert await rate_limiter.acquire(buckets) == 0
+    wait_ms = await rate_limiter.acquire(buckets)
+
+    assert 0 < wait_ms <= 1000
+    # Отказ не списывает токены из остальных bucket
+    assert float(await fake_redis.hget("ratelimit:test:1", "tokens")) >= 97
+
+
+def test_lanes_share_by_weight_and_critical_goes_first():
+    """
+    Под нагрузкой полосы получают доли по весам, а пришедший critical выдаётся следующим
+    """
+    lanes = PriorityLanes({"critical": 100, "normal": 10, "bulk": 1})
+    for i in range(500):
+        lanes.put_nowait(NotificationPriority.BULK, i)
+        lanes.put_nowait(NotificationPriority.NORMAL, i)
+
+    picked = [lanes.pop()[0] for _ in range(110)]
+    assert picked.count(NotificationPriority.NORMAL) == 100
+    assert picked.count(NotificationPriority.BULK) == 10
+
+    lanes.put_nowait(NotificationPriority.CRITICAL, "otp")
+    assert lanes.pop()[::2] == (NotificationPriority.CRITICAL, "otp")
+
+
+@pytest.mark.asyncio
+async def test_critical_is_not_queued_behind_bulk(fake_redis):
+    """
+    Критичное уведомление обгоняет уже стоящую в очереди рассылку
+    """
+    delivered = []
+    release = asyncio.Event()
+
+    async def deliver(record):
+        await release.wait()
+        delivered.append(record.message)
+        return record
+
+    channel = ChannelDispatcher(
+        NotificationType.TELEGRAM, deliver, concurrency=1,
+        rate=0, burst=0, recipient_rate=0, recipient_burst=0
+    )
+    futures = [channel.submit(make_record(i + 1, NotificationPriority.BULK)) for i in range(20)]
+    futures.append(channel.submit(make_record(99, NotificationPriority.CRITICAL, "Ваш код: 1111")))
+    release.set()
+    await asyncio.gather(*futures)
+
+    assert delivered.index("Ваш код: 1111") <= 1
+    await channel.close()
+
+
+@pytest.mark.asyncio
+async def test_hot_recipient_does_not_block_others(fake_redis):
+    """
+    Задачи получателя, исчерпавшего свой лимит, откладываются, и воркеры доставляют
+    остальным получателям, а не ждут его токена; отложенные доставляются позже все
+    """
+    delivered = []
+
+    async def deliver(record):
+        delivered.append(record.user_id)
+        return record
+
+    channel = ChannelDispatcher(
+        NotificationType.TELEGRAM, deliver, concurrency=2,
+        rate=0, burst=0, recipient_rate=100, recipient_burst=1
+    )
+    futures = [channel.submit(make_record(1)) for _ in range(5)]
+    futures += [channel.submit(make_record(user_id)) for user_id in (2, 3, 4)]
+    await asyncio.gather(*futures)
+
+    assert delivered[0] == 1
+    assert sorted(delivered[1:4]) == [2, 3, 4]
+    assert delivered[4:] == [1] * 4
+    assert channel.queued == 0
+    await channel.close()
@@ -0,0 +1,65 @@
+import hashlib
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.services import scripts
+from app.services.health import health
+
+
+@pytest.fixture
+def cold_process():
+    """Процесс до прогрева: состояние health общее для всех тестов"""
+    with patch.object(health, "warmed_up", False), patch.object(health, "startup_ms", {}):
+        yield
+
+
+def client() -> AsyncClient:
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_readyz_after_warm_up(fake_redis, cold_process):
+    """
+    До прогрева /readyz отвечает 503, /livez — всегда 200; прогрев загружает все скрипты
+    """
+    async with client() as http:
+        assert (await http.get("/readyz")).status_code == 503
+        assert (await http.get("/livez")).json() == {"status": "ok"}
+
+        await health.warm_up()
+        response = await http.get("/readyz")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready"
+    assert data["redis_latency_ms"] >= 0
+    assert set(data["startup_ms"]) == {"redis_pool", "scripts", "codecs"}
+    shas = [hashlib.sha1(source.encode()).hexdigest() for source in scripts.ALL_SCRIPTS]
+    assert await fake_redis.script_exists(*shas) == [True] * len(shas)
+
+
+@pytest.mark.asyncio
+async def test_readyz_reports_queue_lag_and_redis_outage(fake_redis, cold_process):
+    """
+    /readyz показывает глубину и возраст очереди доставки; без ответа Redis — 503
+    """
+    await health.warm_up()
+    oldest_ms = int((time.time() - 60) * 1000)
+    await fake_redis.xadd(settings.queue_stream, {"id": "1:a"}, id=f"{oldest_ms}-0")
+    await fake_redis.xadd(f"{settings.queue_stream}:critical", {"id": "1:b"})
+    await fake_redis.zadd(settings.retry_key, {"1:c": time.time() - 30})
+
+    async with client() as http:
+        data = (await http.get("/readyz")).json()
+        assert data["queue_depth"] == 2
+        assert 60 <= data["queue_lag_s"] < 70
+        assert 30 <= data["retry_lag_s"] < 40
+        assert data["schedule_lag_s"] == 0
+
+        with patch.object(fake_redis, "ping", AsyncMock(side_effect=ConnectionError("down"))):
+            response = await http.get("/readyz")
+            assert response.status_code == 503
+            assert (await http.get("/livez")).status_code == 200
@@ -0,0 +1,81 @@
+import importlib.util
+import fakeredis
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from httpx import AsyncClient, ASGITransport
+from prometheus_client import REGISTRY
+from redis.exceptions import ResponseError
+from app.main import app
+from app.services.notifications import NotificationService
+from app.services.metrics import mark_process_dead
+from app.services.redis import InstrumentedRedis
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_routes_and_sends_are_measured(fake_redis):
+    """
+    Задержка пишется по шаблону маршрута, отправки — по каналу и результату
+    """
+    route = {"method": "GET", "route": "/api/notifications/{notification_id}", "status": "404"}
+    requests_before = sample("http_request_duration_seconds_count", **route)
+    sends_before = sample("notification_sends_total", channel="email", result="success")
+
+    record = await NotificationService.create_notification(7, "Hello", "email")
+    await NotificationService.deliver(record)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/api/notifications/7:01J0000000000000000000000")
+        await client.get("/api/notifications/7:01J0000000000000000000001")
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert sample("http_request_duration_seconds_count", **route) == requests_before + 2
+    assert sample("notification_sends_total", channel="email", result="success") == sends_before + 1
+    assert 'notification_redis_queue_depth{queue="retry"} 0.0' in response.text
+    assert "/api/notifications/7:" not in response.text
+
+
+@pytest.mark.asyncio
+async def test_redis_commands_are_measured():
+    """
+    Команды и pipeline замеряются по имени команды, ошибки считаются отдельно
+    """
+    client = InstrumentedRedis(connection_pool=fakeredis.FakeAsyncRedis(decode_responses=True).connection_pool)
+    hset_before = sample("redis_command_duration_seconds_count", command="HSET")
+    pipeline_before = sample("redis_command_duration_seconds_count", command="PIPELINE")
+    errors_before = sample("redis_command_errors_total", command="INCRBY", error="ResponseError")
+
+    await client.hset("h", "field", "value")
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.hget("h", "field")
+        pipe.hgetall("h")
+        await pipe.execute()
+    with pytest.raises(ResponseError):
+        await client.incr("h")
+
+    assert sample("redis_command_duration_seconds_count", command="HSET") == hset_before + 1
+    assert sample("redis_command_duration_seconds_count", command="PIPELINE") == pipeline_before + 1
+    assert sample("redis_command_errors_total", command="INCRBY", error="ResponseError") == errors_before + 1
+
+
+def test_dead_process_gauges_are_removed(tmp_path, monkeypatch):
+    """
+    Значения livesum завершившегося процесса убираются из общего каталога: при штатной
+    остановке — самим процессом, при падении — хуком gunicorn child_exit; счётчики остаются
+    """
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    for pid in (101, 102):
+        (tmp_path / f"gauge_livesum_{pid}.db").touch()
+        (tmp_path / f"counter_{pid}.db").touch()
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", Path(__file__).parent.parent / "gunicorn.conf.py")
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+
+    mark_process_dead(101)
+    gunicorn_conf.child_exit(None, SimpleNamespace(pid=102))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["counter_101.db", "counter_102.db"]
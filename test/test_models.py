@@ -1,5 +1,10 @@
 import pytest
 from datetime import datetime
+from unittest.mock import patch
+from app.config import settings
+from app.models.notification import (
+    NotificationPriority, NotificationRecord, NotificationStatus, NotificationType
+)
 from app.models.redis import UserStatus
 
 
@@ -142,4 +147,79 @@ class TestUserStatusToRedisHash:
         assert restored.user_id == original.user_id
         assert restored.status == original.status
         assert restored.type == original.type
-        assert restored.updated_at == original.updated_at
\ No newline at end of file
+        assert restored.updated_at == original.updated_at
+
+class TestNotificationRecordStorage:
+    """Тесты форматов хранения NotificationRecord"""
+
+    def make_record(self, **overrides):
+        fields = dict(
+            user_id=123,
+            message="Ваш код: 1111",
+            type=NotificationType.TELEGRAM,
+            status=NotificationStatus.SENT,
+            created_at=datetime(2024, 1, 7, 10, 0, 0, 123456),
+            sent_at=datetime(2024, 1, 7, 10, 0, 2, 654321),
+            attempts=2,
+            last_error="TimeoutError: smtp"
+        )
+        fields.update(overrides)
+        return NotificationRecord(**fields)
+
+    @staticmethod
+    def as_redis(mapping: dict, as_bytes: bool = False) -> dict:
+        """Имитирует HGETALL: все значения приходят строками (или bytes)"""
+        if as_bytes:
+            return {str(k).encode(): str(v).encode() for k, v in mapping.items()}
+        return {str(k): str(v) for k, v in mapping.items()}
+
+    def test_legacy_roundtrip(self):
+        """Тест туда-обратно в исходном формате"""
+        original = self.make_record()
+        restored = NotificationRecord.from_redis_hash(self.as_redis(original.to_legacy_hash()))
+        assert restored == original
+
+    def test_compact_roundtrip(self):
+        """Тест туда-обратно в компактном формате, время сохраняется до микросекунды"""
+        original = self.make_record()
+        restored = NotificationRecord.from_redis_hash(self.as_redis(original.to_compact_hash()))
+        assert restored == original
+
+    def test_compact_omits_defaults(self):
+        """Поля со значениями по умолчанию в компактный формат не пишутся"""
+        record = self.make_record(status=NotificationStatus.PENDING, sent_at=None, attempts=0, last_error=None)
+        data = record.to_compact_hash()
+        assert set(data) == {"u", "m", "t", "s", "c"}
+        assert NotificationRecord.from_redis_hash(self.as_redis(data)) == record
+
+    @pytest.mark.parametrize("fmt", ["hash", "compact"])
+    def test_priority_roundtrip(self, fmt):
+        """Приоритет сохраняется в обоих форматах, в старых записях — normal"""
+        original = self.make_record(priority=NotificationPriority.CRITICAL)
+        with patch.object(settings, "storage_format", fmt):
+            data = self.as_redis(original.to_redis_hash())
+        assert NotificationRecord.from_redis_hash(data).priority == NotificationPriority.CRITICAL
+
+        data.pop("priority" if fmt == "hash" else "p")
+        assert NotificationRecord.from_redis_hash(data).priority == NotificationPriority.NORMAL
+
+    def test_compact_is_smaller(self):
+        """Компактный формат занимает меньше места"""
+        record = self.make_record()
+        size = lambda data: sum(len(k) + len(str(v).encode()) for k, v in data.items())
+        assert size(record.to_compact_hash()) < size(record.to_legacy_hash()) * 0.6
+
+    @pytest.mark.parametrize("fmt", ["hash", "compact"])
+    def test_bytes_keys(self, fmt):
+        """Оба формата читаются при decode_responses=False"""
+        original = self.make_record()
+        with patch.object(settings, "storage_format", fmt):
+            data = self.as_redis(original.to_redis_hash(), as_bytes=True)
+        assert NotificationRecord.from_redis_hash(data) == original
+
+    def test_missing_required_field(self):
+        """Без обязательного поля — ValueError"""
+        data = self.as_redis(self.make_record().to_legacy_hash())
+        del data["message"]
+        with pytest.raises(ValueError, match="message is required"):
+            NotificationRecord.from_redis_hash(data)
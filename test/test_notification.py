@@ -1,13 +1,24 @@
 import asyncio
+import gzip
+import json
+import fakeredis
 import pytest
 import logging
+from datetime import datetime
 from httpx import AsyncClient, ASGITransport
-from unittest.mock import patch, MagicMock, ANY
+from unittest.mock import AsyncMock, patch, ANY
 from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
+from app.config import settings
 from app.main import app
-from app.services.notifications import NotificationService
-from app.models.notification import NotificationStatus
+from app.services.keys import notification_key
+from app.services.notifications import InvalidTransition, NotificationService
+from app.models.notification import NotificationStatus, NotificationType
+from app.models.user import SendNotificationData
+from app.services.dispatcher import dispatcher
+from app.services.redis import redis_service
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +34,10 @@ def setup_test_environment():
     if hasattr(NotificationService, '_test_data'):
         NotificationService._test_data.clear()
     
-    # Мокаем Redis для всех тестов
-    with patch('app.services.redis.redis.Redis') as mock_redis:
-        mock_redis_instance = MagicMock()
-        mock_redis_instance.ping.return_value = True
-        mock_redis.return_value = mock_redis_instance
-        yield mock_redis_instance
+    # Подменяем Redis на fakeredis для всех тестов
+    fake = fakeredis.FakeAsyncRedis(decode_responses=True)
+    with patch.object(redis_service, "_connection", fake):
+        yield fake
 
 # Фикстура для тестового клиента
 @pytest.fixture
@@ -127,6 +136,7 @@ async def test_get_notifications_with_status_filter(async_client, client):
             }
         )
         assert response.status_code == status.HTTP_202_ACCEPTED
+    await dispatcher.join()
     
     response = await  async_client.get(
         "/api/notifications/",
@@ -136,7 +146,7 @@ async def test_get_notifications_with_status_filter(async_client, client):
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
     logger.info(data)
-    assert data["count"] == 0
+    assert data["count"] == 2
     assert all(n["status"] == "sent" for n in data["notifications"])
 
 
@@ -156,4 +166,385 @@ async def test_error_handling(async_client):
         
         assert response.status_code == 200
         # assert "Redis connection failed" in response.json()
-        print("✅ Redis error handling works correctly")
\ No newline at end of file
+        print("✅ Redis error handling works correctly")
+
+@pytest.mark.asyncio
+async def test_get_notifications_pagination(async_client, fake_redis):
+    """
+    Проверяет постраничную выдачу истории от новых к старым по курсору
+    """
+    for i in range(5):
+        await NotificationService.send_email_notification(7, f"Message {i}")
+
+    response = await async_client.get("/api/notifications/", params={"user_id": 7, "limit": 2})
+    data = response.json()
+    assert [n["message"] for n in data["notifications"]] == ["Message 4", "Message 3"]
+    assert data["next_cursor"] is not None
+
+    messages = [n["message"] for n in data["notifications"]]
+    while data["next_cursor"] is not None:
+        response = await async_client.get(
+            "/api/notifications/",
+            params={"user_id": 7, "limit": 2, "cursor": data["next_cursor"]}
+        )
+        data = response.json()
+        messages.extend(n["message"] for n in data["notifications"])
+
+    assert messages == [f"Message {i}" for i in reversed(range(5))]
+    assert await fake_redis.zcard("user_notifications:7") == 5
+
+
+@pytest.mark.asyncio
+async def test_status_filter_fills_page(async_client, fake_redis):
+    """
+    Фильтр по статусу не даёт пустых страниц, пока подходящие записи есть дальше в истории
+    """
+    failed = []
+    for i in range(3):
+        record = await NotificationService.create_notification(9, f"Failed {i}", NotificationType.EMAIL)
+        await NotificationService._transition(record, NotificationStatus.FAILED)
+        failed.append(record.id)
+    for i in range(5):
+        await NotificationService.send_email_notification(9, f"Sent {i}")
+
+    ids, cursor = [], None
+    while True:
+        params = {"user_id": 9, "status": "failed", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        data = (await async_client.get("/api/notifications/", params=params)).json()
+        assert data["count"] == 2 or data["next_cursor"] is None
+        ids.extend(n["id"] for n in data["notifications"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+
+    assert ids == list(reversed(failed))
+
+
+@pytest.mark.asyncio
+async def test_status_filter_scan_is_capped(fake_redis):
+    """
+    Редкий статус не заставляет читать всю историю за один запрос: после history_max_scan
+    записей страница возвращается короче, с курсором, с которого поиск продолжится
+    """
+    failed = await NotificationService.create_notification(10, "Failed", NotificationType.EMAIL)
+    await NotificationService._transition(failed, NotificationStatus.FAILED)
+    for i in range(7):
+        await NotificationService.send_email_notification(10, f"Sent {i}")
+
+    pages, cursor = [], None
+    with patch.object(settings, "history_max_scan", 3):
+        while True:
+            page, cursor = await NotificationService.get_user_notifications(
+                10, NotificationStatus.FAILED, cursor, limit=2
+            )
+            pages.append([n.id for n in page])
+            if cursor is None:
+                break
+
+    assert pages == [[], [], [failed.id]]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cursor", ["nan:0", "inf:0", "-inf:0", "1.5:-1", "abc", "1.5:x"])
+async def test_malformed_cursor_rejected(async_client, fake_redis, cursor):
+    """
+    Некорректный курсор — 400 во всех постраничных выдачах, а не ошибка Redis
+    """
+    for path, params in (
+        ("/api/notifications/", {"user_id": 7}),
+        ("/api/notifications/dead-letter", {}),
+        ("/api/notifications/admin", {}),
+    ):
+        response = await async_client.get(path, params={**params, "cursor": cursor})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, path
+
+
+@pytest.mark.asyncio
+async def test_history_body_matches_json_response(async_client, fake_redis):
+    """
+    История кодируется напрямую в JSON, но байты те же, что у JSONResponse поверх dict записей
+    """
+    await NotificationService.send_email_notification(8, 'Ваш код: "1111" 😀')
+    failed = await NotificationService.create_notification(8, "Line\nbreak", NotificationType.TELEGRAM)
+    failed.attempts = 2
+    failed.last_error = "ConnectionError: provider down"
+    await NotificationService._transition(failed, NotificationStatus.FAILED, ("attempts", "last_error"))
+
+    response = await async_client.get("/api/notifications/", params={"user_id": 8, "limit": 2})
+    notifications, next_cursor = await NotificationService.get_user_notifications(8, limit=2)
+    expected = JSONResponse(jsonable_encoder({
+        "user_id": 8,
+        "notifications": [notification.model_dump() for notification in notifications],
+        "count": 2,
+        "next_cursor": next_cursor
+    }))
+
+    assert response.content == expected.body
+    assert response.headers["content-type"] == expected.headers["content-type"]
+    response = await async_client.get(f"/api/notifications/{notifications[0].id}")
+    assert response.content == JSONResponse(jsonable_encoder(notifications[0].model_dump())).body
+
+
+@pytest.mark.asyncio
+async def test_batch_send_json_array(async_client, fake_redis):
+    """
+    Проверяет пакетную отправку: валидные элементы сохраняются, невалидные отклоняются поштучно
+    """
+    items = [
+        {"user_id": 11, "message": "Ваш код: 1111", "type": "telegram"},
+        {"user_id": -1, "message": "bad user", "type": "email"},
+        {"user_id": 12, "message": "Hi", "type": "email"},
+        {"user_id": 13, "message": "no type"},
+    ]
+
+    response = await async_client.post("/api/notifications/batch", json=items)
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    data = response.json()
+    assert data["accepted_count"] == 2
+    assert [item["index"] for item in data["accepted"]] == [0, 2]
+    assert [item["index"] for item in data["rejected"]] == [1, 3]
+    assert data["rejected"][0]["errors"][0]["loc"] == ["user_id"]
+    await dispatcher.join()
+
+    notifications, _ = await NotificationService.get_user_notifications(12)
+    assert [n.status for n in notifications] == [NotificationStatus.SENT]
+
+
+@pytest.mark.asyncio
+async def test_batch_send_ndjson(async_client, fake_redis):
+    """
+    Проверяет приём NDJSON-тела
+    """
+    body = "\n".join(
+        f'{{"user_id": 21, "message": "Message {i}", "type": "email"}}' for i in range(3)
+    )
+
+    response = await async_client.post(
+        "/api/notifications/batch",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["accepted_count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_send_invalid_body(async_client, fake_redis):
+    """
+    Тело, не являющееся массивом, отклоняется целиком
+    """
+    response = await async_client.post("/api/notifications/batch", json={"user_id": 1})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+async def test_ids_are_unique_and_ordered(fake_redis):
+    """
+    Уведомления, созданные в одну и ту же микросекунду, не перезаписывают друг друга
+    """
+    items = [SendNotificationData(user_id=31, message=f"Message {i}", type="email") for i in range(50)]
+    with patch("app.services.notifications.datetime") as mock_datetime:
+        mock_datetime.utcnow.return_value = datetime(2026, 1, 7, 10, 0, 0)
+        created = await NotificationService.create_notifications(items)
+
+    ids = [record.id for record in created]
+    assert len(set(ids)) == 50
+    assert ids == sorted(ids)
+
+    # Все записи с одинаковым score, курсор не теряет и не дублирует их на границе страниц
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = await NotificationService.get_user_notifications(31, cursor=cursor, limit=7)
+        seen.extend(record.id for record in page)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(ids)
+
+
+@pytest.mark.asyncio
+async def test_get_notification_by_id(async_client, fake_redis):
+    """
+    Проверяет получение уведомления по id, возвращённому при отправке
+    """
+    response = await async_client.post(
+        "/api/notifications/",
+        params={"user_id": 41, "message": "Ваш код: 1111", "notification_type": "telegram"}
+    )
+    notification_id = response.json()["id"]
+    await dispatcher.join()
+
+    response = await async_client.get(f"/api/notifications/{notification_id}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["id"] == notification_id
+    assert response.json()["status"] == "sent"
+
+    response = await async_client.get("/api/notifications/41:UNKNOWN")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = await async_client.get("/api/notifications/garbage")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage_format", ["hash", "compact"])
+async def test_transition_updates_only_status_fields(fake_redis, storage_format):
+    """
+    Переход в sent меняет только статус и sent_at; повторный переход отклоняется
+    """
+    with patch.object(settings, "storage_format", storage_format):
+        record = await NotificationService.create_notification(51, "Hello", "email")
+        key = notification_key(record.id)
+        # Параллельная запись в поле, которое переход не трогает, не должна затираться
+        message_field = "message" if storage_format == "hash" else "m"
+        await fake_redis.hset(key, message_field, "Edited")
+
+        delivered = await NotificationService.deliver(record)
+        stored = await NotificationService.get_notification(record.id)
+
+        assert stored.status == NotificationStatus.SENT
+        assert stored.sent_at == delivered.sent_at
+        assert stored.message == "Edited"
+
+        with pytest.raises(InvalidTransition):
+            await NotificationService._transition(stored, NotificationStatus.FAILED)
+
+
+@pytest.mark.asyncio
+async def test_legacy_index_members_are_readable(fake_redis):
+    """
+    Записи старого формата (член индекса — временная метка) по-прежнему читаются
+    """
+    await fake_redis.hset("notification:61:1767780000.5", mapping={
+        "user_id": "61", "message": "Old", "type": "email", "status": "sent",
+        "created_at": "2026-01-07T10:00:00.500000", "sent_at": ""
+    })
+    await fake_redis.zadd("user_notifications:61", {"1767780000.5": 1767780000.5})
+
+    notifications, _ = await NotificationService.get_user_notifications(61)
+
+    assert [n.id for n in notifications] == ["61:1767780000.5"]
+    assert notifications[0].message == "Old"
+
+
+@pytest.mark.asyncio
+async def test_export_streams_filtered_gzip_ndjson(async_client, fake_redis):
+    """
+    Выгрузка обходит всех пользователей и отдаёт только подходящие под фильтр записи
+    """
+    created = [
+        await NotificationService.create_notification(user_id, f"Msg {user_id}", notification_type)
+        for user_id, notification_type in [(71, "email"), (72, "telegram"), (73, "email")]
+    ]
+    await NotificationService.deliver(created[2])
+
+    with patch.object(settings, "export_scan_count", 1), patch.object(settings, "export_chunk_size", 1):
+        response = await async_client.get(
+            "/api/notifications/export", params={"notification_type": "email", "status": "pending"}
+        )
+        everything = await async_client.get("/api/notifications/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [created[0].id]
+    assert len(gzip.decompress(everything.content).splitlines()) == 3
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_transitions(async_client, fake_redis):
+    """
+    Счётчики меняются при создании и переходах статуса, не читая сами уведомления
+    """
+    sent = await NotificationService.create_notification(81, "One", "email")
+    failed = await NotificationService.create_notification(81, "Two", "telegram")
+    await NotificationService.create_notification(82, "Three", "email")
+    await NotificationService.deliver(sent)
+    with patch.object(settings, "retry_max_attempts", 1):
+        await NotificationService.record_failure(failed, RuntimeError("boom"))
+
+    response = await async_client.get("/api/notifications/stats", params=[("user_id", 81), ("user_id", 83)])
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["global"]["by_status"] == {"pending": 1, "sent": 1, "failed": 1, "cancelled": 0}
+    assert data["global"]["by_type"] == {"telegram": 1, "email": 2}
+    assert data["users"]["81"]["by_type_and_status"]["email"] == {"pending": 0, "sent": 1, "failed": 0, "cancelled": 0}
+    assert data["users"]["81"]["total"] == 2
+    assert data["users"]["83"]["total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_deduplicates_sends(async_client, fake_redis):
+    """
+    Повторы с тем же Idempotency-Key, в том числе одновременные, создают одно уведомление
+    """
+    params = {"user_id": 95, "message": "Once", "notification_type": "email"}
+    headers = {"Idempotency-Key": "order-1"}
+
+    responses = await asyncio.gather(*(
+        async_client.post("/api/notifications/", params=params, headers=headers) for _ in range(5)
+    ))
+    conflict = await async_client.post(
+        "/api/notifications/", params={**params, "message": "Other"}, headers=headers
+    )
+
+    assert {r.status_code for r in responses} == {202}
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+    assert await fake_redis.zcard("user_notifications:95") == 1
+    assert conflict.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_idempotency_covers_priority_and_send_at(async_client, fake_redis):
+    """
+    Приоритет и send_at входят в отпечаток запроса; повтор отвечает тем же телом, что и исходный
+    """
+    params = {
+        "user_id": 97, "message": "Later", "notification_type": "email",
+        "priority": "critical", "send_at": "2099-01-01T12:00:00+03:00"
+    }
+    headers = {"Idempotency-Key": "later-1"}
+
+    first = await async_client.post("/api/notifications/", params=params, headers=headers)
+    replay = await async_client.post("/api/notifications/", params=params, headers=headers)
+    assert first.json()["send_at"] == "2099-01-01T09:00:00"
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.json() == first.json()
+
+    # Одновременный дубликат, пришедший до создания записи исходным запросом
+    with patch.object(NotificationService, "get_notification", AsyncMock(return_value=None)):
+        early = await async_client.post("/api/notifications/", params=params, headers=headers)
+    assert early.json() == first.json()
+
+    for changed in ({"priority": "bulk"}, {"send_at": "2099-01-02T12:00:00+03:00"}):
+        conflict = await async_client.post("/api/notifications/", params={**params, **changed}, headers=headers)
+        assert conflict.status_code == 422
+    assert await fake_redis.zcard("user_notifications:97") == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_idempotency_per_item(async_client, fake_redis):
+    """
+    В пачке ключ действует на каждый элемент: повтор внутри пачки и повтор пачки не создают записей
+    """
+    items = [
+        {"user_id": 96, "message": "A", "type": "email", "idempotency_key": "a"},
+        {"user_id": 96, "message": "A", "type": "email", "idempotency_key": "a"},
+        {"user_id": 96, "message": "B", "type": "email"},
+    ]
+
+    first = (await async_client.post("/api/notifications/batch", json=items)).json()
+    second = (await async_client.post("/api/notifications/batch", json=items[:1] + [
+        {"user_id": 96, "message": "Changed", "type": "email", "idempotency_key": "a"}
+    ])).json()
+
+    assert [entry["index"] for entry in first["accepted"]] == [0, 1, 2]
+    assert first["accepted"][0]["id"] == first["accepted"][1]["id"]
+    assert first["accepted"][1]["replayed"] is True
+    assert second["accepted"] == [{"index": 0, "id": first["accepted"][0]["id"], "replayed": True}]
+    assert second["rejected"][0]["index"] == 1
+    assert await fake_redis.zcard("user_notifications:96") == 2
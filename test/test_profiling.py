@@ -0,0 +1,52 @@
+import pstats
+import pytest
+from httpx import AsyncClient, ASGITransport
+from unittest.mock import patch
+from app.config import settings
+from app.main import app
+from app.services.notifications import NotificationService
+from app.services.profiling import ProfilingMiddleware
+
+
+@pytest.fixture
+async def profiled_client(tmp_path):
+    with patch.object(settings, "profiling_token", "secret"), \
+            patch.object(settings, "profiling_dir", str(tmp_path)):
+        async with AsyncClient(
+            transport=ASGITransport(app=ProfilingMiddleware(app)), base_url="http://test"
+        ) as client:
+            yield client
+
+
+@pytest.mark.asyncio
+async def test_flagged_request_is_profiled(fake_redis, profiled_client, tmp_path):
+    """
+    Запрос с токеном получает Server-Timing по этапам, а отчёт cProfile сохраняется
+    """
+    await NotificationService.create_notification(5, "Hello", "email")
+
+    response = await profiled_client.get(
+        "/api/notifications/", params={"user_id": 5}, headers={"X-Profile": "secret"}
+    )
+
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    for name in ("storage", "decode", "serialize", "total"):
+        assert f"{name};dur=" in timing
+    report = tmp_path / response.headers["x-profile-report"]
+    assert pstats.Stats(str(report)).total_calls > 0
+
+
+@pytest.mark.asyncio
+async def test_unflagged_request_is_not_profiled(fake_redis, profiled_client, tmp_path):
+    """
+    Без заголовка или с неверным токеном запрос обрабатывается как обычно
+    """
+    plain = await profiled_client.get("/api/notifications/", params={"user_id": 5})
+    wrong = await profiled_client.get(
+        "/api/notifications/", params={"user_id": 5}, headers={"X-Profile": "guess"}
+    )
+
+    assert "server-timing" not in plain.headers
+    assert "server-timing" not in wrong.headers
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.models.notification import NotificationType
+from app.services.events import event_bus
+from app.services.notifications import NotificationService
+from app.services.push import push_hub
+from test.test_cache import wait_until
+
+
+@pytest.fixture
+def push_enabled():
+    with patch.object(settings, "push_enabled", True):
+        yield
+
+
+async def subscribed(user_id: int):
+    """Поток событий пользователя с уже зарегистрированной подпиской"""
+    stream = push_hub.listen(user_id)
+    first = asyncio.ensure_future(anext(stream))
+    clients = push_hub.clients
+    await wait_until(lambda: push_hub.clients > clients)
+    return stream, first
+
+
+@pytest.mark.asyncio
+async def test_transitions_are_pushed_to_subscribers(fake_redis, push_enabled):
+    """
+    Создание и смена статуса приходят подписчику через pub/sub, чужие события — нет
+    """
+    subscriber = asyncio.create_task(event_bus.run())
+    try:
+        await wait_until(lambda: event_bus.connected)
+        stream, first = await subscribed(31)
+
+        record = await NotificationService.create_notification(31, "Hello", NotificationType.EMAIL)
+        await NotificationService.create_notification(32, "Other", NotificationType.EMAIL)
+        with patch.object(NotificationService, "_send", AsyncMock()):
+            await NotificationService.deliver(record)
+
+        assert await asyncio.wait_for(first, 1) == ("status", {"user_id": 31, "id": record.id, "status": "pending"})
+        assert await asyncio.wait_for(anext(stream), 1) == ("status", {"user_id": 31, "id": record.id, "status": "sent"})
+        await stream.aclose()
+        assert push_hub.clients == 0
+    finally:
+        subscriber.cancel()
+
+
+@pytest.mark.asyncio
+async def test_slow_client_gets_reset_instead_of_growing_buffer(push_enabled):
+    """
+    Переполненный буфер клиента не растёт: поток завершается событием reset
+    """
+    with patch.object(push_hub, "buffer_size", 2):
+        stream, first = await subscribed(33)
+        for status in ("pending", "sent", "failed"):
+            push_hub.on_event({"user_id": 33, "id": "33:a", "status": status})
+
+        assert await asyncio.wait_for(first, 1) == ("reset", None)
+        with pytest.raises(StopAsyncIteration):
+            await anext(stream)
+    assert push_hub.clients == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_unavailable_without_subscription(push_enabled):
+    """
+    Пока нет подписки на события, поток не открывается
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/notifications/stream", params={"user_id": 1})
+    assert response.status_code == 503
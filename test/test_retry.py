@@ -0,0 +1,83 @@
+import time
+import pytest
+from unittest.mock import patch
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.models.notification import NotificationStatus, NotificationType
+from app.services.dispatcher import dispatcher
+from app.services.notifications import NotificationService, retry_delay
+from app.services.retry import retry_poller
+from app.services.timeindex import retry_index
+
+
+@pytest.fixture
+def failing_channel():
+    """Канал доставки, который всегда падает"""
+    with patch.object(NotificationService, "_send", side_effect=ConnectionError("provider down")):
+        yield
+
+
+def test_retry_delay_grows_exponentially_with_jitter():
+    """
+    Задержка удваивается с каждой попыткой, джиттер не выходит за [delay/2, delay]
+    """
+    for attempts in range(1, 6):
+        delay = settings.retry_base_delay * 2 ** (attempts - 1)
+        assert delay / 2 <= retry_delay(attempts) <= delay
+    assert retry_delay(100) <= settings.retry_max_delay
+
+
+@pytest.mark.asyncio
+async def test_failed_send_is_scheduled_for_retry(fake_redis, failing_channel):
+    """
+    Ошибка канала не теряется: попытка и ошибка сохраняются, повтор попадает в retry_index
+    """
+    record = await NotificationService.create_notification(1, "Hello", NotificationType.TELEGRAM)
+
+    await NotificationService.deliver(record)
+
+    stored = await NotificationService.get_notification(record.id)
+    assert stored.status == NotificationStatus.PENDING
+    assert stored.attempts == 1
+    assert "provider down" in stored.last_error
+    due_at = await fake_redis.zscore(settings.retry_key, record.id)
+    assert due_at > time.time()
+
+
+@pytest.mark.asyncio
+async def test_poller_redelivers_due_retries(fake_redis):
+    """
+    Поллер забирает наступившие повторы и доставляет их
+    """
+    record = await NotificationService.create_notification(2, "Hello", NotificationType.EMAIL)
+    await retry_index.add(record.id, time.time() - 1)
+    await retry_index.add("2:not-yet", time.time() + 60)
+
+    assert await retry_poller.poll_once() == 1
+    await dispatcher.join()
+
+    stored = await NotificationService.get_notification(record.id)
+    assert stored.status == NotificationStatus.SENT
+    assert await fake_redis.zcard(settings.retry_key) == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_retries_go_to_dead_letter(fake_redis, failing_channel):
+    """
+    После retry_max_attempts попыток уведомление становится failed и видно через API
+    """
+    record = await NotificationService.create_notification(3, "Hello", NotificationType.EMAIL)
+    for _ in range(settings.retry_max_attempts):
+        record = await NotificationService.deliver(record)
+
+    assert record.status == NotificationStatus.FAILED
+    assert await retry_index.pop_due(10, now=time.time() + 10 ** 6) == []
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/api/notifications/dead-letter")
+
+    data = response.json()
+    assert data["count"] == 1
+    assert data["notifications"][0]["status"] == "failed"
+    assert data["notifications"][0]["attempts"] == settings.retry_max_attempts
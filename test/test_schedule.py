@@ -0,0 +1,114 @@
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.models.notification import NotificationStatus, to_timestamp
+from app.services.dispatcher import dispatcher
+from app.services.notifications import NotificationService
+from app.services.scheduler import schedule_poller
+
+
+@pytest.fixture
+def sends():
+    with patch.object(NotificationService, "_send", AsyncMock()) as send:
+        yield send
+
+
+def client() -> AsyncClient:
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+async def schedule(http: AsyncClient, user_id: int, send_at: datetime) -> str:
+    response = await http.post("/api/notifications/", params={
+        "user_id": user_id, "message": "Reminder", "notification_type": "telegram",
+        "send_at": send_at.isoformat()
+    })
+    assert response.status_code == 202
+    return response.json()["id"]
+
+
+@pytest.mark.asyncio
+async def test_scheduled_notification_waits_for_send_at(fake_redis, sends):
+    """
+    Уведомление с будущим send_at ждёт в schedule_index, а после переноса
+    на наступившее время поллер отдаёт его в доставку
+    """
+    # Время с часовым поясом приводится к UTC
+    send_at = datetime.now(timezone(timedelta(hours=3))) + timedelta(hours=1)
+    async with client() as http:
+        notification_id = await schedule(http, 21, send_at)
+        await dispatcher.join()
+        assert sends.await_count == 0
+        assert await schedule_poller.poll_once() == 0
+
+        expected = send_at.astimezone(timezone.utc).replace(tzinfo=None)
+        assert await fake_redis.zscore(settings.schedule_key, notification_id) == to_timestamp(expected)
+        stored = await NotificationService.get_notification(notification_id)
+        assert stored.status == NotificationStatus.PENDING and stored.send_at == expected
+
+        past = datetime.utcnow() - timedelta(seconds=1)
+        response = await http.post(
+            f"/api/notifications/{notification_id}/reschedule", params={"send_at": past.isoformat()}
+        )
+        assert response.status_code == 200
+
+    assert await schedule_poller.poll_once() == 1
+    await dispatcher.join()
+    assert sends.await_count == 1
+    stored = await NotificationService.get_notification(notification_id)
+    assert stored.status == NotificationStatus.SENT
+    assert stored.send_at == past
+
+
+@pytest.mark.asyncio
+async def test_cancel_removes_scheduled_notification(fake_redis, sends):
+    """
+    Отменённое уведомление не доставляется; отмена и перенос после неё — 409
+    """
+    async with client() as http:
+        notification_id = await schedule(http, 22, datetime.utcnow() + timedelta(days=1))
+
+        response = await http.post(f"/api/notifications/{notification_id}/cancel")
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+
+        assert (await http.post(f"/api/notifications/{notification_id}/cancel")).status_code == 409
+        response = await http.post(
+            f"/api/notifications/{notification_id}/reschedule",
+            params={"send_at": datetime.utcnow().isoformat()}
+        )
+        assert response.status_code == 409
+        assert (await http.post("/api/notifications/22:missing/cancel")).status_code == 404
+
+        stats = (await http.get("/api/notifications/stats")).json()
+
+    assert await fake_redis.zcard(settings.schedule_key) == 0
+    assert stats["global"]["by_status"]["cancelled"] == 1
+    assert stats["global"]["by_status"]["pending"] == 0
+    assert sends.await_count == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_schedules_only_future_items(fake_redis, sends):
+    """
+    В пачке уведомления с будущим send_at откладываются и не попадают в стрим,
+    прошедшее время означает отправку сразу
+    """
+    items = [
+        {"user_id": 23, "message": "Now", "type": "email"},
+        {"user_id": 23, "message": "Past", "type": "email",
+         "send_at": (datetime.utcnow() - timedelta(minutes=5)).isoformat()},
+        {"user_id": 23, "message": "Later", "type": "email",
+         "send_at": (datetime.utcnow() + timedelta(hours=2)).isoformat()},
+    ]
+    with patch.object(settings, "delivery_mode", "queue"):
+        async with client() as http:
+            response = await http.post("/api/notifications/batch", content=json.dumps(items))
+    assert response.status_code == 202
+    later_id = response.json()["accepted"][2]["id"]
+
+    assert await fake_redis.xlen(settings.queue_stream) == 2
+    assert await fake_redis.zrange(settings.schedule_key, 0, -1) == [later_id]
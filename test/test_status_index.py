@@ -0,0 +1,108 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.models.notification import NotificationStatus, NotificationType
+from app.services.dispatcher import dispatcher
+from app.services.notifications import NotificationService
+from app.services.recovery import pending_recovery
+from app.services.status_index import StatusIndex
+from app.services.timeindex import retry_index
+
+PENDING_EMAIL = StatusIndex.key(NotificationType.EMAIL, NotificationStatus.PENDING)
+
+
+async def create(user_id: int, notification_type: NotificationType, status: NotificationStatus):
+    record = await NotificationService.create_notification(user_id, f"To {user_id}", notification_type)
+    if status != NotificationStatus.PENDING:
+        await NotificationService._transition(record, status)
+    return record
+
+
+@pytest.mark.asyncio
+async def test_admin_query_by_status_and_type(fake_redis):
+    """
+    Поиск по индексам отдаёт уведомления всех пользователей нужных статуса и канала,
+    курсор проходит объединение индексов без пропусков и повторов
+    """
+    failed_email = [await create(i, NotificationType.EMAIL, NotificationStatus.FAILED) for i in (1, 2, 3)]
+    failed_telegram = await create(4, NotificationType.TELEGRAM, NotificationStatus.FAILED)
+    await create(5, NotificationType.EMAIL, NotificationStatus.SENT)
+    pending = await create(6, NotificationType.EMAIL, NotificationStatus.PENDING)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        async def search(**params):
+            return (await client.get("/api/notifications/admin", params=params)).json()
+
+        data = await search(status="failed", notification_type="email")
+        assert [n["id"] for n in data["notifications"]] == [r.id for r in reversed(failed_email)]
+
+        seen, cursor = [], None
+        while True:
+            page = await search(status="failed", limit=3, **({"cursor": cursor} if cursor else {}))
+            seen.extend(n["id"] for n in page["notifications"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == [failed_telegram.id] + [r.id for r in reversed(failed_email)]
+
+        assert (await search(status="pending", older_than=60))["count"] == 0
+        await fake_redis.zadd(PENDING_EMAIL, {pending.id: time.time() - 600})
+        data = await search(status="pending", older_than=300)
+        assert [n["id"] for n in data["notifications"]] == [pending.id]
+
+
+@pytest.mark.asyncio
+async def test_recovery_redelivers_only_orphaned_pending(fake_redis):
+    """
+    Восстановление отдаёт в доставку pending, зависшие дольше порога, кроме ждущих повтора;
+    повторно то же уведомление забирается не раньше, чем через порог
+    """
+    orphan = await create(11, NotificationType.EMAIL, NotificationStatus.PENDING)
+    retrying = await create(12, NotificationType.EMAIL, NotificationStatus.PENDING)
+    fresh = await create(13, NotificationType.EMAIL, NotificationStatus.PENDING)
+    stale = time.time() - settings.recovery_pending_after - 1
+    await fake_redis.zadd(PENDING_EMAIL, {orphan.id: stale, retrying.id: stale, "11:deleted": stale})
+    await retry_index.add(retrying.id, time.time() + 60)
+
+    with patch.object(NotificationService, "_send", AsyncMock()) as send:
+        assert await pending_recovery.poll_once() == 1
+        await dispatcher.join()
+        assert await pending_recovery.poll_once() == 0
+
+    assert [call.args[0].id for call in send.await_args_list] == [orphan.id]
+    assert (await NotificationService.get_notification(orphan.id)).status == NotificationStatus.SENT
+    assert await fake_redis.zscore(PENDING_EMAIL, "11:deleted") is None
+    assert set(await fake_redis.zrange(PENDING_EMAIL, 0, -1)) == {retrying.id, fresh.id}
+
+
+@pytest.mark.asyncio
+async def test_recovered_copy_is_not_sent_twice(fake_redis):
+    """
+    Взятое в доставку уведомление восстановление не трогает, а копия задачи,
+    поставленная, пока запись ждала в очереди, не отправляется ни во время, ни после отправки
+    """
+    record = await create(14, NotificationType.EMAIL, NotificationStatus.PENDING)
+    copy = record.model_copy()
+    await fake_redis.zadd(PENDING_EMAIL, {record.id: time.time() - settings.recovery_pending_after - 1})
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_send(_):
+        started.set()
+        await release.wait()
+
+    with patch.object(NotificationService, "_send", AsyncMock(side_effect=slow_send)) as send:
+        delivery = asyncio.create_task(NotificationService.deliver(record))
+        await started.wait()
+        assert await pending_recovery.poll_once() == 0
+        await NotificationService.deliver(copy.model_copy())
+        release.set()
+        await delivery
+        await NotificationService.deliver(copy.model_copy())
+
+    assert send.await_count == 1
+    assert (await NotificationService.get_notification(record.id)).status == NotificationStatus.SENT
+    assert not await fake_redis.keys("delivering:*")
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import socket
+import httpx
+import pytest
+from aiosmtpd.controller import Controller
+from app.models.notification import NotificationRecord, NotificationStatus, NotificationType
+from app.services.transports import SmtpTransport, TelegramTransport
+
+
+class RecordingHandler:
+    """Локальный SMTP-сервер: запоминает письма и сессии, в которых они пришли"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+def record(user_id: int, message: str, notification_type: NotificationType) -> NotificationRecord:
+    return NotificationRecord(
+        user_id=user_id, message=message, type=notification_type, status=NotificationStatus.PENDING
+    )
+
+
+@pytest.mark.asyncio
+async def test_smtp_sessions_are_reused(smtp_server):
+    """
+    Письма идут по сессиям пула: соединений не больше pool_size, а не по одному на письмо
+    """
+    handler, port = smtp_server
+    transport = SmtpTransport("127.0.0.1", port, "bot@example.com", pool_size=2, max_messages=100)
+    try:
+        await asyncio.gather(*(
+            transport.send(record(user_id, f"Hello {user_id}", NotificationType.EMAIL))
+            for user_id in range(1, 21)
+        ))
+    finally:
+        await transport.close()
+
+    assert len(handler.messages) == 20
+    assert handler.messages[0].rcpt_tos == ["user1@example.com"]
+    assert transport.connections == len(handler.sessions) <= 2
+
+
+@pytest.mark.asyncio
+async def test_smtp_session_is_recycled_after_max_messages(smtp_server):
+    """
+    После max_messages писем сессия закрывается и открывается новая
+    """
+    handler, port = smtp_server
+    transport = SmtpTransport("127.0.0.1", port, "bot@example.com", pool_size=1, max_messages=2)
+    try:
+        for user_id in range(1, 6):
+            await transport.send(record(user_id, "Hello", NotificationType.EMAIL))
+    finally:
+        await transport.close()
+
+    assert len(handler.messages) == 5
+    assert transport.connections == 3
+
+
+@pytest.mark.asyncio
+async def test_telegram_send_message_and_api_errors():
+    """
+    Уведомление уходит в sendMessage, ответ ok=false — ошибка отправки
+    """
+    requests = []
+
+    def bot_api(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        payload = json.loads(request.content)
+        if payload["chat_id"] == 2:
+            return httpx.Response(200, json={"ok": False, "description": "chat not found"})
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    transport = TelegramTransport("https://bot.test", "TOKEN", transport=httpx.MockTransport(bot_api))
+    try:
+        await transport.send(record(1, "Hi", NotificationType.TELEGRAM))
+        with pytest.raises(RuntimeError, match="chat not found"):
+            await transport.send(record(2, "Hi", NotificationType.TELEGRAM))
+    finally:
+        await transport.close()
+
+    assert str(requests[0].url) == "https://bot.test/botTOKEN/sendMessage"
+    assert json.loads(requests[0].content) == {"chat_id": 1, "text": "Hi"}
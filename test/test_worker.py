@@ -0,0 +1,87 @@
+import pytest
+from unittest.mock import patch
+from httpx import AsyncClient, ASGITransport
+from app.config import settings
+from app.main import app
+from app.models.notification import NotificationPriority, NotificationStatus
+from app.services.notifications import NotificationService
+from app.services.queue import delivery_queue
+from app.worker import DeliveryWorker
+
+
+@pytest.fixture
+def queue_mode(fake_redis):
+    with patch.object(settings, "delivery_mode", "queue"), \
+            patch.object(settings, "worker_claim_idle_ms", 0):
+        yield fake_redis
+
+
+@pytest.mark.asyncio
+async def test_send_enqueues_job_in_queue_mode(queue_mode):
+    """
+    В режиме очереди API только сохраняет pending-запись и кладёт задачу в стрим
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/api/notifications/",
+            params={"user_id": 5, "message": "Ваш код: 1111", "notification_type": "telegram"}
+        )
+
+    assert response.status_code == 202
+    assert await queue_mode.xlen(settings.queue_stream) == 1
+    notifications, _ = await NotificationService.get_user_notifications(5)
+    assert [n.status for n in notifications] == [NotificationStatus.PENDING]
+
+
+@pytest.mark.asyncio
+async def test_worker_delivers_and_acks(queue_mode):
+    """
+    Воркер доставляет задачу, подтверждает и удаляет её из стрима
+    """
+    await delivery_queue.ensure_group()
+    record = await NotificationService.create_notification(5, "Hello", "email")
+    await delivery_queue.enqueue(record.id)
+
+    worker = DeliveryWorker("test-consumer", concurrency=10)
+    await worker.poll()
+    await worker.drain()
+
+    record = await NotificationService.get_notification(record.id)
+    assert record.status == NotificationStatus.SENT
+    assert (await queue_mode.xpending(settings.queue_stream, settings.queue_group))["pending"] == 0
+    assert await queue_mode.xlen(settings.queue_stream) == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_reclaims_stale_entries(queue_mode):
+    """
+    Задача, прочитанная упавшим консьюмером, подбирается через XAUTOCLAIM
+    """
+    await delivery_queue.ensure_group()
+    record = await NotificationService.create_notification(6, "Hello", "telegram")
+    await delivery_queue.enqueue(record.id)
+    assert len(await delivery_queue.read("dead-consumer", 10, 10)) == 1
+
+    worker = DeliveryWorker("live-consumer", concurrency=10)
+    await worker.poll()
+    await worker.drain()
+
+    record = await NotificationService.get_notification(record.id)
+    assert record.status == NotificationStatus.SENT
+    assert (await queue_mode.xpending(settings.queue_stream, settings.queue_group))["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_read_takes_lanes_by_weight(queue_mode):
+    """
+    Чтение не упирается в стрим рассылки: critical берётся первым, bulk не голодает
+    """
+    await delivery_queue.ensure_group()
+    for i in range(5):
+        await delivery_queue.enqueue(f"7:bulk-{i}", NotificationPriority.BULK)
+    await delivery_queue.enqueue("7:otp", NotificationPriority.CRITICAL)
+
+    entries = await delivery_queue.read("consumer", 2, 10)
+
+    assert [fields["id"] for _, _, fields in entries] == ["7:otp", "7:bulk-0"]
+    assert entries[0][0] == f"{settings.queue_stream}:critical"